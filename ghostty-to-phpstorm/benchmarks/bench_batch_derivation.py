@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark for BatchDerivator
+
+Derives the palettes of a random theme collection with the vectorized NumPy
+engine and with the scalar ColorDerivator, checks every derived color is
+identical, and that the generator never has to fall back to scalar math.
+Runs the default rules, then rules that also shift saturation and derive
+from uppercase literals and missing palette entries.
+
+Usage:
+    python benchmarks/bench_batch_derivation.py [--themes 400] [--seed 1]
+"""
+
+import sys
+import time
+import random
+import argparse
+
+from corpus import load_converter, random_theme
+
+
+class CountingDerivator:
+    """Wraps a PrecomputedDerivator, counting lookups it could not answer"""
+
+    def __init__(self, derivator):
+        self.derivator = derivator
+        self.misses = 0
+
+    def adjust_brightness(self, hex_color, factor):
+        self.misses += (hex_color, factor) not in self.derivator.brightness
+        return self.derivator.adjust_brightness(hex_color, factor)
+
+    def blend_colors(self, color1, color2, ratio=0.5):
+        self.misses += (color1, color2, ratio) not in self.derivator.blends
+        return self.derivator.blend_colors(color1, color2, ratio)
+
+    def adjust_saturation(self, hex_color, factor):
+        self.misses += (hex_color, factor) not in self.derivator.saturation
+        return self.derivator.adjust_saturation(hex_color, factor)
+
+    def ensure_contrast(self, hex_color, against, role):
+        return self.derivator.ensure_contrast(hex_color, against, role)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark vectorized palette derivation')
+    parser.add_argument('--themes', type=int, default=400, help='Number of random themes to derive')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for theme palettes')
+    args = parser.parse_args()
+
+    converter = load_converter()
+    if converter._load_numpy() is None:
+        print("NumPy is not installed, --vectorize has no effect")
+        return
+
+    rng = random.Random(args.seed)
+    themes = [random_theme(converter, rng, i) for i in range(args.themes)]
+    # Cover light themes and uppercase input too
+    for theme in themes[::3]:
+        theme.background = theme.background.upper()
+    for theme in themes[::5]:
+        theme.background = "#f0f0f0"
+
+    saturation_rules = converter.DerivationRules(converter.DerivationRules.merge(converter.DERIVATION_RULES, {
+        'names': {'accent_secondary': 'saturation(brightness(accent, -0.1, 0.1), 0.2, -0.3)'},
+        'colors': {'mutedAccent': 'saturation(blend(accent, bg, 0.4), -0.5)',
+                   'mutedLink': 'brightness(contrast(palette(20, #0078D4), bg, text), 0.1, -0.1)',
+                   'mutedBorder': 'blend(contrast(#ABCDEF, bg, ui), palette(21, #FF00aa), 0.3)'},
+    }))
+
+    failures = 0
+    for label, rules in (('default rules', None), ('extended rules', saturation_rules)):
+        converter.ColorDerivator.adjust_brightness.cache_clear()
+        start = time.perf_counter()
+        derivators = converter.BatchDerivator(themes, rules).derive()
+        batch_time = time.perf_counter() - start
+
+        converter.ColorDerivator.adjust_brightness.cache_clear()
+        converter.ColorDerivator.adjust_saturation.cache_clear()
+        converter.ColorDerivator.blend_colors.cache_clear()
+        start = time.perf_counter()
+        scalar_results = [converter.PhpStormThemeGenerator(theme, rules=rules).generate_theme_json()
+                          for theme in themes]
+        scalar_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for theme in themes:
+            converter.PhpStormThemeGenerator(theme, derivators[theme.name], rules).generate_theme_json()
+        precomputed_time = time.perf_counter() - start
+
+        for theme, expected in zip(themes, scalar_results):
+            derivator = CountingDerivator(derivators[theme.name])
+            generator = converter.PhpStormThemeGenerator(theme, derivator, rules)
+            if generator.generate_theme_json() != expected or derivator.misses:
+                print(f"Error: {theme.name} differs from the scalar path ({derivator.misses} fallbacks)")
+                failures += 1
+
+            for table, adjust in (('brightness', converter.ColorDerivator.adjust_brightness),
+                                  ('saturation', converter.ColorDerivator.adjust_saturation)):
+                for (color, factor), result in getattr(derivator.derivator, table).items():
+                    if result != adjust(color, factor):
+                        print(f"Error: {theme.name} {table} {color} {factor} gave {result}")
+                        failures += 1
+
+        print(f"Derived {len(themes)} palettes with the {label}")
+        print(f"  batch derivation:        {batch_time * 1e3:8.2f} ms")
+        print(f"  precomputed generation:  {precomputed_time * 1e3:8.2f} ms (including JSON layout)")
+        print(f"  scalar generation:       {scalar_time * 1e3:8.2f} ms (including JSON layout)")
+
+    if failures:
+        sys.exit(1)
+    print("Every palette is identical to the scalar path")
+
+
+if __name__ == '__main__':
+    main()
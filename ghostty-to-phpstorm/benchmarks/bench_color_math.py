@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for ColorDerivator
+
+Compares the packed-integer, memoized color engine against the original
+string-parsing implementation, and checks both produce identical colors.
+Records the color operations deriving each palette makes, then times
+replaying just those, so rule evaluation and JSON layout are left out. The
+memoized engine is timed with its caches cleared first (cold), and warm
+re-deriving each palette right after deriving it once, as the daemon and
+--watch do. Each timing is the best of several runs.
+
+Usage:
+    python benchmarks/bench_color_math.py [--themes 400] [--seed 1] [--repeat 5]
+"""
+
+import sys
+import timeit
+import random
+import argparse
+import colorsys
+from functools import partial
+
+from corpus import load_converter, random_theme
+
+
+class LegacyColorDerivator:
+    """The original string-parsing ColorDerivator, kept as a baseline"""
+
+    @staticmethod
+    def adjust_brightness(hex_color: str, factor: float) -> str:
+        hex_color = hex_color.lstrip('#')
+        r, g, b = [int(hex_color[i:i+2], 16) / 255.0 for i in (0, 2, 4)]
+        h, s, v = colorsys.rgb_to_hsv(r, g, b)
+        v = max(0, min(1, v + factor))
+        r, g, b = colorsys.hsv_to_rgb(h, s, v)
+        return f"#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}"
+
+    @staticmethod
+    def adjust_saturation(hex_color: str, factor: float) -> str:
+        hex_color = hex_color.lstrip('#')
+        r, g, b = [int(hex_color[i:i+2], 16) / 255.0 for i in (0, 2, 4)]
+        h, s, v = colorsys.rgb_to_hsv(r, g, b)
+        s = max(0, min(1, s + factor))
+        r, g, b = colorsys.hsv_to_rgb(h, s, v)
+        return f"#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}"
+
+    @staticmethod
+    def blend_colors(color1: str, color2: str, ratio: float = 0.5) -> str:
+        c1 = color1.lstrip('#')
+        c2 = color2.lstrip('#')
+        r1, g1, b1 = [int(c1[i:i+2], 16) for i in (0, 2, 4)]
+        r2, g2, b2 = [int(c2[i:i+2], 16) for i in (0, 2, 4)]
+        r = int(r1 * (1 - ratio) + r2 * ratio)
+        g = int(g1 * (1 - ratio) + g2 * ratio)
+        b = int(b1 * (1 - ratio) + b2 * ratio)
+        return f"#{r:02x}{g:02x}{b:02x}"
+
+    @staticmethod
+    def ensure_contrast(hex_color: str, against: str, role: str) -> str:
+        return hex_color
+
+
+class RecordingDerivator:
+    """Wraps a ColorDerivator, recording every color operation and its arguments"""
+
+    def __init__(self, derivator):
+        self.derivator = derivator
+        self.calls = []
+
+    def adjust_brightness(self, hex_color, factor):
+        self.calls.append(('adjust_brightness', (hex_color, factor)))
+        return self.derivator.adjust_brightness(hex_color, factor)
+
+    def adjust_saturation(self, hex_color, factor):
+        self.calls.append(('adjust_saturation', (hex_color, factor)))
+        return self.derivator.adjust_saturation(hex_color, factor)
+
+    def blend_colors(self, color1, color2, ratio=0.5):
+        self.calls.append(('blend_colors', (color1, color2, ratio)))
+        return self.derivator.blend_colors(color1, color2, ratio)
+
+    def ensure_contrast(self, hex_color, against, role):
+        return self.derivator.ensure_contrast(hex_color, against, role)
+
+
+def record_calls(converter, themes) -> list:
+    """The color operations deriving each theme's palette makes, in order, one list per theme"""
+    calls = []
+    for theme in themes:
+        recorder = RecordingDerivator(converter.ColorDerivator())
+        generator = converter.PhpStormThemeGenerator(theme, recorder)
+        converter.ThemeTemplate.for_theme(theme).evaluate(generator)
+        calls.append(recorder.calls)
+    return calls
+
+
+def clear_caches(converter):
+    """Reset memoized color math, so the next run starts cold"""
+    for cache in (converter.hex_to_rgb, converter.rgb_to_hex, converter.rgb_to_hsv,
+                  converter.ColorDerivator.adjust_brightness, converter.ColorDerivator.adjust_saturation,
+                  converter.ColorDerivator.blend_colors):
+        cache.cache_clear()
+
+
+def replay(derivator, calls) -> list:
+    """Bind every theme's recorded calls to the derivator's methods, ready to run"""
+    return [[(getattr(derivator, name), args) for name, args in theme_calls] for theme_calls in calls]
+
+
+def run_calls(bound) -> list:
+    """Run one theme's bound color operations, returning their results"""
+    return [method(*args) for method, args in bound]
+
+
+def time_calls(bound, repeat: int, before=None, warm: bool = False) -> float:
+    """Best-of-N seconds to run every theme's bound color operations
+
+    before is called ahead of each run. With warm set, each theme's
+    operations run once untimed just before they are timed.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        if before:
+            before()
+        total = 0.0
+        for theme_calls in bound:
+            if warm:
+                run_calls(theme_calls)
+            total += timeit.timeit(lambda: run_calls(theme_calls), number=1)
+        best = min(best, total)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ColorDerivator color operations')
+    parser.add_argument('--themes', type=int, default=400, help='Number of random themes to derive')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for theme palettes')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of each timing, keeping the best')
+    args = parser.parse_args()
+
+    converter = load_converter()
+    rng = random.Random(args.seed)
+    themes = [random_theme(converter, rng, i) for i in range(args.themes)]
+
+    # Both engines must agree exactly before the timings mean anything
+    for theme in themes:
+        legacy = converter.PhpStormThemeGenerator(theme)
+        legacy.derivator = LegacyColorDerivator()
+        current = converter.PhpStormThemeGenerator(theme)
+        if legacy.generate_theme_json() != current.generate_theme_json():
+            print(f"Error: derived palette differs for {theme.name}")
+            sys.exit(1)
+
+    calls = record_calls(converter, themes)
+    legacy_calls = replay(LegacyColorDerivator(), calls)
+    current_calls = replay(converter.ColorDerivator(), calls)
+    if any(run_calls(legacy) != run_calls(current) for legacy, current in zip(legacy_calls, current_calls)):
+        print("Error: color operations differ between the engines")
+        sys.exit(1)
+
+    legacy_time = time_calls(legacy_calls, args.repeat)
+    cold_time = time_calls(current_calls, args.repeat, before=partial(clear_caches, converter))
+    warm_time = time_calls(current_calls, args.repeat, warm=True)
+
+    operations = sum(len(theme_calls) for theme_calls in calls)
+    print(f"Replayed {operations} color operations from {len(themes)} palettes (best of {args.repeat})")
+    for label, seconds in (('legacy', legacy_time), ('cold', cold_time), ('warm', warm_time)):
+        print(f"  {label + ':':7} {seconds / len(themes) * 1e6:8.1f} µs/palette"
+              f"  {seconds / operations * 1e9:8.1f} ns/operation"
+              + (f"  {legacy_time / seconds:6.2f}x" if label != 'legacy' else ''))
+
+
+if __name__ == '__main__':
+    main()
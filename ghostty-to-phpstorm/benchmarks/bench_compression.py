@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark for JAR compression strategies
+
+Renders a random theme collection once, then packages it as per-theme JARs
+and as a single bundle with each --compression choice, reporting total
+output bytes and packaging time, and checking every archive reads back.
+
+Usage:
+    python benchmarks/bench_compression.py [--themes 400] [--seed 1]
+    python benchmarks/bench_compression.py --methods stored,deflate:1,lzma
+"""
+
+import sys
+import time
+import random
+import zipfile
+import argparse
+import tempfile
+from pathlib import Path
+
+from corpus import load_converter, random_theme
+
+METHODS = 'stored,deflate:1,deflate:6,deflate:9,bzip2:9,lzma'
+
+
+def package(converter, rendered, output_dir: Path, compression) -> float:
+    """Write per-theme JARs for pre-rendered themes, returning the time taken"""
+    start = time.perf_counter()
+    for name, _, plugin_files in rendered:
+        converter.create_jar_file(plugin_files, output_dir / f"{name}-theme.jar", compression)
+    return time.perf_counter() - start
+
+
+def package_bundle(converter, rendered, jar_path: Path, compression) -> float:
+    """Write one bundle JAR for pre-rendered themes, returning the time taken"""
+    start = time.perf_counter()
+    with converter.ThemeBundle(jar_path, compression) as bundle:
+        for name, theme_id, plugin_files in rendered:
+            resources = {path: content for path, content in plugin_files.items() if path.startswith('resources/')}
+            bundle.add(name, theme_id, resources)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JAR compression strategies')
+    parser.add_argument('--themes', type=int, default=400, help='Number of random themes to package')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for theme palettes')
+    parser.add_argument('--methods', default=METHODS, help=f'Compression specs to compare (default: {METHODS})')
+    args = parser.parse_args()
+
+    converter = load_converter()
+    rng = random.Random(args.seed)
+    rendered = []
+    for i in range(args.themes):
+        generator = converter.PhpStormThemeGenerator(random_theme(converter, rng, i))
+        rendered.append((generator.ghostty.name, generator.theme_id, generator.generate_plugin_files()))
+    raw_bytes = sum(len(content.encode()) for _, _, files in rendered for content in files.values())
+
+    print(f"Packaging {len(rendered)} themes ({raw_bytes / 1024:.1f} KiB uncompressed)")
+    print(f"{'compression':<13}{'JARs KiB':>10}{'JARs ms':>10}{'bundle KiB':>12}{'bundle ms':>11}")
+    failures = 0
+    for spec in args.methods.split(','):
+        compression = converter.Compression.parse(spec)
+        with tempfile.TemporaryDirectory() as tmp:
+            output_dir = Path(tmp)
+            jar_time = package(converter, rendered, output_dir, compression)
+            jar_bytes = sum(jar.stat().st_size for jar in output_dir.glob('*-theme.jar'))
+            bundle_path = output_dir / 'bundle.jar'
+            bundle_time = package_bundle(converter, rendered, bundle_path, compression)
+
+            for jar in [*output_dir.glob('*-theme.jar'), bundle_path]:
+                with zipfile.ZipFile(jar) as archive:
+                    if archive.testzip() is not None:
+                        print(f"Error: {jar.name} is corrupt with {compression.spec}")
+                        failures += 1
+
+            print(f"{compression.spec:<13}{jar_bytes / 1024:>10.1f}{jar_time * 1e3:>10.1f}"
+                  f"{bundle_path.stat().st_size / 1024:>12.1f}{bundle_time * 1e3:>11.1f}")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark for contrast-aware derivation
+
+Derives a random theme collection's colors with the plain ColorDerivator and
+with ContrastDerivator (--min-contrast), reporting the time per theme and how
+many themes and colors fall short of the target either way. Checks the
+luminance lookup table against the WCAG formula, and that every adjusted
+color either reaches its target or could not move any further.
+
+Usage:
+    python benchmarks/bench_contrast.py [--themes 400] [--seed 1] [--min-contrast 4.5]
+"""
+
+import sys
+import time
+import random
+import argparse
+
+from corpus import load_converter, random_theme
+
+
+def reference_luminance(rgb: int) -> float:
+    """WCAG relative luminance computed directly from the formula"""
+    def to_linear(c):
+        return c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4
+
+    r, g, b = (to_linear(((rgb >> shift) & 0xff) / 255.0) for shift in (16, 8, 0))
+    return 0.2126 * r + 0.7152 * g + 0.0722 * b
+
+
+def derive(converter, themes, derivator):
+    """Evaluate every theme's template and contrast check, returning seconds and failures per theme"""
+    failures = {}
+    start = time.perf_counter()
+    for theme in themes:
+        generator = converter.PhpStormThemeGenerator(theme, derivator)
+        values = converter.ThemeTemplate.for_theme(theme).evaluate(generator)
+        failures[theme.name] = generator.contrast_failures(values)
+    return time.perf_counter() - start, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark contrast-aware derivation')
+    parser.add_argument('--themes', type=int, default=400, help='Number of random themes')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for theme palettes')
+    parser.add_argument('--min-contrast', type=float, default=4.5, help='Contrast ratio to enforce')
+    args = parser.parse_args()
+
+    converter = load_converter()
+    rng = random.Random(args.seed)
+    themes = [random_theme(converter, rng, i) for i in range(args.themes)]
+
+    errors = 0
+    for rgb in rng.sample(range(1 << 24), 20000):
+        if converter.rgb_luminance(rgb) != reference_luminance(rgb):
+            print(f"Error: luminance of #{rgb:06x} differs from the WCAG formula")
+            errors += 1
+
+    # Measure how far the plain derivation falls short, by checking it against the same targets
+    class CheckedDerivator(converter.ColorDerivator):
+        contrast_targets = converter.ContrastDerivator(args.min_contrast).contrast_targets
+
+    plain_time, plain_failures = derive(converter, themes, CheckedDerivator())
+    contrast = converter.ContrastDerivator(args.min_contrast)
+    contrast_time, contrast_failures = derive(converter, themes, contrast)
+
+    # Colors still short of the target must be as light (or dark) as their hue allows
+    for theme in themes:
+        generator = converter.PhpStormThemeGenerator(theme, contrast)
+        template = converter.ThemeTemplate.for_theme(theme)
+        values = template.evaluate(generator)
+        short = {keys[0] for _, _, keys in contrast_failures[theme.name]}
+        for index, keys in template.contrast_keys.items():
+            if keys[0] not in short:
+                continue
+            _, _, v = converter.rgb_to_hsv(converter.hex_to_rgb(values[index]))
+            if 0 < round(v * 255) < 255:
+                print(f"Error: {theme.name} {keys[0]} falls short at {values[index]} but could move further")
+                errors += 1
+
+    print(f"Derived {len(themes)} themes, target {args.min_contrast:g}:1 for text, "
+          f"{contrast.contrast_targets['ui']:g}:1 for borders")
+    for label, seconds, failures in (('plain', plain_time, plain_failures),
+                                     ('contrast', contrast_time, contrast_failures)):
+        failing = [name for name, theme_failures in failures.items() if theme_failures]
+        colors = sum(len(theme_failures) for theme_failures in failures.values())
+        print(f"  {label:<9} {seconds / len(themes) * 1e6:8.1f} µs/theme, "
+              f"{len(failing)} themes and {colors} colors below target")
+
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
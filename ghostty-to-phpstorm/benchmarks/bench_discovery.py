@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark for batch theme discovery
+
+Fills a directory with a mix of theme files and clutter (READMEs, binary
+files, dotfiles), then finds the themes with discover_themes and with the
+original iterdir() and is_file() listing, both bare and followed by reading
+every file as the batch used to. Reports the time to the first theme, the
+total time and the peak memory of each, and checks that discovery finds
+exactly the themes. Then converts the themes straight from discovery, as a
+plain --batch run does, and from the sorted list of every theme, as runs
+that look at the whole collection do, reporting the time to the first
+finished conversion and the total of each.
+
+Usage:
+    python benchmarks/bench_discovery.py [--entries 20000] [--theme-share 0.1]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+from pathlib import Path
+
+from corpus import load_converter
+
+THEME = "palette = 0=#1d1f21\nbackground = #1d1f21\nforeground = #c5c8c6\n"
+
+
+def measure(function):
+    """Run function, returning its result, the seconds to its first result, total seconds and peak KiB"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    iterator = iter(function())
+    first = next(iterator, None)
+    first_time = time.perf_counter() - start
+    results = [] if first is None else [first, *iterator]
+    total_time = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return results, first_time, total_time, peak / 1024
+
+
+class FirstConversionClock:
+    """Stands in for stdout, noting when the first theme conversion is reported"""
+
+    def __init__(self, start: float):
+        self.start = start
+        self.first = None
+
+    def write(self, text: str):
+        if self.first is None and '✓' in text:
+            self.first = time.perf_counter() - self.start
+
+    def flush(self):
+        pass
+
+
+def time_conversion(theme_files, output_dir: Path, converter):
+    """Convert a batch, returning the seconds to the first finished conversion and in total"""
+    clock = FirstConversionClock(time.perf_counter())
+    with contextlib.redirect_stdout(clock):
+        converter.convert_batch(theme_files(), output_dir, force=True)
+    return clock.first, time.perf_counter() - clock.start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batch theme discovery')
+    parser.add_argument('--entries', type=int, default=20000, help='Number of directory entries')
+    parser.add_argument('--theme-share', type=float, default=0.1, help='Share of entries that are themes')
+    args = parser.parse_args()
+
+    converter = load_converter()
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        every = max(1, round(1 / args.theme_share))
+        expected = set()
+        for i in range(args.entries):
+            if i % every == 0:
+                path = directory / f"theme-{i}"
+                path.write_text(THEME)
+                expected.add(path)
+            elif i % 3 == 0:
+                (directory / f"README-{i}.md").write_text("# Not a theme\n")
+            elif i % 3 == 1:
+                (directory / f"blob-{i}.bin").write_bytes(os.urandom(64))
+            else:
+                (directory / f".hidden-{i}").write_text(THEME)
+
+        found, discover_first, discover_total, discover_peak = measure(
+            lambda: converter.discover_themes(directory))
+        listed, list_first, list_total, list_peak = measure(
+            lambda: [f for f in directory.iterdir() if f.is_file()])
+        _, read_first, read_total, read_peak = measure(
+            lambda: [f.read_bytes() for f in directory.iterdir() if f.is_file()])
+
+        with tempfile.TemporaryDirectory() as output:
+            stream_first, stream_total = time_conversion(
+                lambda: converter.discover_themes(directory), Path(output), converter)
+        with tempfile.TemporaryDirectory() as output:
+            sorted_first, sorted_total = time_conversion(
+                lambda: sorted(converter.discover_themes(directory)), Path(output), converter)
+
+    if set(found) != expected:
+        print(f"Error: discovered {len(found)} files, expected the {len(expected)} themes")
+        sys.exit(1)
+
+    print(f"{args.entries} entries, {len(found)} themes found, clutter dropped")
+    print(f"{'':<10}{'first ms':>10}{'total ms':>10}{'peak KiB':>10}{'files':>8}")
+    print(f"{'discover':<10}{discover_first * 1e3:>10.1f}{discover_total * 1e3:>10.1f}{discover_peak:>10.1f}"
+          f"{len(found):>8}")
+    print(f"{'iterdir':<10}{list_first * 1e3:>10.1f}{list_total * 1e3:>10.1f}{list_peak:>10.1f}{len(listed):>8}")
+    print(f"{'+ read':<10}{read_first * 1e3:>10.1f}{read_total * 1e3:>10.1f}{read_peak:>10.1f}{len(listed):>8}")
+    print(f"\nConverting the {len(found)} themes")
+    print(f"{'':<10}{'first ms':>10}{'total ms':>10}")
+    print(f"{'streamed':<10}{stream_first * 1e3:>10.1f}{stream_total * 1e3:>10.1f}")
+    print(f"{'sorted':<10}{sorted_first * 1e3:>10.1f}{sorted_total * 1e3:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark for duplicate theme detection
+
+Builds a random theme collection with planted exact duplicates (renamed
+copies) and near duplicates (copies with a few palette entries nudged),
+then clusters it with find_duplicates and with a pairwise O(n²) reference.
+Checks both find the same clusters and reports the time each takes.
+
+Usage:
+    python benchmarks/bench_duplicates.py [--themes 2000] [--seed 1] [--distance 2.3]
+"""
+
+import sys
+import math
+import time
+import random
+import argparse
+
+from corpus import load_converter, random_theme
+
+
+def copy_theme(converter, theme, name: str):
+    """A renamed copy of a theme with the same colors"""
+    copy = converter.GhosttyTheme(name)
+    copy.colors[:] = theme.colors
+    copy.palette.colors[:] = theme.palette.colors
+    copy.palette.present = theme.palette.present
+    return copy
+
+
+def nudge(rng: random.Random, rgb: int) -> int:
+    """Move each channel of a packed RGB color by at most one level"""
+    channels = [min(255, max(0, ((rgb >> shift) & 0xff) + rng.randint(-1, 1))) for shift in (16, 8, 0)]
+    return (channels[0] << 16) | (channels[1] << 8) | channels[2]
+
+
+def reference_clusters(converter, themes, distance: float):
+    """Cluster by comparing every pair of themes"""
+    parents = list(range(len(themes)))
+
+    def root(index):
+        while parents[index] != index:
+            index = parents[index]
+        return index
+
+    features = [converter.theme_features(theme) for theme in themes]
+    signatures = [converter.theme_signature(theme) for theme in themes]
+    for i in range(len(themes)):
+        for j in range(i):
+            if signatures[i] == signatures[j] or math.dist(features[i], features[j]) <= distance * math.sqrt(18):
+                first, second = sorted((root(i), root(j)))
+                parents[second] = first
+
+    clusters = {}
+    for index, theme in enumerate(themes):
+        clusters.setdefault(root(index), []).append(theme.name)
+    return sorted(clusters.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark duplicate theme detection')
+    parser.add_argument('--themes', type=int, default=2000, help='Number of random themes before planting copies')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for theme palettes')
+    parser.add_argument('--distance', type=float, default=2.3, help='Near-duplicate distance (RMS delta E)')
+    args = parser.parse_args()
+
+    converter = load_converter()
+    rng = random.Random(args.seed)
+    themes = [random_theme(converter, rng, i) for i in range(args.themes)]
+    for theme in rng.sample(themes, args.themes // 10):
+        themes.append(copy_theme(converter, theme, f"{theme.name}-copy"))
+    for theme in rng.sample(themes, args.themes // 10):
+        near = copy_theme(converter, theme, f"{theme.name}-near")
+        for index in rng.sample(range(16), 3):
+            near.palette.colors[index] = nudge(rng, near.palette.colors[index])
+        themes.append(near)
+    rng.shuffle(themes)
+
+    start = time.perf_counter()
+    clusters = converter.find_duplicates(themes, args.distance)
+    indexed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = reference_clusters(converter, themes, args.distance)
+    pairwise_time = time.perf_counter() - start
+
+    found = sorted([cluster.theme.name] + [duplicate.name for duplicate, _ in cluster.duplicates]
+                   for cluster in clusters)
+    if found != expected:
+        print("Error: spatial index clusters differ from the pairwise reference")
+        sys.exit(1)
+
+    duplicates = sum(len(cluster.duplicates) for cluster in clusters)
+    print(f"{len(themes)} themes, {duplicates} duplicates in {len(clusters)} clusters, identical to pairwise")
+    print(f"  spatial index {indexed_time * 1e3:9.1f} ms")
+    print(f"  pairwise      {pairwise_time * 1e3:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the theme index
+
+Writes a synthetic theme corpus, builds the index, then times an update
+with nothing changed, an update after editing a few themes, and selecting
+with a --where condition. Checks every selection against parsing each theme
+and testing the condition in Python, and compares with that full pass.
+
+Usage:
+    python benchmarks/bench_index.py [--themes 400] [--changed 10] [--where "dark and contrast >= 4"]
+"""
+
+import re
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+from corpus import load_converter, write_corpus
+
+CONDITIONS = ("dark", "light and contrast >= 4.5", "hue >= 180 and hue < 260",
+              "not (luminance < 0.1 or contrast < 2)")
+
+
+def reference_select(converter, theme_files, condition: str):
+    """Parse every theme and test the condition on its metrics in Python"""
+    python = condition.replace('dark', 'metrics.dark').replace('light', 'not metrics.dark')
+    for field in converter.ThemeFilter.FIELDS:
+        python = python.replace(field, f"metrics.{field}")
+    python = python.replace('metrics.hue', '(metrics.hue if metrics.hue is not None else float("nan"))')
+
+    selected = []
+    for theme_file in theme_files:
+        metrics = converter.theme_metrics(converter.GhosttyParser.parse_theme_file(theme_file))
+        if eval(python, {'metrics': metrics}):
+            selected.append(theme_file)
+    return selected
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the theme index')
+    parser.add_argument('--themes', type=int, default=400, help='Number of synthetic themes')
+    parser.add_argument('--changed', type=int, default=10, help='Themes edited between updates')
+    parser.add_argument('--where', default=CONDITIONS[1], help='Condition to time selection with')
+    args = parser.parse_args()
+
+    converter = load_converter()
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = Path(tmp) / 'themes'
+        corpus_dir.mkdir()
+        write_corpus(corpus_dir, args.themes, seed=1)
+        theme_files = sorted(corpus_dir.iterdir())
+        index_path = Path(tmp) / 'index.sqlite'
+
+        timings = {}
+        with converter.ThemeIndex(index_path) as index:
+            start = time.perf_counter()
+            index.update(theme_files)
+            timings['build'] = time.perf_counter() - start
+
+        with converter.ThemeIndex(index_path) as index:
+            start = time.perf_counter()
+            updated, _, _ = index.update(theme_files)
+            timings['update, none changed'] = time.perf_counter() - start
+        if updated:
+            print(f"Error: {updated} unchanged themes were indexed again")
+            sys.exit(1)
+
+        for i, theme_file in enumerate(theme_files[:args.changed]):
+            background = f"background = #{i % 256:02x}0101"
+            theme_file.write_text(re.sub(r'^background = .*$', background, theme_file.read_text(), flags=re.M))
+        with converter.ThemeIndex(index_path) as index:
+            start = time.perf_counter()
+            updated, _, _ = index.update(theme_files)
+            timings[f'update, {args.changed} changed'] = time.perf_counter() - start
+
+            where = converter.ThemeFilter.parse(args.where)
+            start = time.perf_counter()
+            selected = index.select(theme_files, where)
+            timings['select'] = time.perf_counter() - start
+
+            errors = 0
+            for condition in CONDITIONS + (args.where,):
+                matches = index.select(theme_files, converter.ThemeFilter.parse(condition))
+                found = [theme_file for theme_file, _ in matches]
+                if found != reference_select(converter, theme_files, condition):
+                    print(f"Error: index selection differs from the reference for '{condition}'")
+                    errors += 1
+
+        start = time.perf_counter()
+        reference_select(converter, theme_files, args.where)
+        timings['parse every theme'] = time.perf_counter() - start
+
+    if updated != args.changed:
+        print(f"Error: {updated} themes were indexed again after editing {args.changed}")
+        errors += 1
+
+    print(f"{args.themes} themes, {len(selected)} match '{args.where}', selections identical to the reference")
+    for name, seconds in timings.items():
+        print(f"  {name:<22} {seconds * 1e3:9.1f} ms")
+
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
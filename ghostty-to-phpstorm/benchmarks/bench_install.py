@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark for installing plugins with --install-to
+
+Converts a synthetic theme corpus to JAR files and installs them into an
+empty plugins directory. Then rebuilds everything, edits a few themes and
+deletes a few more, and syncs again with install_plugins and by copying
+every JAR over the installed ones, as installing by hand does. Checks the
+sync rewrote only the edited themes' plugins, left every other file
+untouched and removed only the deleted themes' plugins, keeping a plugin
+the converter did not generate and that of a theme that failed to convert.
+
+Usage:
+    python benchmarks/bench_install.py [--themes 400] [--changed 10] [--deleted 5]
+"""
+
+import re
+import sys
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+from corpus import load_converter, write_corpus
+
+
+def snapshot(directory: Path):
+    """Modification time and inode of every file, which change when a file is rewritten"""
+    return {path.name: (path.stat().st_mtime_ns, path.stat().st_ino) for path in directory.iterdir()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark plugin installation')
+    parser.add_argument('--themes', type=int, default=400, help='Number of synthetic themes')
+    parser.add_argument('--changed', type=int, default=10, help='Themes edited between installs')
+    parser.add_argument('--deleted', type=int, default=5, help='Themes deleted between installs')
+    args = parser.parse_args()
+
+    converter = load_converter()
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir, output_dir, plugins_dir, copy_dir = (Path(tmp) / name
+                                                         for name in ('themes', 'out', 'plugins', 'copied'))
+        corpus_dir.mkdir()
+        output_dir.mkdir()
+        write_corpus(corpus_dir, args.themes, seed=1)
+        theme_files = sorted(corpus_dir.iterdir())
+
+        def build(theme_files):
+            with redirect_stdout(StringIO()):
+                *_, outputs = converter.convert_batch(theme_files, output_dir, force=True, prune=True)
+            return sorted(output for theme_outputs in outputs.values() for output in theme_outputs)
+
+        jar_paths = build(theme_files)
+        timings = {}
+        start = time.perf_counter()
+        converter.install_plugins(jar_paths, plugins_dir)
+        timings['first install'] = time.perf_counter() - start
+        shutil.copytree(plugins_dir, copy_dir)
+
+        foreign = plugins_dir / 'other-theme.jar'
+        with zipfile.ZipFile(foreign, 'w') as jar:
+            jar.writestr('META-INF/plugin.xml', '<idea-plugin><id>org.example.theme</id></idea-plugin>')
+
+        changed = theme_files[:args.changed]
+        deleted = theme_files[args.changed:args.changed + args.deleted]
+        failed = theme_files[args.changed + args.deleted]
+        failed.write_text(re.sub(r'^background = .*$', 'background = not-a-color', failed.read_text(), flags=re.M))
+        for i, theme_file in enumerate(changed):
+            background = f"background = #{i % 256:02x}0101"
+            theme_file.write_text(re.sub(r'^background = .*$', background, theme_file.read_text(), flags=re.M))
+        for theme_file in deleted:
+            theme_file.unlink()
+        theme_files = sorted(corpus_dir.iterdir())
+        jar_paths = build(theme_files)
+        keep = [f"{theme_file.name}-theme.jar" for theme_file in theme_files]
+
+        before = snapshot(plugins_dir)
+        start = time.perf_counter()
+        dry_run = converter.install_plugins(jar_paths, plugins_dir, prune=True, dry_run=True, keep=keep)
+        timings['dry run'] = time.perf_counter() - start
+        dry_run_untouched = snapshot(plugins_dir) == before
+
+        start = time.perf_counter()
+        sync = converter.install_plugins(jar_paths, plugins_dir, prune=True, keep=keep)
+        timings['sync'] = time.perf_counter() - start
+        after = snapshot(plugins_dir)
+
+        start = time.perf_counter()
+        for jar_path in jar_paths:
+            shutil.copy(jar_path, copy_dir / jar_path.name)
+        timings['copy every JAR'] = time.perf_counter() - start
+
+        rewritten = {name for name in after if name in before and after[name] != before[name]}
+        expected_changed = {f"{theme_file.name}-theme.jar" for theme_file in changed}
+        expected_removed = {f"{theme_file.name}-theme.jar" for theme_file in deleted}
+
+        errors = 0
+        if not dry_run_untouched or dry_run != sync:
+            print("Error: the dry run changed the plugins directory or reported a different sync")
+            errors += 1
+        if set(sync.updated) != expected_changed or rewritten != expected_changed or sync.installed:
+            print(f"Error: {len(rewritten)} plugins were rewritten, expected the {len(expected_changed)} edited")
+            errors += 1
+        if set(sync.removed) != expected_removed or set(before) - set(after) != expected_removed:
+            print(f"Error: removed {sorted(sync.removed)}, expected the {len(expected_removed)} deleted themes")
+            errors += 1
+        if not foreign.exists():
+            print("Error: a plugin not generated by the converter was removed")
+            errors += 1
+        if not (plugins_dir / f"{failed.name}-theme.jar").exists():
+            print(f"Error: the plugin of {failed.name}, which failed to convert, was removed")
+            errors += 1
+        if any(jar_path.read_bytes() != (plugins_dir / jar_path.name).read_bytes() for jar_path in jar_paths):
+            print("Error: an installed plugin differs from the generated JAR")
+            errors += 1
+
+    print(f"{args.themes} themes, {args.changed} edited and {args.deleted} deleted: "
+          f"{len(sync.updated)} updated, {len(sync.unchanged)} unchanged, {len(sync.removed)} removed")
+    for name, seconds in timings.items():
+        print(f"  {name:<15} {seconds * 1e3:9.1f} ms")
+
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
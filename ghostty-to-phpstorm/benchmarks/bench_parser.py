@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for GhosttyParser
+
+Parses a theme directory with the current parser, with its line-by-line
+checked parser (used for themes that need diagnostics) and with the
+original line-by-line parser, reporting lines per second for each. Checks
+the current parser gives the same themes and diagnostics as the checked one.
+
+Usage:
+    python benchmarks/bench_parser.py [ghostty_themes_dir] [--repeat 5]
+    python benchmarks/bench_parser.py --themes 400  # Synthetic corpus
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+from corpus import load_converter, write_corpus
+
+
+def legacy_parse_theme_file(file_path: Path) -> dict:
+    """The original line-by-line parser, kept as a baseline"""
+    theme = {'palette': {}}
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            if '=' in line:
+                key, value = line.split('=', 1)
+                key = key.strip()
+                value = value.strip()
+
+                if key == 'palette':
+                    parts = value.split('=', 1)
+                    if len(parts) == 2:
+                        try:
+                            theme['palette'][int(parts[0])] = parts[1].strip()
+                        except ValueError:
+                            continue
+                elif key in ('background', 'foreground', 'cursor-color', 'cursor-text',
+                             'selection-background', 'selection-foreground'):
+                    theme[key] = value
+    return theme
+
+
+def time_parser(parse, theme_files, repeat: int) -> float:
+    """Best time, in seconds, to parse every theme file"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for theme_file in theme_files:
+            parse(theme_file)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Ghostty theme parsing throughput')
+    parser.add_argument('input', nargs='?', help='Ghostty themes directory (default: synthetic corpus)')
+    parser.add_argument('--themes', type=int, default=400, help='Synthetic corpus size')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the synthetic corpus')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per parser, best time is reported')
+    args = parser.parse_args()
+
+    converter = load_converter()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = Path(args.input) if args.input else Path(scratch)
+        if not args.input:
+            write_corpus(directory, args.themes, args.seed)
+
+        theme_files = sorted(f for f in directory.iterdir() if f.is_file())
+        lines = sum(len(f.read_bytes().splitlines()) for f in theme_files)
+
+        def parse(theme_file):
+            try:
+                converter.GhosttyParser.parse_theme_file(theme_file)
+            except ValueError:
+                pass
+
+        def parse_checked(theme_file):
+            try:
+                text = converter.read_small_file(theme_file).decode('utf-8', 'ignore')
+                converter.GhosttyParser.parse_theme_checked(theme_file.name, text)
+            except ValueError:
+                pass
+
+        def outcome(parse_theme, theme_file):
+            try:
+                theme = parse_theme(theme_file.name, theme_file.read_bytes().decode('utf-8', 'ignore'))
+            except ValueError as e:
+                return str(e)
+            return theme.colors, theme.palette.colors, theme.palette.present, theme.diagnostics
+
+        for theme_file in theme_files:
+            if (outcome(converter.GhosttyParser.parse_theme, theme_file)
+                    != outcome(converter.GhosttyParser.parse_theme_checked, theme_file)):
+                print(f"Error: {theme_file.name} parses differently from the checked parser")
+                sys.exit(1)
+
+        def legacy_parse_and_validate(theme_file):
+            # The legacy parser left colors as text, to be parsed again during derivation
+            theme = legacy_parse_theme_file(theme_file)
+            for color in list(theme['palette'].values()) + [v for k, v in theme.items() if k != 'palette']:
+                try:
+                    converter.parse_color(color)
+                except ValueError:
+                    pass
+
+        legacy_time = time_parser(legacy_parse_theme_file, theme_files, args.repeat)
+        validated_time = time_parser(legacy_parse_and_validate, theme_files, args.repeat)
+        current_time = time_parser(parse, theme_files, args.repeat)
+        checked_time = time_parser(parse_checked, theme_files, args.repeat)
+
+    print(f"Parsed {len(theme_files)} themes, {lines} lines")
+    print(f"  legacy:              {lines / legacy_time:12,.0f} lines/s (no validation)")
+    print(f"  legacy + validation: {lines / validated_time:12,.0f} lines/s")
+    print(f"  current:             {lines / current_time:12,.0f} lines/s")
+    print(f"  checked:             {lines / checked_time:12,.0f} lines/s (line by line, with diagnostics)")
+
+
+if __name__ == '__main__':
+    main()
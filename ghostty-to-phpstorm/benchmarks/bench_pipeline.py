@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the pipelined batch conversion
+
+Converts a synthetic theme corpus with the plain batch loop and with
+--pipeline, optionally adding a fixed delay to every JAR write and to every
+theme file read for its content hash, to stand in for a slow or network
+disk. Checks both produce identical JARs and reports the wall time of each.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--themes 400] [--latency 5] [--read-latency 5] [--jobs 1]
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from contextlib import redirect_stdout
+from io import StringIO
+
+from corpus import load_converter, write_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pipelined batch conversion')
+    parser.add_argument('--themes', type=int, default=400, help='Number of synthetic themes')
+    parser.add_argument('--latency', type=float, default=5.0, help='Simulated milliseconds per JAR write')
+    parser.add_argument('--read-latency', type=float, default=5.0,
+                        help='Simulated milliseconds per theme file read for hashing')
+    parser.add_argument('--jobs', type=int, default=1, help='Worker processes for conversion')
+    args = parser.parse_args()
+
+    converter = load_converter()
+    create_jar_file = converter.create_jar_file
+
+    def slow_create_jar_file(*jar_args, **jar_kwargs):
+        time.sleep(args.latency / 1000)  # Releases the GIL, like waiting on a real disk
+        return create_jar_file(*jar_args, **jar_kwargs)
+
+    converter.create_jar_file = slow_create_jar_file
+
+    hash_file = converter.BuildManifest.hash_file
+
+    def slow_hash_file(file_path):
+        time.sleep(args.read_latency / 1000)
+        return hash_file(file_path)
+
+    converter.BuildManifest.hash_file = slow_hash_file
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = Path(tmp) / 'themes'
+        corpus_dir.mkdir()
+        write_corpus(corpus_dir, args.themes, seed=1)
+        theme_files = sorted(corpus_dir.iterdir())
+
+        timings = {}
+        for mode in ('batch', 'pipeline'):
+            output_dir = Path(tmp) / mode
+            output_dir.mkdir()
+            start = time.perf_counter()
+            with redirect_stdout(StringIO()):
+                converter.convert_batch(theme_files, output_dir, jobs=args.jobs, pipeline=mode == 'pipeline')
+            timings[mode] = time.perf_counter() - start
+
+        batch_jars = sorted((Path(tmp) / 'batch').glob('*.jar'))
+        for jar in batch_jars:
+            if jar.read_bytes() != (Path(tmp) / 'pipeline' / jar.name).read_bytes():
+                print(f"Error: {jar.name} differs between batch and pipeline output")
+                sys.exit(1)
+
+    print(f"Converted {len(batch_jars)} themes, identical JARs, {args.latency:g} ms simulated write latency, "
+          f"{args.read_latency:g} ms read latency")
+    for mode, seconds in timings.items():
+        print(f"  {mode:<9} {seconds * 1e3:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
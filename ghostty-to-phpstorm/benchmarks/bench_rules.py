@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the derivation rules
+
+Compiles the default rules for dark and light themes and reports how many
+output keys they fill against how many distinct steps they compile to.
+Derives a random theme collection with the compiled rules and with every
+key's expression evaluated on its own, as hard-coded derivations would,
+checking both agree and timing each. Then merges an override file over the
+defaults and checks only the overridden keys (and those sharing their
+names) change.
+
+Usage:
+    python benchmarks/bench_rules.py [--themes 400] [--seed 1]
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+
+from corpus import load_converter, random_theme
+
+OVERRIDES = {
+    'names': {'hover_bg': 'blend(bg, accent, 0.15)'},
+    'ui': {'Editor.background': 'brightness(bg, 0.02, -0.02)', 'Tree.rowHeight': 24, 'Icons.yellowForeground': None,
+           'Editor.SearchField.background': 'saturation(panel_bg, 0.1, -0.1)'},
+}
+
+
+def flatten(section: dict, prefix: str = '') -> dict:
+    """Flatten nested rule sections into dotted keys"""
+    items = {}
+    for key, value in section.items():
+        if isinstance(value, dict):
+            items.update(flatten(value, f"{prefix}{key}."))
+        else:
+            items[f"{prefix}{key}"] = value
+    return items
+
+
+def evaluate_unshared(converter, compiled, theme, derivator) -> dict:
+    """Evaluate every key's expression on its own, repeating shared subexpressions"""
+    handlers = {
+        'attribute': lambda attribute: getattr(theme, attribute),
+        'palette': theme.palette.get,
+        'adjust_brightness': derivator.adjust_brightness,
+        'adjust_saturation': derivator.adjust_saturation,
+        'blend_colors': derivator.blend_colors,
+        'ensure_contrast': derivator.ensure_contrast,
+    }
+
+    def value(index):
+        operation, args, refs = compiled.steps[index]
+        args = [value(arg.index) if position in refs else arg for position, arg in enumerate(args)]
+        return handlers[operation](*args)
+
+    return {section: {key: value(leaf.index) if isinstance(leaf, converter._RuleRef) else leaf
+                      for key, leaf in flatten(layout).items()}
+            for section, layout in compiled.sections.items()}
+
+
+def count_unshared(converter, compiled) -> int:
+    """Steps evaluated per theme when no key shares work with another"""
+    sizes = []
+    for operation, args, refs in compiled.steps:
+        sizes.append(1 + sum(sizes[args[position].index] for position in refs))
+    return sum(sizes[leaf.index] for layout in compiled.sections.values()
+               for leaf in flatten(layout).values() if isinstance(leaf, converter._RuleRef))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark compiled derivation rules')
+    parser.add_argument('--themes', type=int, default=400, help='Number of random themes')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for theme palettes')
+    args = parser.parse_args()
+
+    converter = load_converter()
+    rules = converter.DEFAULT_RULES
+    rng = random.Random(args.seed)
+    themes = [random_theme(converter, rng, i) for i in range(args.themes)]
+    for theme in themes[::3]:
+        theme.background = "#f0f0f0"
+
+    for is_dark in (True, False):
+        compiled = rules.compile(is_dark)
+        keys = sum(len(flatten(layout)) for layout in compiled.sections.values())
+        print(f"{'dark' if is_dark else 'light':<6} {keys} keys, {len(compiled.steps)} distinct steps, "
+              f"{count_unshared(converter, compiled)} steps unshared")
+
+    # Use a derivator without memoization, so each derivation costs what it would on a cold cache
+    class UncachedDerivator(converter.ColorDerivator):
+        adjust_brightness = staticmethod(converter.ColorDerivator.adjust_brightness.__wrapped__)
+        adjust_saturation = staticmethod(converter.ColorDerivator.adjust_saturation.__wrapped__)
+        blend_colors = staticmethod(converter.ColorDerivator.blend_colors.__wrapped__)
+
+    derivator = UncachedDerivator()
+    start = time.perf_counter()
+    shared = [rules.evaluate(theme, derivator) for theme in themes]
+    shared_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    unshared = [evaluate_unshared(converter, rules.compile(theme.is_dark), theme, derivator) for theme in themes]
+    unshared_time = time.perf_counter() - start
+
+    errors = 0
+    for theme, result, expected in zip(themes, shared, unshared):
+        if {section: flatten(layout) for section, layout in result.items()} != expected:
+            print(f"Error: {theme.name} differs between shared and unshared evaluation")
+            errors += 1
+
+    print(f"Derived {len(themes)} themes")
+    print(f"  shared   {shared_time / len(themes) * 1e6:8.1f} µs/theme")
+    print(f"  unshared {unshared_time / len(themes) * 1e6:8.1f} µs/theme")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'rules.json'
+        path.write_text(json.dumps(OVERRIDES))
+        custom = converter.DerivationRules.load(path)
+
+    # hover_bg feeds these keys, so they change with it
+    hover_keys = {key for key, rule in flatten(converter.DERIVATION_RULES['ui']).items()
+                  if isinstance(rule, str) and 'hover_bg' in rule}
+    expected_keys = hover_keys | set(OVERRIDES['ui'])
+    for theme in themes[:20]:
+        default_ui = flatten(converter.PhpStormThemeGenerator(theme).generate_theme_json()['ui'])
+        custom_ui = flatten(converter.PhpStormThemeGenerator(theme, rules=custom).generate_theme_json()['ui'])
+        changed = {key for key in default_ui.keys() | custom_ui.keys() if default_ui.get(key) != custom_ui.get(key)}
+        if not changed <= expected_keys or 'Icons.yellowForeground' in custom_ui or custom_ui['Tree.rowHeight'] != 24:
+            print(f"Error: {theme.name} overrides changed {sorted(changed - expected_keys)}")
+            errors += 1
+    print(f"Overrides changed only their own keys and the {len(hover_keys)} keys using hover_bg")
+
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
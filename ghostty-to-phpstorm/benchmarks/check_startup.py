@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Startup regression check for single theme conversions
+
+Converts one theme per output mode under `python -X importtime`, failing if
+a mode imports a module it should leave to other modes, or if the modules
+the converter imports on top of a bare interpreter take longer than the
+budget. Import and run times are the median of several runs, as single
+runs vary by ten milliseconds or more.
+
+Usage:
+    python benchmarks/check_startup.py [--budget 60] [--repeat 7]
+"""
+
+import sys
+import time
+import statistics
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+from corpus import write_corpus
+
+CONVERTER = Path(__file__).resolve().parent.parent / 'ghostty-to-phpstorm.py'
+
+# Modules that only parallel batches, the pipeline, the daemon, the theme
+# index or profiling need. (argparse itself imports shutil, and zipfile
+# imports threading.)
+NEVER_SINGLE = {'asyncio', 'concurrent.futures', 'socket', 'socketserver', 'sqlite3', 'tracemalloc'}
+
+MODES = {
+    'icls': (['--icls'], NEVER_SINGLE | {'zipfile', 'threading', 'uuid', 'hashlib'}),
+    'jar': ([], NEVER_SINGLE),
+    'dir': (['--dir'], NEVER_SINGLE | {'zipfile', 'threading'}),
+}
+
+
+def import_times(argv):
+    """Run a command under -X importtime, returning self time in µs per imported module"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', *argv], capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, _, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(self_time)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check single theme conversion startup')
+    # The JAR mode's median is about 45 ms, so this leaves a margin for noise but not for a new heavy import
+    parser.add_argument('--budget', type=float, default=60.0,
+                        help='Milliseconds allowed for the converter\'s own imports (default: 60)')
+    parser.add_argument('--repeat', type=int, default=7, help='Runs per mode, the median counts (default: 7)')
+    args = parser.parse_args()
+
+    baseline = set(import_times(['-c', 'pass']))
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        write_corpus(Path(tmp), 1, seed=1)
+        theme = next(Path(tmp).iterdir())
+
+        for mode, (options, forbidden) in MODES.items():
+            import_runs, wall_runs = [], []
+            for _ in range(args.repeat):
+                output_dir = Path(tmp) / f"out-{mode}"
+                start = time.perf_counter()
+                times = import_times([str(CONVERTER), *options, str(theme), str(output_dir)])
+                wall_runs.append(time.perf_counter() - start)
+                added = {name: us for name, us in times.items() if name not in baseline}
+                import_runs.append(sum(added.values()) / 1000)
+            imports, wall = statistics.median(import_runs), statistics.median(wall_runs)
+
+            unexpected = sorted(forbidden & set(added))
+            status = 'ok'
+            if unexpected:
+                status = f"imports {', '.join(unexpected)}"
+                failures += 1
+            elif imports > args.budget:
+                status = f"over the {args.budget:g} ms budget"
+                failures += 1
+            print(f"{mode:<5} imports {imports:6.1f} ms ({len(added)} modules), "
+                  f"run {wall * 1e3:6.1f} ms  {status}")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Shared helpers for the converter benchmarks
+
+Loads the converter script as a module and builds synthetic Ghostty theme
+corpora with seeded random palettes, either in memory or as theme files.
+"""
+
+import sys
+import random
+import importlib.util
+from pathlib import Path
+
+CONVERTER_PATH = Path(__file__).resolve().parent.parent / "ghostty-to-phpstorm.py"
+
+BASE_KEYS = ('background', 'foreground', 'cursor-color', 'cursor-text',
+             'selection-background', 'selection-foreground')
+
+
+def load_converter():
+    """Import the converter script despite the dash in its file name"""
+    if "ghostty_to_phpstorm" in sys.modules:
+        return sys.modules["ghostty_to_phpstorm"]
+
+    spec = importlib.util.spec_from_file_location("ghostty_to_phpstorm", CONVERTER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def random_theme(converter, rng: random.Random, index: int):
+    """Build a theme with a seeded random palette"""
+    def color():
+        return f"#{rng.randrange(1 << 24):06x}"
+
+    theme = converter.GhosttyTheme(f"bench-{index}")
+    theme.background = color()
+    theme.foreground = color()
+    theme.selection_background = color()
+    theme.selection_foreground = color()
+    for i in range(16):
+        theme.palette[i] = color()
+    return theme
+
+
+def write_corpus(directory: Path, count: int, seed: int):
+    """Write a synthetic corpus of Ghostty themes with seeded random palettes"""
+    rng = random.Random(seed)
+
+    def color():
+        return f"#{rng.randrange(1 << 24):06x}"
+
+    for i in range(count):
+        lines = [f"palette = {index}={color()}" for index in range(16)]
+        lines += [f"{key} = {color()}" for key in BASE_KEYS]
+        (directory / f"theme-{i}").write_text('\n'.join(lines) + '\n')
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Stage benchmark suite for the Ghostty to PhpStorm converter
+
+Generates synthetic corpora of Ghostty themes with seeded random palettes and
+times each stage of the conversion separately: parse, derive, theme JSON,
+editor scheme XML, plugin.xml and JAR packaging. Results are written as JSON
+and can be compared against a saved baseline, failing when any stage
+regresses past a threshold.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --sizes 10,400 --compare baseline.json --threshold 0.25
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+
+from corpus import load_converter, write_corpus
+
+STAGES = ('parse', 'derive', 'theme_json', 'scheme_xml', 'plugin_xml', 'jar')
+
+
+def clear_caches(converter):
+    """Reset memoized color math, so every run starts cold"""
+    for cache in (converter.hex_to_rgb, converter.rgb_to_hex, converter.rgb_to_hsv,
+                  converter.ColorDerivator.adjust_brightness, converter.ColorDerivator.adjust_saturation,
+                  converter.ColorDerivator.blend_colors):
+        cache.cache_clear()
+
+
+def run_stages(converter, theme_files, jar_dir: Path) -> dict:
+    """Run every stage over the corpus once, returning seconds per stage"""
+    timings = {}
+    clear_caches(converter)
+
+    start = time.perf_counter()
+    themes = [converter.GhosttyParser.parse_theme_file(theme_file) for theme_file in theme_files]
+    timings['parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    generators = [converter.PhpStormThemeGenerator(theme) for theme in themes]
+    templates = [converter.ThemeTemplate.for_theme(theme) for theme in themes]
+    values = [template.evaluate(generator) for template, generator in zip(templates, generators)]
+    timings['derive'] = time.perf_counter() - start
+
+    rendered = {}
+    for stage, attribute in (('theme_json', 'theme_json'), ('scheme_xml', 'scheme_xml'), ('plugin_xml', 'plugin_xml')):
+        start = time.perf_counter()
+        rendered[stage] = [getattr(template, attribute).render(theme_values)
+                           for template, theme_values in zip(templates, values)]
+        timings[stage] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i, theme in enumerate(themes):
+        plugin_files = {
+            "META-INF/plugin.xml": rendered['plugin_xml'][i],
+            f"resources/{theme.name}.theme.json": rendered['theme_json'][i],
+            f"resources/{theme.name}.xml": converter.XML_DECLARATION + rendered['scheme_xml'][i],
+        }
+        converter.create_jar_file(plugin_files, jar_dir / f"{theme.name}-theme.jar")
+    timings['jar'] = time.perf_counter() - start
+
+    return timings
+
+
+def benchmark_size(converter, size: int, seed: int, repeat: int) -> dict:
+    """Best-of-N stage timings for a corpus of the given size"""
+    best = {stage: float('inf') for stage in STAGES}
+    with tempfile.TemporaryDirectory() as scratch:
+        corpus_dir = Path(scratch) / "themes"
+        jar_dir = Path(scratch) / "jars"
+        corpus_dir.mkdir()
+        jar_dir.mkdir()
+        write_corpus(corpus_dir, size, seed)
+        theme_files = sorted(corpus_dir.iterdir())
+
+        for _ in range(repeat):
+            for stage, seconds in run_stages(converter, theme_files, jar_dir).items():
+                best[stage] = min(best[stage], seconds)
+
+    return {stage: {'seconds': seconds, 'per_theme_us': seconds / size * 1e6} for stage, seconds in best.items()}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """List every stage that got slower per theme than the baseline allows"""
+    regressions = []
+    for size, stages in results['sizes'].items():
+        for stage, timing in stages.items():
+            reference = baseline.get('sizes', {}).get(size, {}).get(stage)
+            if not reference:
+                continue
+            ratio = timing['per_theme_us'] / reference['per_theme_us']
+            if ratio > 1 + threshold:
+                regressions.append((size, stage, reference['per_theme_us'], timing['per_theme_us'], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark each stage of the theme conversion')
+    parser.add_argument('--sizes', default='10,400,10000', help='Comma-separated corpus sizes')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for theme palettes')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per size, best time per stage is kept')
+    parser.add_argument('--output', type=Path, help='Write results as JSON to this file')
+    parser.add_argument('--compare', type=Path, metavar='BASELINE', help='Baseline results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown per stage before --compare fails (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    converter = load_converter()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    results = {
+        'converter_version': converter.CONVERTER_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'sizes': {},
+    }
+
+    print(f"{'themes':>7}  " + ''.join(f"{stage:>12}" for stage in STAGES) + "   (µs/theme)")
+    for size in sizes:
+        stages = benchmark_size(converter, size, args.seed, args.repeat)
+        results['sizes'][str(size)] = stages
+        print(f"{size:>7}  " + ''.join(f"{stages[stage]['per_theme_us']:>12.1f}" for stage in STAGES))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions beyond {args.threshold:.0%}:")
+            for size, stage, before, after, ratio in regressions:
+                print(f"  ✗ {stage} at {size} themes: {before:.1f} → {after:.1f} µs/theme ({ratio:.2f}x)")
+            sys.exit(1)
+        print(f"\nNo stage regressed beyond {args.threshold:.0%} of {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Ghostty to PhpStorm Conversion Client
+
+Converts a single theme like ghostty-to-phpstorm.py, taking its --dir,
+--icls and --compression options. Sends the theme to a daemon started with
+`ghostty-to-phpstorm.py serve`, so each conversion skips Python start-up
+costs and the converter's imports. Loads the converter and handles the
+request in this process if no daemon is listening. Other options of the
+converter, such as --min-contrast, --formats or --install-to, need a run
+of ghostty-to-phpstorm.py itself (--rules can be given to serve instead).
+
+Usage:
+    python ghostty-to-phpstorm-client.py [ghostty_theme_path] [output_dir]
+    python ghostty-to-phpstorm-client.py --icls [ghostty_theme_path] [output_dir]
+    python ghostty-to-phpstorm-client.py --format json [ghostty_theme_path] [output_dir]  # Just the theme JSON
+"""
+
+import io
+import os
+import sys
+import json
+import socket
+import argparse
+from pathlib import Path
+from typing import BinaryIO, Dict, Tuple
+
+CONVERTER = Path(__file__).resolve().with_name('ghostty-to-phpstorm.py')
+
+
+def default_socket_path() -> Path:
+    """Where the conversion daemon listens unless told otherwise
+
+    Without $XDG_RUNTIME_DIR (as on macOS), the socket goes in a directory
+    of the user's own under /tmp, which serve creates readable by them only.
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return Path(runtime_dir) / f"ghostty-to-phpstorm-{os.getuid()}.sock"
+    return Path('/tmp') / f"ghostty-to-phpstorm-{os.getuid()}" / "daemon.sock"
+
+
+def read_response(stream: BinaryIO) -> Tuple[Dict, Dict[str, bytes]]:
+    """Read a response header and the files following it"""
+    header = json.loads(stream.readline())
+    files = {path: stream.read(size) for path, size in header.get('files', [])}
+    return header, files
+
+
+def request_conversion(socket_path: Path, request: Dict) -> Tuple[Dict, Dict[str, bytes]]:
+    """Send one request to the daemon, returning the response header and files"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(request).encode() + b'\n')
+        with sock.makefile('rb') as stream:
+            return read_response(stream)
+
+
+def convert_locally(request: Dict) -> Tuple[Dict, Dict[str, bytes]]:
+    """Handle a request in this process, exactly as the daemon would"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("ghostty_to_phpstorm", CONVERTER)
+    converter = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(converter)
+
+    response = io.BytesIO()
+    converter.handle_connection(io.BytesIO(json.dumps(request).encode() + b'\n'), response,
+                                converter.ConversionService())
+    response.seek(0)
+    return read_response(response)
+
+
+def output_file_path(output_path: Path, relative_path: str) -> Path:
+    """Where to write a returned file, refusing paths that would leave the output directory"""
+    root = output_path.resolve()
+    file_path = (root / relative_path).resolve()
+    if root not in file_path.parents:
+        raise ValueError(f"Refusing to write {relative_path!r} outside {output_path}")
+    return file_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a Ghostty theme through the conversion daemon')
+    parser.add_argument('input', help='Input Ghostty theme file')
+    parser.add_argument('output', help='Output directory for PhpStorm themes')
+    parser.add_argument('--dir', action='store_true', help='Create a theme directory instead of a JAR file')
+    parser.add_argument('--icls', action='store_true', help='Create an .icls color scheme file for direct import')
+    parser.add_argument('--format', choices=['jar', 'dir', 'icls', 'json', 'xml'],
+                        help='Output to create (overrides --dir and --icls)')
+    parser.add_argument('--compression', help='JAR compression, as for ghostty-to-phpstorm.py')
+    parser.add_argument('--socket', type=Path, default=default_socket_path(), help='Daemon socket path')
+    args = parser.parse_args()
+
+    input_path = Path(args.input)
+    output_path = Path(args.output)
+    output_format = args.format or ('icls' if args.icls else 'dir' if args.dir else 'jar')
+
+    if not input_path.is_file():
+        print(f"Error: Input theme {input_path} does not exist")
+        sys.exit(1)
+
+    # The converter reads the file itself, decoding it just as a run of ghostty-to-phpstorm.py would
+    request = {'name': input_path.name, 'path': str(input_path.resolve()), 'format': output_format}
+    if args.compression:
+        request['compression'] = args.compression
+
+    try:
+        # Anyone could have created a socket in a shared directory, so only trust our own
+        if args.socket.stat().st_uid != os.getuid():
+            print(f"Error: {args.socket} belongs to another user, not sending it the theme")
+            sys.exit(1)
+        header, files = request_conversion(args.socket, request)
+    except (FileNotFoundError, ConnectionRefusedError):
+        # No daemon, so convert in this process instead
+        header, files = convert_locally(request)
+
+    print(f"Converting {input_path.name}...")
+    for warning in header.get('warnings', []):
+        print(f"  ! {input_path.name}, {warning}")
+    if not header['ok']:
+        print(f"  ✗ Failed to convert {input_path.name}: {header['error']}")
+        sys.exit(1)
+
+    try:
+        file_paths = {relative_path: output_file_path(output_path, relative_path) for relative_path in files}
+    except ValueError as e:
+        print(f"  ✗ Failed to convert {input_path.name}: {e}")
+        sys.exit(1)
+
+    for relative_path, content in files.items():
+        file_path = file_paths[relative_path]
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+    print(f"  ✓ Generated {output_format.upper()}: {output_path / next(iter(files)).split('/')[0]}")
+
+
+if __name__ == '__main__':
+    main()
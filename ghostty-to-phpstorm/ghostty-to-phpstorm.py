@@ -10,157 +10,1442 @@ Usage:
     python ghostty-to-phpstorm.py [ghostty_theme_path] [output_dir]
     python ghostty-to-phpstorm.py --batch [ghostty_themes_dir] [output_dir]
     python ghostty-to-phpstorm.py --dir [ghostty_theme_path] [output_dir]  # Create theme directories instead of JAR files
+    python ghostty-to-phpstorm.py --batch --jobs 8 [ghostty_themes_dir] [output_dir]  # Convert themes in parallel
+    python ghostty-to-phpstorm.py --batch --force [ghostty_themes_dir] [output_dir]  # Rebuild unchanged themes too
+    python ghostty-to-phpstorm.py --batch --formats jar,icls [ghostty_themes_dir] [output_dir]  # Several formats in one pass
+    python ghostty-to-phpstorm.py --batch --rules my-rules.json [ghostty_themes_dir] [output_dir]  # Custom derivation rules
+    python ghostty-to-phpstorm.py --batch --install-to [plugins_dir] [ghostty_themes_dir] [output_dir]  # Sync changed plugins into the IDE
+    python ghostty-to-phpstorm.py serve [--socket PATH]  # Conversion daemon for ghostty-to-phpstorm-client.py
+    python ghostty-to-phpstorm.py duplicates [ghostty_themes_dir]  # List duplicate and near-duplicate themes
+    python ghostty-to-phpstorm.py index [ghostty_themes_dir] --where "dark and contrast >= 7"  # Index and query themes
 """
 
+# Only what every conversion needs is imported here. Modules used by a
+# single mode (zipfile, uuid, asyncio, the daemon's socket modules, ...)
+# are imported where they are used, keeping single theme runs fast to start.
+import io
 import os
 import sys
 import json
-import uuid
+import re
+import math
+import mmap
+import struct
 import argparse
 import colorsys
-import zipfile
+import time
+from array import array
+from contextlib import contextmanager, nullcontext
+from functools import cached_property, lru_cache, partial
+from itertools import product
+from json.encoder import encode_basestring_ascii
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
-from xml.etree.ElementTree import Element, SubElement, tostring
-from xml.dom import minidom
+from typing import BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Tuple, Optional, Sequence, TextIO, Union
+
+# Bump whenever generated output changes, so incremental builds regenerate everything
+CONVERTER_VERSION = "1.3.0"
+
+# Theme ids are derived from theme names under this domain, so they are stable across builds
+THEME_ID_DOMAIN = "theme.ghostty.com"
+
+# Plugin ids of single theme JARs start with this, which marks installed plugins as the converter's own
+PLUGIN_ID_PREFIX = "com.ghostty.theme."
+
+
+@lru_cache(maxsize=4096)
+def hex_to_rgb(hex_color: str) -> int:
+    """Parse a hex color into a packed 0xRRGGBB integer"""
+    hex_color = hex_color.lstrip('#')
+    r, g, b = [int(hex_color[i:i+2], 16) for i in (0, 2, 4)]
+    return (r << 16) | (g << 8) | b
+
+
+@lru_cache(maxsize=4096)
+def rgb_to_hex(rgb: int) -> str:
+    """Format a packed RGB integer as a lowercase hex color"""
+    return f"#{rgb:06x}"
+
+
+@lru_cache(maxsize=4096)
+def rgb_to_hsv(rgb: int) -> Tuple[float, float, float]:
+    """Convert a packed RGB integer to HSV components"""
+    return colorsys.rgb_to_hsv(((rgb >> 16) & 0xff) / 255.0, ((rgb >> 8) & 0xff) / 255.0, (rgb & 0xff) / 255.0)
+
+
+# Linear light of each 8-bit sRGB channel level, so luminance is three lookups
+SRGB_TO_LINEAR = tuple(c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4
+                       for c in (level / 255.0 for level in range(256)))
+
+
+def rgb_luminance(rgb: int) -> float:
+    """Calculate relative luminance of a packed RGB integer"""
+    return (0.2126 * SRGB_TO_LINEAR[(rgb >> 16) & 0xff] + 0.7152 * SRGB_TO_LINEAR[(rgb >> 8) & 0xff]
+            + 0.0722 * SRGB_TO_LINEAR[rgb & 0xff])
+
+
+def luminance_contrast(l1: float, l2: float) -> float:
+    """WCAG contrast ratio between two relative luminances, from 1 to 21"""
+    return (l1 + 0.05) / (l2 + 0.05) if l1 > l2 else (l2 + 0.05) / (l1 + 0.05)
+
+
+def contrast_ratio(rgb1: int, rgb2: int) -> float:
+    """WCAG contrast ratio between two packed RGB integers"""
+    return luminance_contrast(rgb_luminance(rgb1), rgb_luminance(rgb2))
+
+
+@lru_cache(maxsize=4096)
+def rgb_to_lab(rgb: int) -> Tuple[float, float, float]:
+    """Convert a packed RGB integer to CIELAB (D65), where distance tracks perceived difference"""
+    r, g, b = SRGB_TO_LINEAR[(rgb >> 16) & 0xff], SRGB_TO_LINEAR[(rgb >> 8) & 0xff], SRGB_TO_LINEAR[rgb & 0xff]
+    x = (0.4124564 * r + 0.3575761 * g + 0.1804375 * b) / 0.95047
+    y = 0.2126729 * r + 0.7151522 * g + 0.0721750 * b
+    z = (0.0193339 * r + 0.1191920 * g + 0.9503041 * b) / 1.08883
+
+    def f(t):
+        return t ** (1 / 3) if t > 0.008856451679035631 else t / 0.12841854934601665 + 4 / 29
+
+    fx, fy, fz = f(x), f(y), f(z)
+    return 116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)
+
+
+def hsv_to_rgb(h: float, s: float, v: float) -> int:
+    """Convert HSV components to a packed RGB integer, truncating each channel"""
+    r, g, b = colorsys.hsv_to_rgb(h, s, v)
+    return (int(r*255) << 16) | (int(g*255) << 8) | int(b*255)
+
+
+def read_small_file(file_path: Path) -> bytes:
+    """Read a whole file with plain os calls, which for files of a few KB is several times faster than open()"""
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        chunks = []
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+
+
+def parse_color(value: str) -> int:
+    """Parse a #rrggbb, #rgb or bare hex color into a packed RGB integer"""
+    digits = value[1:] if value[:1] == '#' else value
+    # isascii/isalnum rule out signs, underscores and whitespace, which int() would accept
+    if digits.isascii() and digits.isalnum():
+        try:
+            if len(digits) == 6:
+                return int(digits, 16)
+            if len(digits) == 3:
+                return int(digits[0] * 2 + digits[1] * 2 + digits[2] * 2, 16)
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid color '{value}'")
+
+
+class ThemePalette:
+    """Fixed 256-entry palette of packed RGB colors with a presence bitmap
+
+    Behaves like the Dict[int, str] of hex colors it replaces, so lookups
+    still return hex strings, but stores one 32-bit integer per entry.
+    """
+
+    __slots__ = ('colors', 'present')
+
+    SIZE = 256
+
+    def __init__(self):
+        self.colors = array('I', bytes(4 * self.SIZE))
+        self.present = 0
+
+    def __setitem__(self, index: int, color: str):
+        if not 0 <= index < self.SIZE:
+            raise ValueError(f"Palette index {index} out of range")
+        self.colors[index] = parse_color(color)
+        self.present |= 1 << index
+
+    def __getitem__(self, index: int) -> str:
+        if index not in self:
+            raise KeyError(index)
+        return rgb_to_hex(self.colors[index])
+
+    def __contains__(self, index) -> bool:
+        return isinstance(index, int) and 0 <= index < self.SIZE and bool(self.present >> index & 1)
+
+    def __len__(self) -> int:
+        return bin(self.present).count('1')
+
+    def get(self, index: int, default: Optional[str] = None) -> Optional[str]:
+        return rgb_to_hex(self.colors[index]) if index in self else default
+
+    def keys(self) -> List[int]:
+        return [index for index in range(self.SIZE) if self.present >> index & 1]
+
+    def items(self) -> List[Tuple[int, str]]:
+        return [(index, rgb_to_hex(self.colors[index])) for index in self.keys()]
+
+
+def _color_attribute(index: int, doc: str) -> property:
+    """Hex color property backed by a packed integer in GhosttyTheme.colors"""
+    def getter(self) -> str:
+        return rgb_to_hex(self.colors[index])
+
+    def setter(self, value: str):
+        self.colors[index] = parse_color(value)
+
+    return property(getter, setter, doc=doc)
 
 
 class GhosttyTheme:
-    """Represents a parsed Ghostty theme"""
+    """Represents a parsed Ghostty theme
+
+    Colors are stored as packed RGB integers and exposed as normalized
+    lowercase #rrggbb strings.
+    """
+
+    __slots__ = ('name', 'palette', 'colors', 'diagnostics')
+
+    COLOR_ATTRIBUTES = ('background', 'foreground', 'cursor_color', 'cursor_text',
+                        'selection_background', 'selection_foreground')
+
+    background = _color_attribute(0, "Background color")
+    foreground = _color_attribute(1, "Foreground color")
+    cursor_color = _color_attribute(2, "Cursor color")
+    cursor_text = _color_attribute(3, "Cursor text color")
+    selection_background = _color_attribute(4, "Selection background color")
+    selection_foreground = _color_attribute(5, "Selection foreground color")
 
     def __init__(self, name: str):
         self.name = name
-        self.palette: Dict[int, str] = {}
-        self.background = "#000000"
-        self.foreground = "#ffffff"
-        self.cursor_color = "#ffffff"
-        self.cursor_text = "#000000"
-        self.selection_background = "#ffffff"
-        self.selection_foreground = "#000000"
+        self.palette = ThemePalette()
+        self.colors = array('I', [0x000000, 0xffffff, 0xffffff, 0x000000, 0xffffff, 0x000000])
+        self.diagnostics: List[ParseDiagnostic] = []
 
     @property
     def is_dark(self) -> bool:
         """Determine if theme is dark based on background luminance"""
-        return self._get_luminance(self.background) < 0.5
+        return rgb_luminance(self.colors[0]) < 0.5
 
     def _get_luminance(self, hex_color: str) -> float:
         """Calculate relative luminance of a hex color"""
-        hex_color = hex_color.lstrip('#')
-        r, g, b = [int(hex_color[i:i+2], 16) / 255.0 for i in (0, 2, 4)]
+        return rgb_luminance(hex_to_rgb(hex_color))
 
-        # Convert to linear RGB
-        def to_linear(c):
-            return c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4
 
-        r_lin, g_lin, b_lin = map(to_linear, [r, g, b])
-        return 0.2126 * r_lin + 0.7152 * g_lin + 0.0722 * b_lin
+class ColorDerivator:
+    """Derives additional colors from base theme colors
 
+    Colors are parsed once into packed RGB integers and every derivation is
+    memoized, since a theme derives dozens of colors from the same few inputs.
+    """
 
-class ColorDerivator:
-    """Derives additional colors from base theme colors"""
+    # Minimum contrast ratio per role ('text' or 'ui'), none unless enforced
+    contrast_targets: Dict[str, float] = {}
 
     @staticmethod
+    @lru_cache(maxsize=8192)
     def adjust_brightness(hex_color: str, factor: float) -> str:
         """Adjust color brightness by factor (-1.0 to 1.0)"""
-        hex_color = hex_color.lstrip('#')
-        r, g, b = [int(hex_color[i:i+2], 16) / 255.0 for i in (0, 2, 4)]
-
-        h, s, v = colorsys.rgb_to_hsv(r, g, b)
+        h, s, v = rgb_to_hsv(hex_to_rgb(hex_color))
         v = max(0, min(1, v + factor))
 
-        r, g, b = colorsys.hsv_to_rgb(h, s, v)
-        return f"#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}"
+        return rgb_to_hex(hsv_to_rgb(h, s, v))
 
     @staticmethod
+    @lru_cache(maxsize=8192)
     def adjust_saturation(hex_color: str, factor: float) -> str:
         """Adjust color saturation by factor (-1.0 to 1.0)"""
-        hex_color = hex_color.lstrip('#')
-        r, g, b = [int(hex_color[i:i+2], 16) / 255.0 for i in (0, 2, 4)]
-
-        h, s, v = colorsys.rgb_to_hsv(r, g, b)
+        h, s, v = rgb_to_hsv(hex_to_rgb(hex_color))
         s = max(0, min(1, s + factor))
 
-        r, g, b = colorsys.hsv_to_rgb(h, s, v)
-        return f"#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}"
+        return rgb_to_hex(hsv_to_rgb(h, s, v))
 
     @staticmethod
+    @lru_cache(maxsize=8192)
     def blend_colors(color1: str, color2: str, ratio: float = 0.5) -> str:
         """Blend two hex colors with given ratio (0.0 = color1, 1.0 = color2)"""
-        c1 = color1.lstrip('#')
-        c2 = color2.lstrip('#')
+        c1 = hex_to_rgb(color1)
+        c2 = hex_to_rgb(color2)
+
+        rgb = 0
+        for shift in (16, 8, 0):
+            channel = int(((c1 >> shift) & 0xff) * (1 - ratio) + ((c2 >> shift) & 0xff) * ratio)
+            rgb |= channel << shift
+
+        return rgb_to_hex(rgb)
+
+    def ensure_contrast(self, hex_color: str, against: str, role: str) -> str:
+        """Adjust a color to reach the contrast target for its role against another color
+
+        Colors are left as derived unless contrast targets are enforced
+        (see ContrastDerivator).
+        """
+        return hex_color
+
+
+class PrecomputedDerivator(ColorDerivator):
+    """ColorDerivator that answers from colors derived ahead of time
+
+    Any derivation missing from the precomputed results falls back to the
+    regular per-color math, so results never depend on what was precomputed.
+    """
+
+    def __init__(self, brightness: Dict[Tuple[str, float], str], blends: Dict[Tuple[str, str, float], str],
+                 saturation: Optional[Dict[Tuple[str, float], str]] = None):
+        self.brightness = brightness
+        self.blends = blends
+        self.saturation = saturation or {}
+
+    def adjust_brightness(self, hex_color: str, factor: float) -> str:
+        result = self.brightness.get((hex_color, factor))
+        return result if result is not None else ColorDerivator.adjust_brightness(hex_color, factor)
+
+    def adjust_saturation(self, hex_color: str, factor: float) -> str:
+        result = self.saturation.get((hex_color, factor))
+        return result if result is not None else ColorDerivator.adjust_saturation(hex_color, factor)
+
+    def blend_colors(self, color1: str, color2: str, ratio: float = 0.5) -> str:
+        result = self.blends.get((color1, color2, ratio))
+        return result if result is not None else ColorDerivator.blend_colors(color1, color2, ratio)
+
+
+# WCAG 2.1 minimum contrast for user interface components such as borders
+NON_TEXT_CONTRAST = 3.0
+
+
+class ContrastDerivator(ColorDerivator):
+    """ColorDerivator that holds low-contrast derived colors to a WCAG contrast ratio
+
+    Text colors must reach min_contrast against the color they are read on,
+    borders and other non-text colors min_contrast or 3:1, whichever is lower.
+    Colors short of their target are moved by the smallest change of HSV
+    value that reaches it, away from the other color. Other
+    derivations are left to base.
+    """
+
+    def __init__(self, min_contrast: float, base: Optional[ColorDerivator] = None):
+        self.contrast_targets = {'text': min_contrast, 'ui': min(min_contrast, NON_TEXT_CONTRAST)}
+        self.base = base or ColorDerivator()
+
+    def adjust_brightness(self, hex_color: str, factor: float) -> str:
+        return self.base.adjust_brightness(hex_color, factor)
+
+    def adjust_saturation(self, hex_color: str, factor: float) -> str:
+        return self.base.adjust_saturation(hex_color, factor)
+
+    def blend_colors(self, color1: str, color2: str, ratio: float = 0.5) -> str:
+        return self.base.blend_colors(color1, color2, ratio)
+
+    def ensure_contrast(self, hex_color: str, against: str, role: str) -> str:
+        return self.reach_contrast(hex_color, against, self.contrast_targets[role])
+
+    @staticmethod
+    @lru_cache(maxsize=8192)
+    def reach_contrast(hex_color: str, against: str, ratio: float) -> str:
+        """Change a color's HSV value as little as possible to reach ratio against another color
+
+        The color only moves further from the other color's luminance, so it
+        stays on the same side of it. Luminance only grows with value, making
+        this a binary search over the 256 value levels. If even the lightest
+        (or darkest) level falls short, that level is returned, or the color
+        unchanged if it is already at that level.
+        """
+        rgb = hex_to_rgb(hex_color)
+        other = rgb_luminance(hex_to_rgb(against))
+        luminance = rgb_luminance(rgb)
+        if luminance_contrast(luminance, other) >= ratio:
+            return hex_color
+
+        h, s, v = rgb_to_hsv(rgb)
+        lighter = luminance >= other
+
+        def reaches(level: int) -> bool:
+            return luminance_contrast(rgb_luminance(hsv_to_rgb(h, s, level / 255)), other) >= ratio
+
+        # Invariant: the level at reached reaches ratio (or is the extreme), the one at short does not
+        short, reached = round(v * 255), 255 if lighter else 0
+        if short == reached:
+            # Converting back from HSV would only round the color, maybe lowering its contrast
+            return hex_color
+        while abs(reached - short) > 1:
+            middle = (short + reached) // 2
+            if reaches(middle):
+                reached = middle
+            else:
+                short = middle
+        return rgb_to_hex(hsv_to_rgb(h, s, reached / 255))
+
+
+# Theme JSON colors as rules. Every string is an expression over the theme's
+# colors (background, foreground, cursor_color, cursor_text,
+# selection_background, selection_foreground), the names defined under
+# 'names', #rrggbb literals and these functions:
+#
+#   palette(index, default)        palette color, or default if the theme has none
+#   brightness(color, dark, light) HSV value shifted by dark on dark themes, light on light ones
+#   saturation(color, dark, light) the same for HSV saturation
+#   blend(color1, color2, ratio)   mix of two colors, 0 being color1 and 1 color2
+#   contrast(color, against, role) color held to the contrast target for role, text or ui
+#   pick(dark, light)              dark on dark themes, light on light ones
+#
+# Other values (numbers) are copied as they are. A --rules file uses the same
+# layout, and is merged over these rules: its keys replace or add to them,
+# and a null removes a key.
+DERIVATION_RULES = {
+    'names': {
+        'bg': 'background',
+        'fg': 'foreground',
+        'accent': 'palette(4, #0078d4)',
+        'error': 'palette(1, #ff0000)',
+        'warning': 'palette(3, #ffaa00)',
+        'success': 'palette(2, #00aa00)',
+        'panel_bg': 'brightness(bg, 0.1, -0.05)',
+        'border_color': 'contrast(brightness(bg, 0.2, -0.15), bg, ui)',
+        'hover_bg': 'brightness(bg, 0.15, -0.1)',
+        'pressed_bg': 'brightness(bg, -0.1, -0.2)',
+        'inactive_bg': 'brightness(bg, 0.05, -0.03)',
+        'lighter_bg': 'brightness(bg, 0.2, -0.1)',
+        'disabled_fg': 'contrast(brightness(fg, -0.4, 0.4), bg, text)',
+        'info_fg': 'contrast(brightness(fg, -0.3, 0.3), bg, text)',
+        'selection_inactive_bg': 'contrast(brightness(selection_background, -0.2, 0.2), fg, text)',
+        'accent_secondary': 'brightness(accent, -0.1, 0.1)',
+    },
+    'colors': {
+        'primaryBackground': 'bg',
+        'primaryForeground': 'fg',
+        'selectionBackground': 'selection_background',
+        'selectionForeground': 'selection_foreground',
+        'accentColor': 'accent',
+        'secondaryAccentColor': 'accent_secondary',
+    },
+    'ui': {
+        # Global defaults
+        '*': {
+            'background': 'bg',
+            'foreground': 'fg',
+            'infoForeground': 'info_fg',
+            'selectionBackground': 'selection_background',
+            'selectionForeground': 'selection_foreground',
+            'selectionInactiveBackground': 'selection_inactive_bg',
+            'selectionBackgroundInactive': 'selection_inactive_bg',
+            'disabledForeground': 'disabled_fg',
+            'disabledBackground': 'brightness(bg, -0.05, 0.05)',
+            'acceleratorForeground': 'accent',
+            'acceleratorSelectionForeground': 'accent',
+            'errorForeground': 'error',
+            'borderColor': 'border_color',
+            'disabledBorderColor': 'brightness(border_color, -0.3, 0.3)',
+            'focusColor': 'accent',
+            'focusedBorderColor': 'accent',
+            'separatorColor': 'border_color',
+        },
+
+        # Main window and panels
+        'Window.background': 'bg',
+        'Panel.background': 'panel_bg',
+        'Window.border': 'lighter_bg',
+        'Dialog.background': 'panel_bg',
+        'Dialog.foreground': 'fg',
+        'Dialog.borderColor': 'border_color',
+        'DialogWrapper.southPanelBackground': 'panel_bg',
+        'OnePixelDivider.background': 'border_color',
+        'Borders.color': 'border_color',
+        'Borders.ContrastBorderColor': 'lighter_bg',
+
+        # Tool windows
+        'ToolWindow.background': 'panel_bg',
+        'ToolWindow.header.background': 'brightness(panel_bg, 0.05, -0.05)',
+        'ToolWindow.header.active.background': 'brightness(panel_bg, 0.1, -0.1)',
+        'ToolWindow.header.border.background': 'lighter_bg',
+        'ToolWindow.header.closeButton.background': 'panel_bg',
+        'ToolWindow.Button.selectedBackground': 'hover_bg',
+        'ToolWindow.Button.hoverBackground': 'hover_bg',
+        'ToolWindow.Button.selectedForeground': 'fg',
+        'ToolWindow.HeaderTab.selectedBackground': 'brightness(panel_bg, 0.15, -0.15)',
+        'ToolWindow.HeaderTab.selectedInactiveBackground': 'brightness(panel_bg, 0.05, -0.05)',
+        'ToolWindow.HeaderTab.hoverBackground': 'hover_bg',
+        'ToolWindow.HeaderTab.hoverInactiveBackground': 'brightness(hover_bg, -0.05, 0.05)',
+        'ToolWindow.HeaderCloseButton.background': 'panel_bg',
+
+        # Editor
+        'Editor.background': 'bg',
+        'EditorPane.background': 'bg',
+        'EditorPane.inactiveBackground': 'inactive_bg',
+        'EditorGroupsTabs.background': 'panel_bg',
+        'EditorTabs.background': 'panel_bg',
+        'EditorTabs.borderColor': 'border_color',
+        'EditorTabs.underlineColor': 'accent',
+        'EditorTabs.underlinedTabBackground': 'brightness(panel_bg, 0.1, -0.1)',
+        'EditorTabs.hoverBackground': 'hover_bg',
+        'EditorTabs.inactiveUnderlineColor': 'brightness(accent, -0.3, 0.3)',
+        'FileColor.Yellow': 'blend(bg, warning, 0.05)',
+        'FileColor.Green': 'blend(bg, success, 0.05)',
+        'FileColor.Blue': 'blend(bg, accent, 0.05)',
+        'FileColor.Violet': 'blend(bg, #9370DB, 0.05)',  # Medium purple
+        'FileColor.Orange': 'blend(bg, #FFA500, 0.05)',  # Orange
+        'FileColor.Rose': 'blend(bg, #FF007F, 0.05)',    # Rose
+
+        # Menus
+        'Menu.background': 'panel_bg',
+        'Menu.foreground': 'fg',
+        'Menu.borderColor': 'border_color',
+        'Menu.acceleratorForeground': 'brightness(fg, -0.2, 0.2)',
+        'Menu.selectionBackground': 'hover_bg',
+        'Menu.selectionForeground': 'fg',
+        'MenuItem.acceleratorForeground': 'brightness(fg, -0.2, 0.2)',
+        'MenuItem.selectionBackground': 'hover_bg',
+        'MenuItem.selectionForeground': 'fg',
+        'PopupMenu.background': 'panel_bg',
+        'PopupMenu.borderColor': 'border_color',
+        'MenuBar.background': 'bg',
+        'MenuBar.borderColor': 'border_color',
+
+        # UI Controls
+        'Button.background': 'panel_bg',
+        'Button.foreground': 'fg',
+        'Button.hoverBackground': 'hover_bg',
+        'Button.pressedBackground': 'pressed_bg',
+        'Button.focusedBorderColor': 'accent',
+        'Button.default.foreground': 'fg',
+        'Button.default.background': 'accent',
+        'Button.default.hoverBackground': 'brightness(accent, 0.1, -0.1)',
+        'Button.default.pressedBackground': 'brightness(accent, -0.1, 0.1)',
+        'Button.default.focusedBorderColor': 'brightness(accent, 0.2, -0.2)',
+        'CheckBox.background': 'bg',
+        'CheckBox.foreground': 'fg',
+        'CheckBox.select': 'accent',
+        'ComboBox.background': 'bg',
+        'ComboBox.foreground': 'fg',
+        'ComboBox.selectionBackground': 'hover_bg',
+        'ComboBox.selectionForeground': 'fg',
+        'ComboBox.disabledBackground': 'brightness(bg, -0.05, 0.05)',
+        'ComboBox.ArrowButton.background': 'panel_bg',
+        'ComboBox.ArrowButton.iconColor': 'fg',
+        'Component.borderColor': 'border_color',
+        'Component.focusedBorderColor': 'accent',
+        'Component.disabledBorderColor': 'brightness(border_color, -0.3, 0.3)',
+        'Component.errorFocusColor': 'error',
+        'Component.inactiveErrorFocusColor': 'brightness(error, -0.3, 0.3)',
+        'Component.warningFocusColor': 'warning',
+        'Component.inactiveWarningFocusColor': 'brightness(warning, -0.3, 0.3)',
+        'Link.activeForeground': 'accent',
+        'Link.hoverForeground': 'accent',
+        'Link.pressedForeground': 'accent',
+        'Link.visitedForeground': 'brightness(accent, -0.2, 0.2)',
+        'ToggleButton.background': 'panel_bg',
+        'ToggleButton.foreground': 'fg',
+        'ToggleButton.onBackground': 'accent',
+        'ToggleButton.onForeground': 'pick(#FFFFFF, #000000)',
+        'ToggleButton.offBackground': 'brightness(panel_bg, -0.1, 0.1)',
+        'ToggleButton.offForeground': 'fg',
+        'ToggleButton.buttonColor': 'fg',
+
+        # Trees and Lists
+        'Tree.background': 'bg',
+        'Tree.foreground': 'fg',
+        'Tree.selectionBackground': 'selection_background',
+        'Tree.selectionForeground': 'selection_foreground',
+        'Tree.selectionInactiveBackground': 'selection_inactive_bg',
+        'Tree.rowHeight': 20,
+        'List.background': 'bg',
+        'List.foreground': 'fg',
+        'List.selectionBackground': 'selection_background',
+        'List.selectionForeground': 'selection_foreground',
+        'List.selectionInactiveBackground': 'selection_inactive_bg',
+        'Table.background': 'bg',
+        'Table.foreground': 'fg',
+        'Table.selectionBackground': 'selection_background',
+        'Table.selectionForeground': 'selection_foreground',
+        'Table.stripeColor': 'brightness(bg, 0.05, -0.05)',
+        'Table.gridColor': 'border_color',
+
+        # Text fields
+        'TextField.background': 'bg',
+        'TextField.foreground': 'fg',
+        'TextField.selectionBackground': 'selection_background',
+        'TextField.selectionForeground': 'selection_foreground',
+        'TextArea.background': 'bg',
+        'TextArea.foreground': 'fg',
+        'TextArea.selectionBackground': 'selection_background',
+        'TextArea.selectionForeground': 'selection_foreground',
+        'FormattedTextField.background': 'bg',
+        'PasswordField.background': 'bg',
+        'TextPane.background': 'bg',
+        'TextPane.foreground': 'fg',
+        'EditorPane.selectionBackground': 'selection_background',
+
+        # Separators and Borders
+        'Separator.foreground': 'border_color',
+        'Separator.separatorColor': 'border_color',
+        'TabbedPane.tabSelectionHeight': 2,
+        'TabbedPane.tabAreaBackground': 'panel_bg',
+        'TabbedPane.background': 'bg',
+        'TabbedPane.underlineColor': 'accent',
+        'TabbedPane.hoverColor': 'hover_bg',
+        'TabbedPane.contentAreaColor': 'border_color',
+
+        # Status Bar
+        'StatusBar.background': 'panel_bg',
+        'StatusBar.foreground': 'fg',
+        'StatusBar.borderColor': 'border_color',
+        'StatusBar.hoverBackground': 'hover_bg',
+
+        # Progress Bar
+        'ProgressBar.background': 'panel_bg',
+        'ProgressBar.foreground': 'accent',
+        'ProgressBar.progressColor': 'accent',
+        'ProgressBar.indeterminateStartColor': 'accent',
+        'ProgressBar.indeterminateEndColor': 'accent_secondary',
+
+        # Scroll Bar
+        'ScrollBar.background': 'bg',
+        'ScrollBar.thumbColor': 'brightness(bg, 0.3, -0.3)',
+        'ScrollBar.thumbBorderColor': 'brightness(bg, 0.4, -0.4)',
+        'ScrollBar.hoverThumbColor': 'brightness(bg, 0.4, -0.4)',
+        'ScrollBar.hoverThumbBorderColor': 'brightness(bg, 0.5, -0.5)',
+        'ScrollBar.trackColor': 'bg',
+        'ScrollBar.Mac.hoverThumbColor': 'brightness(bg, 0.4, -0.4)',
+        'ScrollBar.Mac.thumbColor': 'brightness(bg, 0.3, -0.3)',
+
+        # Search
+        'SearchEverywhere.background': 'panel_bg',
+        'SearchEverywhere.foreground': 'fg',
+        'SearchEverywhere.Tab.selectedBackground': 'hover_bg',
+        'SearchEverywhere.Tab.selectedForeground': 'fg',
+        'SearchEverywhere.SearchField.background': 'bg',
+        'SearchEverywhere.SearchField.borderColor': 'border_color',
+        'SearchEverywhere.List.separatorColor': 'border_color',
+        'SearchMatch.startBackground': 'blend(bg, accent, 0.3)',
+        'SearchMatch.endBackground': 'blend(bg, accent, 0.1)',
+
+        # Notifications
+        'Notification.background': 'panel_bg',
+        'Notification.foreground': 'fg',
+        'Notification.borderColor': 'border_color',
+        'Notification.errorBackground': 'blend(bg, error, 0.1)',
+        'Notification.errorBorderColor': 'error',
+        'Notification.errorForeground': 'fg',
+        'Notification.warningBackground': 'blend(bg, warning, 0.1)',
+        'Notification.warningBorderColor': 'warning',
+        'Notification.warningForeground': 'fg',
+        'Notification.infoBackground': 'blend(bg, accent, 0.1)',
+        'Notification.infoBorderColor': 'accent',
+        'Notification.infoForeground': 'fg',
+
+        # Tooltips
+        'ToolTip.background': 'panel_bg',
+        'ToolTip.foreground': 'fg',
+        'ToolTip.borderColor': 'border_color',
+        'ValidationTooltip.errorBackground': 'error',
+        'ValidationTooltip.errorBorderColor': 'brightness(error, 0.2, -0.2)',
+        'ValidationTooltip.warningBackground': 'warning',
+        'ValidationTooltip.warningBorderColor': 'brightness(warning, 0.2, -0.2)',
+
+        # Icons
+        'Icons.foreground': 'fg',
+        'Icons.greyForeground': 'brightness(fg, -0.3, 0.3)',
+        'Icons.redForeground': 'error',
+        'Icons.greenForeground': 'success',
+        'Icons.blueForeground': 'accent',
+        'Icons.yellowForeground': 'warning',
+    },
+    'icons': {
+        'ColorPalette': {
+            'Actions.Blue': 'accent',
+            'Actions.Green': 'success',
+            'Actions.Grey': 'brightness(fg, -0.3, 0.3)',
+            'Actions.Red': 'error',
+            'Actions.Yellow': 'warning',
+            'Objects.Blue': 'accent',
+            'Objects.Green': 'success',
+            'Objects.Grey': 'brightness(fg, -0.3, 0.3)',
+            'Objects.Pink': 'palette(5, #ff00ff)',
+            'Objects.Purple': 'palette(5, #ff00ff)',
+            'Objects.Red': 'error',
+            'Objects.Yellow': 'warning',
+            'Objects.BlackText': '#000000',
+            'Objects.WhiteText': '#ffffff',
+        },
+    },
+}
+
+
+class _RuleRef(NamedTuple):
+    """Reference to the value of an earlier step of compiled rules"""
+    index: int
+
+
+class CompiledRules(NamedTuple):
+    """Rules compiled for one variant: the steps to evaluate and where their values go
+
+    Each step is (operation, args, positions of args that are _RuleRefs). No
+    two steps are the same, so a subexpression used by many keys is
+    evaluated once. Sections mirror the rules' sections, with each
+    expression replaced by a _RuleRef or the literal it reduced to.
+    """
+    steps: List[Tuple[str, Tuple, Tuple[int, ...]]]
+    sections: Dict[str, Dict]
+
+
+class DerivationRules:
+    """Theme JSON colors as declarative rules (see DERIVATION_RULES)
+
+    Rules are compiled once per dark/light variant into a list of unique
+    steps, a DAG in evaluation order. A theme's colors then cost one
+    derivation per distinct expression, however many keys share it.
+    Rules compare equal by content, so compiled templates are shared by
+    equal rules, also after being sent to worker processes.
+    """
+
+    SECTIONS = ('names', 'colors', 'ui', 'icons')
+
+    # Argument kinds of each function, a trailing '?' marking an optional one
+    FUNCTIONS = {
+        'palette': ('index', 'color'),
+        'brightness': ('color', 'number', 'number?'),
+        'saturation': ('color', 'number', 'number?'),
+        'blend': ('color', 'color', 'number'),
+        'contrast': ('color', 'color', 'role'),
+        'pick': ('color', 'color'),
+    }
+
+    TOKEN_PATTERN = re.compile(r'\s*(?:(#[0-9A-Fa-f]+\b)|([-+]?(?:\d+\.?\d*|\.\d+))|([A-Za-z_]\w*)|(\S))')
+
+    def __init__(self, rules: Dict):
+        self.rules = rules
+        self._variants: Dict[bool, CompiledRules] = {}
+
+    @classmethod
+    def load(cls, path: Path) -> 'DerivationRules':
+        """Merge a JSON rules file over the default rules, checking every rule compiles"""
+        with open(path) as f:
+            overrides = json.load(f)
+        if not isinstance(overrides, dict):
+            raise ValueError(f"{path}: expected a JSON object of rule sections")
+        unknown = [section for section in overrides if section not in cls.SECTIONS]
+        if unknown:
+            raise ValueError(f"{path}: unknown section '{unknown[0]}', expected {', '.join(cls.SECTIONS)}")
+
+        rules = cls(cls.merge(DERIVATION_RULES, overrides))
+        for is_dark in (True, False):
+            rules.compile(is_dark)
+        return rules
+
+    @classmethod
+    def merge(cls, base: Dict, overrides: Dict) -> Dict:
+        """Rules with overrides replacing or adding keys, nested sections merged and None removing keys"""
+        merged = dict(base)
+        for key, value in overrides.items():
+            if value is None:
+                merged.pop(key, None)
+            elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+                merged[key] = cls.merge(merged[key], value)
+            else:
+                merged[key] = value
+        return merged
+
+    @cached_property
+    def key(self) -> str:
+        """The rules as canonical text, in order, since key order is output order"""
+        return json.dumps(self.rules)
+
+    @cached_property
+    def digest(self) -> str:
+        import hashlib
+        return hashlib.sha256(self.key.encode()).hexdigest()
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, DerivationRules) and (self is other or self.key == other.key)
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __reduce__(self):
+        # Send only the rules, the receiving process compiles what it needs
+        return DerivationRules, (self.rules,)
+
+    def compile(self, is_dark: bool) -> CompiledRules:
+        """Compile the rules for dark or light themes, on first use"""
+        if is_dark not in self._variants:
+            self._variants[is_dark] = _RuleCompiler(self, is_dark).compile()
+        return self._variants[is_dark]
+
+    def evaluate(self, theme: GhosttyTheme, derivator: ColorDerivator) -> Dict[str, Dict]:
+        """Derive a theme's colors, returning the colors, ui and icons sections"""
+        steps, sections = self.compile(theme.is_dark)
+        handlers = {
+            'attribute': lambda attribute: getattr(theme, attribute),
+            'palette': theme.palette.get,
+            'adjust_brightness': derivator.adjust_brightness,
+            'adjust_saturation': derivator.adjust_saturation,
+            'blend_colors': derivator.blend_colors,
+            'ensure_contrast': derivator.ensure_contrast,
+        }
+
+        values = []
+        for operation, args, refs in steps:
+            if refs:
+                args = list(args)
+                for position in refs:
+                    args[position] = values[args[position].index]
+            values.append(handlers[operation](*args))
+
+        return {section: self._fill(layout, values) for section, layout in sections.items()}
+
+    @classmethod
+    def _fill(cls, layout: Dict, values: List) -> Dict:
+        return {key: cls._fill(value, values) if isinstance(value, dict) else
+                values[value.index] if isinstance(value, _RuleRef) else value
+                for key, value in layout.items()}
+
+
+class _RuleCompiler:
+    """Compiles DerivationRules for one variant, sharing identical steps"""
+
+    def __init__(self, rules: DerivationRules, is_dark: bool):
+        self.names = rules.rules.get('names', {})
+        self.sections = {section: rules.rules.get(section, {}) for section in ('colors', 'ui', 'icons')}
+        self.is_dark = is_dark
+        self.steps: List[Tuple[str, Tuple, Tuple[int, ...]]] = []
+        self.step_refs: Dict[Tuple, _RuleRef] = {}
+        self.compiled_names: Dict[str, object] = {}
+        self.compiling: List[str] = []
+
+    def compile(self) -> CompiledRules:
+        if not isinstance(self.names, dict):
+            raise ValueError("Rule names: expected an object of names")
+        for name in self.names:
+            if name in GhosttyTheme.COLOR_ATTRIBUTES or name in DerivationRules.FUNCTIONS:
+                raise ValueError(f"Rule names.{name}: '{name}' is already a theme color or function")
+        sections = {section: self.layout(layout, section) for section, layout in self.sections.items()}
+        return CompiledRules(self.steps, sections)
+
+    def layout(self, layout: Dict, path: str) -> Dict:
+        if not isinstance(layout, dict):
+            raise ValueError(f"Rule {path}: expected an object of keys")
+        compiled = {}
+        for key, value in layout.items():
+            if isinstance(value, dict):
+                compiled[key] = self.layout(value, f"{path}.{key}")
+            elif isinstance(value, str):
+                compiled[key] = self.expression(value, f"{path}.{key}")
+            else:
+                compiled[key] = value
+        return compiled
+
+    def expression(self, text: str, path: str):
+        """Compile one rule, returning a _RuleRef or the literal color it reduces to"""
+        tokens = []
+        for color, number, name, other in DerivationRules.TOKEN_PATTERN.findall(text):
+            tokens.append(('color', color) if color else ('number', number) if number else
+                          ('name', name) if name else (other, other))
+        tokens.append(('end', None))
+
+        try:
+            tree, position = self.parse(tokens, 0)
+            if tokens[position][0] != 'end':
+                raise ValueError(f"unexpected '{tokens[position][1]}'")
+            return self.build(tree)
+        except ValueError as e:
+            message = str(e) if str(e).startswith('Rule ') else f"Rule {path}: {e} in '{text}'"
+            raise ValueError(message) from None
+
+    def parse(self, tokens: List[Tuple[str, str]], position: int) -> Tuple[Tuple, int]:
+        kind, text = tokens[position]
+        if kind in ('color', 'number'):
+            return (kind, text), position + 1
+        if kind != 'name':
+            raise ValueError("expected a color, number or name" if kind == 'end' else f"unexpected '{text}'")
+        if tokens[position + 1][0] != '(':
+            return ('name', text), position + 1
+
+        args = []
+        position += 2
+        while tokens[position][0] != ')':
+            arg, position = self.parse(tokens, position)
+            args.append(arg)
+            if tokens[position][0] == ',':
+                position += 1
+            elif tokens[position][0] != ')':
+                raise ValueError(f"expected ',' or ')' after {text}() argument")
+        return ('call', text, args), position + 1
+
+    def build(self, tree: Tuple):
+        kind = tree[0]
+        if kind == 'color':
+            if len(tree[1]) != 7:
+                raise ValueError(f"colors must be written #rrggbb, not {tree[1]}")
+            parse_color(tree[1])
+            return tree[1]
+        if kind == 'number':
+            raise ValueError(f"expected a color, not the number {tree[1]}")
+        if kind == 'name':
+            return self.name(tree[1])
+
+        function, args = tree[1], tree[2]
+        if function not in DerivationRules.FUNCTIONS:
+            raise ValueError(f"unknown function {function}()")
+        kinds = DerivationRules.FUNCTIONS[function]
+        required = sum(1 for arg_kind in kinds if not arg_kind.endswith('?'))
+        if not required <= len(args) <= len(kinds):
+            raise ValueError(f"{function}() takes {required}" + (f" or {len(kinds)}" if len(kinds) > required else "")
+                             + f" arguments, not {len(args)}")
+        if function == 'pick':
+            return self.build(args[0] if self.is_dark else args[1])
+        values = [self.argument(arg, arg_kind.rstrip('?'), function) for arg, arg_kind in zip(args, kinds)]
+
+        if function == 'palette':
+            index, default = values
+            return self.step('palette', int(index), default)
+        if function in ('brightness', 'saturation'):
+            color, dark_factor, *light_factor = values
+            factor = dark_factor if self.is_dark or not light_factor else light_factor[0]
+            return self.step(f"adjust_{function}", color, factor)
+        if function == 'blend':
+            return self.step('blend_colors', *values)
+        return self.step('ensure_contrast', *values)
+
+    def argument(self, tree: Tuple, kind: str, function: str):
+        if kind == 'color':
+            return self.build(tree)
+        if kind == 'role':
+            if tree[0] != 'name' or tree[1] not in ('text', 'ui'):
+                raise ValueError(f"{function}() role must be text or ui")
+            return tree[1]
+        if tree[0] != 'number':
+            raise ValueError(f"{function}() expected a number")
+        if kind == 'index':
+            if not tree[1].isdigit() or not 0 <= int(tree[1]) < ThemePalette.SIZE:
+                raise ValueError(f"palette index must be 0 to {ThemePalette.SIZE - 1}")
+            return int(tree[1])
+        return float(tree[1])
+
+    def name(self, name: str):
+        if name in GhosttyTheme.COLOR_ATTRIBUTES:
+            return self.step('attribute', name)
+        if name not in self.names:
+            raise ValueError(f"unknown name '{name}'")
+        if name not in self.compiled_names:
+            if name in self.compiling:
+                raise ValueError(f"Rule names.{name}: refers to itself through {' → '.join(self.compiling + [name])}")
+            self.compiling.append(name)
+            rule = self.names[name]
+            if not isinstance(rule, str):
+                raise ValueError(f"Rule names.{name}: expected an expression")
+            self.compiled_names[name] = self.expression(rule, f"names.{name}")
+            self.compiling.pop()
+        return self.compiled_names[name]
+
+    def step(self, operation: str, *args) -> _RuleRef:
+        key = (operation,) + args
+        if key not in self.step_refs:
+            refs = tuple(position for position, arg in enumerate(args) if isinstance(arg, _RuleRef))
+            self.step_refs[key] = _RuleRef(len(self.steps))
+            self.steps.append((operation, args, refs))
+        return self.step_refs[key]
+
+
+DEFAULT_RULES = DerivationRules(DERIVATION_RULES)
+
+
+class BatchDerivator:
+    """Derives the UI palettes of a whole theme collection in one pass
+
+    Every brightness and saturation shift and blend in the derivation rules
+    is evaluated for all themes of a variant at once as NumPy array
+    operations. Colors stay packed RGB integers, read straight from the
+    parsed themes, until every step is done; then all of them are formatted
+    as hex in one go for the lookup tables. Contrast adjustments are taken
+    as no change here, leaving colors derived from adjusted ones to the
+    scalar math. Without NumPy nothing is derived ahead, and themes are
+    derived one by one as usual.
+    """
+
+    # Brightness shifts of the editor scheme, which is not built from rules
+    SCHEME_SHIFTS = [('foreground', -0.3)]
+
+    # Lookup table of each PrecomputedDerivator an operation's results go to
+    TABLES = {'adjust_brightness': 0, 'blend_colors': 1, 'adjust_saturation': 2}
+
+    def __init__(self, themes: List[GhosttyTheme], rules: Optional[DerivationRules] = None):
+        self.rules = rules or DEFAULT_RULES
+        self.variants: Dict[bool, List[GhosttyTheme]] = {}
+        for theme in themes:
+            self.variants.setdefault(theme.is_dark, []).append(theme)
+
+    def derive(self) -> Dict[str, PrecomputedDerivator]:
+        """Derive every theme's colors, returning a derivator per theme name"""
+        if not _load_numpy():
+            return {}
+        derivators = {}
+        for is_dark, themes in self.variants.items():
+            steps = list(self.rules.compile(is_dark).steps)
+            for attribute, factor in self.SCHEME_SHIFTS:
+                steps.append(('attribute', (attribute,), ()))
+                steps.append(('adjust_brightness', (_RuleRef(len(steps) - 1), factor), (0,)))
+            tables = [({}, {}, {}) for _ in themes]
+            self._derive_variant(themes, steps, tables)
+            derivators.update((theme.name, PrecomputedDerivator(*tables[i])) for i, theme in enumerate(themes))
+        return derivators
+
+    def _derive_variant(self, themes: List[GhosttyTheme], steps: List[Tuple], tables: List[Tuple]):
+        np = _load_numpy()
+        colors = np.frombuffer(b''.join(theme.colors.tobytes() for theme in themes), dtype=np.uint32)
+        colors = colors.reshape(len(themes), -1).astype(np.int64)
+
+        # One packed column per step, the hex strings of colors that are not formatted from it,
+        # and the argument each unchanged (contrast) step passes on as it is
+        columns = []
+        literals: Dict[int, List[Tuple[int, str]]] = {}
+        passed_on: Dict[int, object] = {}
+
+        def column(arg) -> 'np.ndarray':
+            if isinstance(arg, _RuleRef):
+                return columns[arg.index]
+            return np.full(len(themes), hex_to_rgb(arg), dtype=np.int64)
+
+        for operation, args, _ in steps:
+            if operation == 'attribute':
+                columns.append(colors[:, GhosttyTheme.COLOR_ATTRIBUTES.index(args[0])])
+            elif operation == 'palette':
+                index, default = args
+                present = np.array([theme.palette.present >> index & 1 for theme in themes], dtype=bool)
+                entries = np.array([theme.palette.colors[index] for theme in themes], dtype=np.int64)
+                columns.append(np.where(present, entries, hex_to_rgb(default)))
+                literals[len(columns) - 1] = [(i, default) for i in np.flatnonzero(~present).tolist()]
+            elif operation in ('adjust_brightness', 'adjust_saturation'):
+                component = 2 if operation == 'adjust_brightness' else 1
+                columns.append(self._shift_hsv(np, column(args[0]), args[1], component))
+            elif operation == 'blend_colors':
+                columns.append(self._blend(np, column(args[0]), column(args[1]), args[2]))
+            else:
+                passed_on[len(columns)] = args[0]
+                columns.append(column(args[0]))
+
+        hexes = self._format_hex(np, np.stack(columns))
+        for index, values in literals.items():
+            for i, color in values:
+                hexes[index][i] = color
+
+        def keys(arg) -> List[str]:
+            if isinstance(arg, _RuleRef):
+                return hexes[arg.index]
+            return [arg] * len(themes)
+
+        for index, arg in passed_on.items():
+            hexes[index] = keys(arg)
+
+        for index, (operation, args, _) in enumerate(steps):
+            table = self.TABLES.get(operation)
+            if table is None:
+                continue
+            if operation == 'blend_colors':
+                step_keys = zip(keys(args[0]), keys(args[1]), [args[2]] * len(themes))
+            else:
+                step_keys = zip(keys(args[0]), [args[1]] * len(themes))
+            for theme_tables, key, result in zip(tables, step_keys, hexes[index]):
+                theme_tables[table][key] = result
+
+    @staticmethod
+    def _format_hex(np, packed: 'np.ndarray') -> List[List[str]]:
+        """Format rows of packed colors as lowercase #rrggbb strings, as rgb_to_hex does"""
+        digits = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+        chars = np.empty(packed.shape + (7,), dtype=np.uint8)
+        chars[..., 0] = ord('#')
+        for position in range(6):
+            chars[..., position + 1] = digits[packed >> (20 - 4 * position) & 0xf]
+        return chars.view('S7')[..., 0].astype('U7').tolist()
+
+    @staticmethod
+    def _shift_hsv(np, rgb: 'np.ndarray', factor: float, component: int) -> 'np.ndarray':
+        """Shift one HSV component (1 saturation, 2 value) of packed colors, clamped to 0..1"""
+        r, g, b = (((rgb >> shift) & 0xff) / 255.0 for shift in (16, 8, 0))
+
+        # Mirrors colorsys.rgb_to_hsv / hsv_to_rgb operation for operation, so results are bit-identical
+        with np.errstate(divide='ignore', invalid='ignore'):
+            maxc = np.maximum(np.maximum(r, g), b)
+            minc = np.minimum(np.minimum(r, g), b)
+            rangec = maxc - minc
+            grey = minc == maxc
+            s = np.where(grey, 0.0, rangec / maxc)
+            rc = (maxc - r) / rangec
+            gc = (maxc - g) / rangec
+            bc = (maxc - b) / rangec
+            h = np.select([r == maxc, g == maxc], [bc - gc, 2.0 + rc - bc], 4.0 + gc - rc)
+            h = np.where(grey, 0.0, np.remainder(h / 6.0, 1.0))
+
+        v = maxc
+        if component == 2:
+            v = np.clip(v + factor, 0, 1)
+        else:
+            s = np.clip(s + factor, 0, 1)
+
+        i = (h * 6.0).astype(np.int64)
+        f = (h * 6.0) - i
+        p = v * (1.0 - s)
+        q = v * (1.0 - s * f)
+        t = v * (1.0 - s * (1.0 - f))
+        i = i % 6
+        cases = [i == 0, i == 1, i == 2, i == 3, i == 4, i == 5]
+        r = np.select(cases, [v, q, p, p, t, v])
+        g = np.select(cases, [t, v, v, q, p, p])
+        b = np.select(cases, [p, p, t, v, v, q])
+        r, g, b = (np.where(s == 0.0, v, channel) for channel in (r, g, b))
+
+        return ((r * 255).astype(np.int64) << 16) | ((g * 255).astype(np.int64) << 8) | (b * 255).astype(np.int64)
+
+    @staticmethod
+    def _blend(np, c1: 'np.ndarray', c2: 'np.ndarray', ratio: float) -> 'np.ndarray':
+        packed = np.zeros_like(c1)
+        for shift in (16, 8, 0):
+            channel = ((c1 >> shift) & 0xff) * (1 - ratio) + ((c2 >> shift) & 0xff) * ratio
+            packed |= channel.astype(np.int64) << shift
+        return packed
+
+
+def _load_numpy():
+    """Import NumPy on first use, returning None when it is not installed"""
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = None
+    return _numpy
+
+
+_numpy = False
 
-        r1, g1, b1 = [int(c1[i:i+2], 16) for i in (0, 2, 4)]
-        r2, g2, b2 = [int(c2[i:i+2], 16) for i in (0, 2, 4)]
 
-        r = int(r1 * (1 - ratio) + r2 * ratio)
-        g = int(g1 * (1 - ratio) + g2 * ratio)
-        b = int(b1 * (1 - ratio) + b2 * ratio)
+class ParseDiagnostic(NamedTuple):
+    """A problem found on one line of a theme file"""
 
-        return f"#{r:02x}{g:02x}{b:02x}"
+    line: int
+    message: str
+
+    def __str__(self) -> str:
+        return f"line {self.line}: {self.message}"
+
+
+class ThemeParseError(ValueError):
+    """Raised when a theme file cannot be used, with the offending lines"""
+
+    def __init__(self, diagnostics: List[ParseDiagnostic]):
+        super().__init__('; '.join(str(diagnostic) for diagnostic in diagnostics))
+        self.diagnostics = diagnostics
 
 
 class GhosttyParser:
-    """Parses Ghostty theme files"""
+    """Parses Ghostty theme files
+
+    Each line is split once, at its last '=', and what comes before is looked
+    up in a table of the line heads seen so far ("palette = 4", "background"),
+    which sends the color straight into the theme's packed storage. Invalid
+    base colors are errors that fail the theme. Malformed lines and invalid
+    palette entries are skipped and recorded as warnings on the theme's
+    diagnostics; a theme with any of these is parsed again line by line to
+    report them.
+    """
+
+    # Index of each key's color in GhosttyTheme.colors, with palette entries as -1
+    KEY_COLORS = {
+        'palette': -1,
+        'background': 0,
+        'foreground': 1,
+        'cursor-color': 2,
+        'cursor-text': 3,
+        'selection-background': 4,
+        'selection-foreground': 5,
+    }
+
+    # What a line head means: an index in GhosttyTheme.colors, _PALETTE plus a
+    # palette index, nothing to parse, or something parse_theme_checked must report
+    _PALETTE = 8
+    _SKIP = -1
+    _CHECK = -2
+    # Line heads remembered, enough for any spacing of every key and palette index
+    _HEAD_LIMIT = 4096
+    _heads: Dict[str, int] = {}
+
+    @staticmethod
+    def _classify_head(head: str) -> int:
+        """What the text before a line's last '=' means, as parse_theme_checked would read the line"""
+        key, separator, index = head.partition('=')
+        target = GhosttyParser.KEY_COLORS.get(key.strip())
+        if target is None:
+            return GhosttyParser._SKIP
+        if target >= 0:
+            # Another '=' would end up in the color
+            return GhosttyParser._CHECK if separator else target
+        index = index.strip()
+        if separator and index.isascii() and index.isdigit() and int(index) < ThemePalette.SIZE:
+            return GhosttyParser._PALETTE + int(index)
+        return GhosttyParser._CHECK
+
+    @staticmethod
+    def looks_like_theme(head: bytes) -> bool:
+        """Cheap check of a file's first bytes for a Ghostty theme: text with at least one known key"""
+        if b'\0' in head:
+            return False
+        key_colors = GhosttyParser.KEY_COLORS
+        return any(line.partition('=')[0].strip() in key_colors
+                   for line in head.decode('utf-8', 'ignore').splitlines())
 
     @staticmethod
     def parse_theme_file(file_path: Path) -> GhosttyTheme:
         """Parse a Ghostty theme file"""
-        theme = GhosttyTheme(file_path.name)
+        return GhosttyParser.parse_theme(file_path.name, read_small_file(file_path).decode('utf-8', 'ignore'))
 
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
+    @staticmethod
+    def parse_theme(name: str, text: str) -> GhosttyTheme:
+        """Parse the text of a Ghostty theme"""
+        theme = GhosttyTheme(name)
+        colors = theme.colors
+        palette_colors = theme.palette.colors
+        present = 0
+        heads = GhosttyParser._heads
+        palette = GhosttyParser._PALETTE
+
+        for line in text.splitlines():
+            head, separator, value = line.rpartition('=')
+            slot = heads.get(head)
+            if slot is None:
+                slot = GhosttyParser._classify_head(head)
+                if len(heads) < GhosttyParser._HEAD_LIMIT:
+                    heads[head] = slot
+            if slot < 0:
+                if slot == GhosttyParser._SKIP and separator:
                     continue
+                # Blank lines and comments have no '=' (nor a head), anything else needs checking
+                stripped = line.strip()
+                if separator or (stripped and stripped[0] != '#'):
+                    return GhosttyParser.parse_theme_checked(name, text)
+                continue
+
+            value = value.strip()
+            digits = value[1:]
+            try:
+                # Most colors are #rrggbb, parsed here rather than through a call to parse_color
+                if len(digits) == 6 and value[0] == '#' and digits.isalnum() and digits.isascii():
+                    color = int(digits, 16)
+                else:
+                    color = parse_color(value)
+            except ValueError:
+                return GhosttyParser.parse_theme_checked(name, text)
+            if slot < palette:
+                colors[slot] = color
+            else:
+                palette_colors[slot - palette] = color
+                present |= 1 << (slot - palette)
+
+        theme.palette.present = present
+        return theme
+
+    @staticmethod
+    def parse_theme_checked(name: str, text: str) -> GhosttyTheme:
+        """Parse the text of a Ghostty theme line by line, recording a diagnostic for each problem"""
+        theme = GhosttyTheme(name)
+        colors = theme.colors
+        palette_colors = theme.palette.colors
+        present = 0
+        key_colors = GhosttyParser.KEY_COLORS
+        warnings = theme.diagnostics
+        errors = []
+
+        for line_number, line in enumerate(text.splitlines(), 1):
+            key, separator, value = line.partition('=')
+            key = key.strip()
+            target = key_colors.get(key)
+            if target is None:
+                # Blank lines, comments and unknown keys are skipped, anything else is malformed
+                if not separator and key and key[0] != '#':
+                    warnings.append(ParseDiagnostic(line_number, f"Expected 'key = value', got '{key}'"))
+                continue
+
+            value = value.strip()
+            if target >= 0:
+                try:
+                    colors[target] = parse_color(value)
+                except ValueError as e:
+                    errors.append(ParseDiagnostic(line_number, f"{e} for {key}"))
+                continue
+
+            index, separator, color = value.partition('=')
+            index = index.rstrip()
+            try:
+                if not separator or not index.isdigit():
+                    raise ValueError(f"Invalid palette entry '{value}'")
+                index = int(index)
+                if index >= ThemePalette.SIZE:
+                    raise ValueError(f"Palette index {index} out of range")
+                palette_colors[index] = parse_color(color.lstrip())
+                present |= 1 << index
+            except ValueError as e:
+                warnings.append(ParseDiagnostic(line_number, f"{e}, ignored"))
+
+        theme.palette.present = present
+        if errors:
+            raise ThemeParseError(errors)
+        return theme
 
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip()
-                    value = value.strip()
-
-                    if key == 'palette':
-                        # Extract palette number and color
-                        parts = value.split('=', 1)
-                        if len(parts) == 2:
-                            try:
-                                palette_num = int(parts[0])
-                                color = parts[1].strip()
-                                theme.palette[palette_num] = color
-                            except ValueError:
-                                continue
-                    elif key == 'background':
-                        theme.background = value
-                    elif key == 'foreground':
-                        theme.foreground = value
-                    elif key == 'cursor-color':
-                        theme.cursor_color = value
-                    elif key == 'cursor-text':
-                        theme.cursor_text = value
-                    elif key == 'selection-background':
-                        theme.selection_background = value
-                    elif key == 'selection-foreground':
-                        theme.selection_foreground = value
 
+class ThemeCache:
+    """Binary cache of a whole parsed theme directory, loaded with a single mmap
+
+    Layout (little-endian): a header, one fixed-size record per theme holding
+    the source file's size and mtime, its six colors, palette presence bitmap
+    and 256-entry palette, then a UTF-8 text table of theme names and parse
+    warnings (one "line<TAB>message" per line). A theme is only reused while
+    its source file's size and mtime are unchanged.
+    """
+
+    MAGIC = b'GTHM'
+    # Bump whenever the parser or record layout changes, so stale caches are discarded
+    VERSION = 2
+    HEADER = struct.Struct('<4sHI')
+    RECORD = struct.Struct('<QqIIII6I32s1024s')
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, Tuple[int, int, GhosttyTheme]] = {}
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: Path) -> 'ThemeCache':
+        """Load the cache, starting empty if it is missing or unreadable"""
+        cache = cls(path)
+        try:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                cache._read(data)
+        except (OSError, ValueError, struct.error):
+            cache.entries = {}
+        return cache
+
+    def _read(self, data):
+        magic, version, count = self.HEADER.unpack_from(data, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("Unsupported theme cache")
+
+        text_offset = self.HEADER.size + count * self.RECORD.size
+        for i in range(count):
+            size, mtime_ns, name_offset, name_length, diagnostics_offset, diagnostics_length, *colors, \
+                present, palette = self.RECORD.unpack_from(data, self.HEADER.size + i * self.RECORD.size)
+            start = text_offset + name_offset
+            name = data[start:start + name_length].decode('utf-8', 'surrogateescape')
+
+            theme = GhosttyTheme(name)
+            if diagnostics_length:
+                start = text_offset + diagnostics_offset
+                for line in data[start:start + diagnostics_length].decode('utf-8', 'surrogateescape').splitlines():
+                    line_number, _, message = line.partition('\t')
+                    theme.diagnostics.append(ParseDiagnostic(int(line_number), message))
+            theme.colors = array('I', colors)
+            theme.palette.present = int.from_bytes(present, 'little')
+            theme.palette.colors = array('I', palette)
+            if sys.byteorder == 'big':
+                theme.palette.colors.byteswap()
+            self.entries[name] = (size, mtime_ns, theme)
+
+    def save(self):
+        """Write the cache atomically if anything changed since it was loaded"""
+        if not self.dirty:
+            return
+
+        records = []
+        text = bytearray()
+        for name, (size, mtime_ns, theme) in sorted(self.entries.items()):
+            encoded = name.encode('utf-8', 'surrogateescape')
+            diagnostics = ''.join(f"{diagnostic.line}\t{diagnostic.message}\n"
+                                  for diagnostic in theme.diagnostics).encode('utf-8', 'surrogateescape')
+            palette = array('I', theme.palette.colors)
+            if sys.byteorder == 'big':
+                palette.byteswap()
+            records.append(self.RECORD.pack(size, mtime_ns, len(text), len(encoded),
+                                            len(text) + len(encoded), len(diagnostics), *theme.colors,
+                                            theme.palette.present.to_bytes(32, 'little'), palette.tobytes()))
+            text += encoded + diagnostics
+
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, len(records)))
+            f.writelines(records)
+            f.write(text)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def get(self, file_path: Path) -> GhosttyTheme:
+        """Get a parsed theme, parsing and caching it if its file changed"""
+        stat = file_path.stat()
+        entry = self.entries.get(file_path.name)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+
+        theme = GhosttyParser.parse_theme_file(file_path)
+        self.entries[file_path.name] = (stat.st_size, stat.st_mtime_ns, theme)
+        self.dirty = True
         return theme
 
+    def retain(self, theme_files: List[Path]):
+        """Drop themes whose source file is no longer part of the collection"""
+        names = {theme_file.name for theme_file in theme_files}
+        for name in set(self.entries) - names:
+            del self.entries[name]
+            self.dirty = True
+
+
+class XmlWriter:
+    """Writes indented XML straight to a text stream
+
+    Produces the same layout and escaping as minidom's toprettyxml(indent="  "),
+    without building a document tree first.
+    """
+
+    def __init__(self, stream: TextIO, indent: str = "  "):
+        self.stream = stream
+        self.indent = indent
+        self.depth = 0
+
+    def start(self, tag: str, attributes: List[Tuple[str, str]] = ()):
+        self.stream.write(f"{self.indent * self.depth}<{tag}{self._attributes(attributes)}>\n")
+        self.depth += 1
+
+    def end(self, tag: str):
+        self.depth -= 1
+        self.stream.write(f"{self.indent * self.depth}</{tag}>\n")
+
+    def empty(self, tag: str, attributes: List[Tuple[str, str]] = ()):
+        self.stream.write(f"{self.indent * self.depth}<{tag}{self._attributes(attributes)}/>\n")
+
+    @staticmethod
+    def _attributes(attributes: List[Tuple[str, str]]) -> str:
+        return ''.join(f' {name}="{XmlWriter.escape(value)}"' for name, value in attributes)
+
+    @staticmethod
+    def escape(value: str) -> str:
+        return value.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;').replace('>', '&gt;')
+
 
 class PhpStormThemeGenerator:
     """Generates PhpStorm theme files from Ghostty themes"""
 
-    def __init__(self, ghostty_theme: GhosttyTheme):
+    def __init__(self, ghostty_theme: GhosttyTheme, derivator: Optional[ColorDerivator] = None,
+                 rules: Optional[DerivationRules] = None):
         self.ghostty = ghostty_theme
-        self.derivator = ColorDerivator()
-        self.theme_id = str(uuid.uuid4())
+        self.derivator = derivator or ColorDerivator()
+        self.rules = rules or DEFAULT_RULES
+
+    @cached_property
+    def theme_id(self) -> str:
+        """Plugin theme id, derived from the theme name"""
+        import uuid
+        return str(uuid.uuid5(uuid.uuid5(uuid.NAMESPACE_DNS, THEME_ID_DOMAIN), self.ghostty.name))
 
     def generate_theme_json(self) -> Dict:
         """Generate the main theme JSON structure"""
         theme_name = self.ghostty.name.replace('_', ' ').title()
 
-        # Derive UI colors from base theme
-        ui_colors = self._derive_ui_colors()
-
-        # Get accent colors from palette for icons
-        accent_color = self.ghostty.palette.get(4, "#0078d4")  # Blue
+        # Derive the colors, UI and icon colors from base theme by the rules
+        sections = self.rules.evaluate(self.ghostty, self.derivator)
 
         theme_json = {
             "name": theme_name,
@@ -170,344 +1455,57 @@ class PhpStormThemeGenerator:
             "background": {
                 "default": self.ghostty.background
             },
-            "colors": {
-                "primaryBackground": self.ghostty.background,
-                "primaryForeground": self.ghostty.foreground,
-                "selectionBackground": self.ghostty.selection_background,
-                "selectionForeground": self.ghostty.selection_foreground,
-                "accentColor": accent_color,
-                "secondaryAccentColor": self.derivator.adjust_brightness(accent_color, -0.1 if self.ghostty.is_dark else 0.1)
-            },
-            "ui": ui_colors,
-            "icons": {
-                "ColorPalette": {
-                    "Actions.Blue": accent_color,
-                    "Actions.Green": self.ghostty.palette.get(2, "#00aa00"),
-                    "Actions.Grey": self.derivator.adjust_brightness(self.ghostty.foreground, -0.3 if self.ghostty.is_dark else 0.3),
-                    "Actions.Red": self.ghostty.palette.get(1, "#ff0000"),
-                    "Actions.Yellow": self.ghostty.palette.get(3, "#ffaa00"),
-                    "Objects.Blue": accent_color,
-                    "Objects.Green": self.ghostty.palette.get(2, "#00aa00"),
-                    "Objects.Grey": self.derivator.adjust_brightness(self.ghostty.foreground, -0.3 if self.ghostty.is_dark else 0.3),
-                    "Objects.Pink": self.ghostty.palette.get(5, "#ff00ff"),
-                    "Objects.Purple": self.ghostty.palette.get(5, "#ff00ff"),
-                    "Objects.Red": self.ghostty.palette.get(1, "#ff0000"),
-                    "Objects.Yellow": self.ghostty.palette.get(3, "#ffaa00"),
-                    "Objects.BlackText": "#000000",
-                    "Objects.WhiteText": "#ffffff"
-                }
-            }
+            "colors": sections['colors'],
+            "ui": sections['ui'],
+            "icons": sections['icons']
         }
 
         return theme_json
 
-    def _derive_ui_colors(self) -> Dict:
-        """Derive comprehensive UI colors from base theme"""
-        bg = self.ghostty.background
-        fg = self.ghostty.foreground
-
-        if self.ghostty.is_dark:
-            # Dark theme derivations
-            panel_bg = self.derivator.adjust_brightness(bg, 0.1)
-            border_color = self.derivator.adjust_brightness(bg, 0.2)
-            hover_bg = self.derivator.adjust_brightness(bg, 0.15)
-            pressed_bg = self.derivator.adjust_brightness(bg, -0.1)
-            disabled_fg = self.derivator.adjust_brightness(fg, -0.4)
-            inactive_bg = self.derivator.adjust_brightness(bg, 0.05)
-            highlight_bg = self.derivator.adjust_brightness(bg, 0.3)
-            selection_inactive_bg = self.derivator.adjust_brightness(self.ghostty.selection_background, -0.2)
-        else:
-            # Light theme derivations
-            panel_bg = self.derivator.adjust_brightness(bg, -0.05)
-            border_color = self.derivator.adjust_brightness(bg, -0.15)
-            hover_bg = self.derivator.adjust_brightness(bg, -0.1)
-            pressed_bg = self.derivator.adjust_brightness(bg, -0.2)
-            disabled_fg = self.derivator.adjust_brightness(fg, 0.4)
-            inactive_bg = self.derivator.adjust_brightness(bg, -0.03)
-            highlight_bg = self.derivator.adjust_brightness(bg, -0.1)
-            selection_inactive_bg = self.derivator.adjust_brightness(self.ghostty.selection_background, 0.2)
-
-        # Get accent colors from palette
-        accent_color = self.ghostty.palette.get(4, "#0078d4")  # Blue
-        error_color = self.ghostty.palette.get(1, "#ff0000")   # Red
-        warning_color = self.ghostty.palette.get(3, "#ffaa00") # Yellow
-        success_color = self.ghostty.palette.get(2, "#00aa00") # Green
-
-        # Derive additional accent colors
-        accent_secondary = self.derivator.adjust_brightness(accent_color, -0.1 if self.ghostty.is_dark else 0.1)
-        accent_tertiary = self.derivator.adjust_brightness(accent_color, -0.2 if self.ghostty.is_dark else 0.2)
-
-        # Create a few shades lighter than the background for borders
-        lighter_bg = self.derivator.adjust_brightness(bg, 0.2 if self.ghostty.is_dark else -0.1)
-
-        return {
-            # Global defaults
-            "*": {
-                "background": bg,
-                "foreground": fg,
-                "infoForeground": self.derivator.adjust_brightness(fg, -0.3 if self.ghostty.is_dark else 0.3),
-                "selectionBackground": self.ghostty.selection_background,
-                "selectionForeground": self.ghostty.selection_foreground,
-                "selectionInactiveBackground": selection_inactive_bg,
-                "selectionBackgroundInactive": selection_inactive_bg,
-                "disabledForeground": disabled_fg,
-                "disabledBackground": self.derivator.adjust_brightness(bg, -0.05 if self.ghostty.is_dark else 0.05),
-                "acceleratorForeground": accent_color,
-                "acceleratorSelectionForeground": accent_color,
-                "errorForeground": error_color,
-                "borderColor": border_color,
-                "disabledBorderColor": self.derivator.adjust_brightness(border_color, -0.3 if self.ghostty.is_dark else 0.3),
-                "focusColor": accent_color,
-                "focusedBorderColor": accent_color,
-                "separatorColor": border_color
-            },
-
-            # Main window and panels
-            "Window.background": bg,
-            "Panel.background": panel_bg,
-            "Window.border": lighter_bg,
-            "Dialog.background": panel_bg,
-            "Dialog.foreground": fg,
-            "Dialog.borderColor": border_color,
-            "DialogWrapper.southPanelBackground": panel_bg,
-            "OnePixelDivider.background": border_color,
-            "Borders.color": border_color,
-            "Borders.ContrastBorderColor": lighter_bg,
-
-            # Tool windows
-            "ToolWindow.background": panel_bg,
-            "ToolWindow.header.background": self.derivator.adjust_brightness(panel_bg, 0.05 if self.ghostty.is_dark else -0.05),
-            "ToolWindow.header.active.background": self.derivator.adjust_brightness(panel_bg, 0.1 if self.ghostty.is_dark else -0.1),
-            "ToolWindow.header.border.background": lighter_bg,
-            "ToolWindow.header.closeButton.background": panel_bg,
-            "ToolWindow.Button.selectedBackground": hover_bg,
-            "ToolWindow.Button.hoverBackground": hover_bg,
-            "ToolWindow.Button.selectedForeground": fg,
-            "ToolWindow.HeaderTab.selectedBackground": self.derivator.adjust_brightness(panel_bg, 0.15 if self.ghostty.is_dark else -0.15),
-            "ToolWindow.HeaderTab.selectedInactiveBackground": self.derivator.adjust_brightness(panel_bg, 0.05 if self.ghostty.is_dark else -0.05),
-            "ToolWindow.HeaderTab.hoverBackground": hover_bg,
-            "ToolWindow.HeaderTab.hoverInactiveBackground": self.derivator.adjust_brightness(hover_bg, -0.05 if self.ghostty.is_dark else 0.05),
-            "ToolWindow.HeaderCloseButton.background": panel_bg,
-
-            # Editor
-            "Editor.background": bg,
-            "EditorPane.background": bg,
-            "EditorPane.inactiveBackground": inactive_bg,
-            "EditorGroupsTabs.background": panel_bg,
-            "EditorTabs.background": panel_bg,
-            "EditorTabs.borderColor": border_color,
-            "EditorTabs.underlineColor": accent_color,
-            "EditorTabs.underlinedTabBackground": self.derivator.adjust_brightness(panel_bg, 0.1 if self.ghostty.is_dark else -0.1),
-            "EditorTabs.hoverBackground": hover_bg,
-            "EditorTabs.inactiveUnderlineColor": self.derivator.adjust_brightness(accent_color, -0.3 if self.ghostty.is_dark else 0.3),
-            "FileColor.Yellow": self.derivator.blend_colors(bg, warning_color, 0.05),
-            "FileColor.Green": self.derivator.blend_colors(bg, success_color, 0.05),
-            "FileColor.Blue": self.derivator.blend_colors(bg, accent_color, 0.05),
-            "FileColor.Violet": self.derivator.blend_colors(bg, "#9370DB", 0.05),  # Medium purple
-            "FileColor.Orange": self.derivator.blend_colors(bg, "#FFA500", 0.05),  # Orange
-            "FileColor.Rose": self.derivator.blend_colors(bg, "#FF007F", 0.05),    # Rose
-
-            # Menus
-            "Menu.background": panel_bg,
-            "Menu.foreground": fg,
-            "Menu.borderColor": border_color,
-            "Menu.acceleratorForeground": self.derivator.adjust_brightness(fg, -0.2 if self.ghostty.is_dark else 0.2),
-            "Menu.selectionBackground": hover_bg,
-            "Menu.selectionForeground": fg,
-            "MenuItem.acceleratorForeground": self.derivator.adjust_brightness(fg, -0.2 if self.ghostty.is_dark else 0.2),
-            "MenuItem.selectionBackground": hover_bg,
-            "MenuItem.selectionForeground": fg,
-            "PopupMenu.background": panel_bg,
-            "PopupMenu.borderColor": border_color,
-            "MenuBar.background": bg,
-            "MenuBar.borderColor": border_color,
-
-            # UI Controls
-            "Button.background": panel_bg,
-            "Button.foreground": fg,
-            "Button.hoverBackground": hover_bg,
-            "Button.pressedBackground": pressed_bg,
-            "Button.focusedBorderColor": accent_color,
-            "Button.default.foreground": fg,
-            "Button.default.background": accent_color,
-            "Button.default.hoverBackground": self.derivator.adjust_brightness(accent_color, 0.1 if self.ghostty.is_dark else -0.1),
-            "Button.default.pressedBackground": self.derivator.adjust_brightness(accent_color, -0.1 if self.ghostty.is_dark else 0.1),
-            "Button.default.focusedBorderColor": self.derivator.adjust_brightness(accent_color, 0.2 if self.ghostty.is_dark else -0.2),
-            "CheckBox.background": bg,
-            "CheckBox.foreground": fg,
-            "CheckBox.select": accent_color,
-            "ComboBox.background": bg,
-            "ComboBox.foreground": fg,
-            "ComboBox.selectionBackground": hover_bg,
-            "ComboBox.selectionForeground": fg,
-            "ComboBox.disabledBackground": self.derivator.adjust_brightness(bg, -0.05 if self.ghostty.is_dark else 0.05),
-            "ComboBox.ArrowButton.background": panel_bg,
-            "ComboBox.ArrowButton.iconColor": fg,
-            "Component.borderColor": border_color,
-            "Component.focusedBorderColor": accent_color,
-            "Component.disabledBorderColor": self.derivator.adjust_brightness(border_color, -0.3 if self.ghostty.is_dark else 0.3),
-            "Component.errorFocusColor": error_color,
-            "Component.inactiveErrorFocusColor": self.derivator.adjust_brightness(error_color, -0.3 if self.ghostty.is_dark else 0.3),
-            "Component.warningFocusColor": warning_color,
-            "Component.inactiveWarningFocusColor": self.derivator.adjust_brightness(warning_color, -0.3 if self.ghostty.is_dark else 0.3),
-            "Link.activeForeground": accent_color,
-            "Link.hoverForeground": accent_color,
-            "Link.pressedForeground": accent_color,
-            "Link.visitedForeground": self.derivator.adjust_brightness(accent_color, -0.2 if self.ghostty.is_dark else 0.2),
-            "ToggleButton.background": panel_bg,
-            "ToggleButton.foreground": fg,
-            "ToggleButton.onBackground": accent_color,
-            "ToggleButton.onForeground": "#FFFFFF" if self.ghostty.is_dark else "#000000",
-            "ToggleButton.offBackground": self.derivator.adjust_brightness(panel_bg, -0.1 if self.ghostty.is_dark else 0.1),
-            "ToggleButton.offForeground": fg,
-            "ToggleButton.buttonColor": fg,
-
-            # Trees and Lists
-            "Tree.background": bg,
-            "Tree.foreground": fg,
-            "Tree.selectionBackground": self.ghostty.selection_background,
-            "Tree.selectionForeground": self.ghostty.selection_foreground,
-            "Tree.selectionInactiveBackground": selection_inactive_bg,
-            "Tree.rowHeight": 20,
-            "List.background": bg,
-            "List.foreground": fg,
-            "List.selectionBackground": self.ghostty.selection_background,
-            "List.selectionForeground": self.ghostty.selection_foreground,
-            "List.selectionInactiveBackground": selection_inactive_bg,
-            "Table.background": bg,
-            "Table.foreground": fg,
-            "Table.selectionBackground": self.ghostty.selection_background,
-            "Table.selectionForeground": self.ghostty.selection_foreground,
-            "Table.stripeColor": self.derivator.adjust_brightness(bg, 0.05 if self.ghostty.is_dark else -0.05),
-            "Table.gridColor": border_color,
-
-            # Text fields
-            "TextField.background": bg,
-            "TextField.foreground": fg,
-            "TextField.selectionBackground": self.ghostty.selection_background,
-            "TextField.selectionForeground": self.ghostty.selection_foreground,
-            "TextArea.background": bg,
-            "TextArea.foreground": fg,
-            "TextArea.selectionBackground": self.ghostty.selection_background,
-            "TextArea.selectionForeground": self.ghostty.selection_foreground,
-            "FormattedTextField.background": bg,
-            "PasswordField.background": bg,
-            "TextPane.background": bg,
-            "TextPane.foreground": fg,
-            "EditorPane.selectionBackground": self.ghostty.selection_background,
-
-            # Separators and Borders
-            "Separator.foreground": border_color,
-            "Separator.separatorColor": border_color,
-            "TabbedPane.tabSelectionHeight": 2,
-            "TabbedPane.tabAreaBackground": panel_bg,
-            "TabbedPane.background": bg,
-            "TabbedPane.underlineColor": accent_color,
-            "TabbedPane.hoverColor": hover_bg,
-            "TabbedPane.contentAreaColor": border_color,
-
-            # Status Bar
-            "StatusBar.background": panel_bg,
-            "StatusBar.foreground": fg,
-            "StatusBar.borderColor": border_color,
-            "StatusBar.hoverBackground": hover_bg,
-
-            # Progress Bar
-            "ProgressBar.background": panel_bg,
-            "ProgressBar.foreground": accent_color,
-            "ProgressBar.progressColor": accent_color,
-            "ProgressBar.indeterminateStartColor": accent_color,
-            "ProgressBar.indeterminateEndColor": accent_secondary,
-
-            # Scroll Bar
-            "ScrollBar.background": bg,
-            "ScrollBar.thumbColor": self.derivator.adjust_brightness(bg, 0.3 if self.ghostty.is_dark else -0.3),
-            "ScrollBar.thumbBorderColor": self.derivator.adjust_brightness(bg, 0.4 if self.ghostty.is_dark else -0.4),
-            "ScrollBar.hoverThumbColor": self.derivator.adjust_brightness(bg, 0.4 if self.ghostty.is_dark else -0.4),
-            "ScrollBar.hoverThumbBorderColor": self.derivator.adjust_brightness(bg, 0.5 if self.ghostty.is_dark else -0.5),
-            "ScrollBar.trackColor": bg,
-            "ScrollBar.Mac.hoverThumbColor": self.derivator.adjust_brightness(bg, 0.4 if self.ghostty.is_dark else -0.4),
-            "ScrollBar.Mac.thumbColor": self.derivator.adjust_brightness(bg, 0.3 if self.ghostty.is_dark else -0.3),
-
-            # Search
-            "SearchEverywhere.background": panel_bg,
-            "SearchEverywhere.foreground": fg,
-            "SearchEverywhere.Tab.selectedBackground": hover_bg,
-            "SearchEverywhere.Tab.selectedForeground": fg,
-            "SearchEverywhere.SearchField.background": bg,
-            "SearchEverywhere.SearchField.borderColor": border_color,
-            "SearchEverywhere.List.separatorColor": border_color,
-            "SearchMatch.startBackground": self.derivator.blend_colors(bg, accent_color, 0.3),
-            "SearchMatch.endBackground": self.derivator.blend_colors(bg, accent_color, 0.1),
-
-            # Notifications
-            "Notification.background": panel_bg,
-            "Notification.foreground": fg,
-            "Notification.borderColor": border_color,
-            "Notification.errorBackground": self.derivator.blend_colors(bg, error_color, 0.1),
-            "Notification.errorBorderColor": error_color,
-            "Notification.errorForeground": fg,
-            "Notification.warningBackground": self.derivator.blend_colors(bg, warning_color, 0.1),
-            "Notification.warningBorderColor": warning_color,
-            "Notification.warningForeground": fg,
-            "Notification.infoBackground": self.derivator.blend_colors(bg, accent_color, 0.1),
-            "Notification.infoBorderColor": accent_color,
-            "Notification.infoForeground": fg,
-
-            # Tooltips
-            "ToolTip.background": panel_bg,
-            "ToolTip.foreground": fg,
-            "ToolTip.borderColor": border_color,
-            "ValidationTooltip.errorBackground": error_color,
-            "ValidationTooltip.errorBorderColor": self.derivator.adjust_brightness(error_color, 0.2 if self.ghostty.is_dark else -0.2),
-            "ValidationTooltip.warningBackground": warning_color,
-            "ValidationTooltip.warningBorderColor": self.derivator.adjust_brightness(warning_color, 0.2 if self.ghostty.is_dark else -0.2),
-
-            # Icons
-            "Icons.foreground": fg,
-            "Icons.greyForeground": self.derivator.adjust_brightness(fg, -0.3 if self.ghostty.is_dark else 0.3),
-            "Icons.redForeground": error_color,
-            "Icons.greenForeground": success_color,
-            "Icons.blueForeground": accent_color,
-            "Icons.yellowForeground": warning_color
-        }
-
-    def generate_editor_scheme_xml(self) -> str:
+    def generate_editor_scheme_xml(self, declaration: bool = True) -> str:
         """Generate editor color scheme XML"""
-        scheme = Element('scheme')
-        scheme.set('name', self.ghostty.name)
-        scheme.set('version', '142')
-        scheme.set('parent_scheme', 'Darcula' if self.ghostty.is_dark else 'Default')
+        buffer = io.StringIO()
+        self.write_editor_scheme_xml(buffer, declaration)
+        return buffer.getvalue()
+
+    def write_editor_scheme_xml(self, stream: TextIO, declaration: bool = True):
+        """Stream the editor color scheme XML, indented, in a single pass"""
+        writer = XmlWriter(stream)
+        if declaration:
+            stream.write(XML_DECLARATION)
+
+        writer.start('scheme', [
+            ('name', self.ghostty.name),
+            ('version', '142'),
+            ('parent_scheme', 'Darcula' if self.ghostty.is_dark else 'Default'),
+        ])
 
         # Add colors section
-        colors = SubElement(scheme, 'colors')
-        self._add_color_option(colors, 'BACKGROUND', self.ghostty.background)
-        self._add_color_option(colors, 'FOREGROUND', self.ghostty.foreground)
-        self._add_color_option(colors, 'CARET_COLOR', self.ghostty.cursor_color)
-        self._add_color_option(colors, 'SELECTION_BACKGROUND', self.ghostty.selection_background)
-        self._add_color_option(colors, 'SELECTION_FOREGROUND', self.ghostty.selection_foreground)
+        writer.start('colors')
+        self._write_color_option(writer, 'BACKGROUND', self.ghostty.background)
+        self._write_color_option(writer, 'FOREGROUND', self.ghostty.foreground)
+        self._write_color_option(writer, 'CARET_COLOR', self.ghostty.cursor_color)
+        self._write_color_option(writer, 'SELECTION_BACKGROUND', self.ghostty.selection_background)
+        self._write_color_option(writer, 'SELECTION_FOREGROUND', self.ghostty.selection_foreground)
 
         # Add derived colors
         line_number_color = self.derivator.adjust_brightness(self.ghostty.foreground, -0.3)
-        self._add_color_option(colors, 'LINE_NUMBERS_COLOR', line_number_color)
-        self._add_color_option(colors, 'GUTTER_BACKGROUND', self.ghostty.background)
+        self._write_color_option(writer, 'LINE_NUMBERS_COLOR', line_number_color)
+        self._write_color_option(writer, 'GUTTER_BACKGROUND', self.ghostty.background)
+        writer.end('colors')
 
         # Add attributes for syntax highlighting
-        attributes = SubElement(scheme, 'attributes')
-        self._add_syntax_colors(attributes)
+        writer.start('attributes')
+        self._write_syntax_colors(writer)
+        writer.end('attributes')
 
-        # Pretty print XML
-        rough_string = tostring(scheme, 'unicode')
-        reparsed = minidom.parseString(rough_string)
-        return reparsed.toprettyxml(indent="  ")
+        writer.end('scheme')
 
-    def _add_color_option(self, parent: Element, name: str, value: str):
+    def _write_color_option(self, writer: 'XmlWriter', name: str, value: str):
         """Add a color option to XML"""
-        option = SubElement(parent, 'option')
-        option.set('name', name)
-        option.set('value', value.upper())
+        writer.empty('option', [('name', name), ('value', value.upper())])
 
-    def _add_syntax_colors(self, attributes: Element):
+    def _write_syntax_colors(self, writer: 'XmlWriter'):
         """Add syntax highlighting colors based on terminal palette"""
         # Map syntax elements to terminal colors
         syntax_mappings = [
@@ -522,17 +1520,16 @@ class PhpStormThemeGenerator:
         ]
 
         for syntax_type, color in syntax_mappings:
-            option = SubElement(attributes, 'option')
-            option.set('name', syntax_type)
-            value = SubElement(option, 'value')
-            foreground = SubElement(value, 'option')
-            foreground.set('name', 'FOREGROUND')
-            foreground.set('value', color.upper().lstrip('#'))
+            writer.start('option', [('name', syntax_type)])
+            writer.start('value')
+            writer.empty('option', [('name', 'FOREGROUND'), ('value', color.upper().lstrip('#'))])
+            writer.end('value')
+            writer.end('option')
 
     def generate_plugin_xml(self) -> str:
         """Generate plugin.xml configuration"""
         theme_name = self.ghostty.name.replace('_', ' ').title()
-        plugin_id = f"com.ghostty.theme.{self.ghostty.name.lower().replace(' ', '_').replace('-', '_')}"
+        plugin_id = f"{PLUGIN_ID_PREFIX}{self.ghostty.name.lower().replace(' ', '_').replace('-', '_')}"
 
         return f'''<idea-plugin>
   <id>{plugin_id}</id>
@@ -583,100 +1580,2344 @@ class PhpStormThemeGenerator:
   </applicationListeners>
 </idea-plugin>'''
 
+    def generate_plugin_files(self, values: Optional[List] = None) -> Dict[str, str]:
+        """Generate every plugin file, keyed by its path inside the plugin
+
+        Rendered from a precompiled template, which produces exactly what the
+        generate_* methods above would. Pass the template's slot values if
+        they were already evaluated for this generator.
+        """
+        template = ThemeTemplate.for_theme(self.ghostty, self.rules)
+        if values is None:
+            with profile_stage('derive'):
+                values = template.evaluate(self)
+        with profile_stage('plugin_xml'):
+            plugin_xml = template.plugin_xml.render(values)
+
+        return {"META-INF/plugin.xml": plugin_xml, **self._render_resources(template, values)}
+
+    def generate_resource_files(self, values: Optional[List] = None) -> Dict[str, str]:
+        """Generate the theme and editor scheme files, without a plugin descriptor
+
+        Used for bundles, where one descriptor registers many themes.
+        """
+        template = ThemeTemplate.for_theme(self.ghostty, self.rules)
+        if values is None:
+            with profile_stage('derive'):
+                values = template.evaluate(self)
+        return self._render_resources(template, values)
+
+    def generate_icls(self, values: Optional[List] = None) -> str:
+        """Generate an .icls color scheme, the bare scheme element without an XML declaration"""
+        template = ThemeTemplate.for_theme(self.ghostty, self.rules)
+        if values is None:
+            with profile_stage('derive'):
+                values = template.evaluate(self, ('scheme_xml',))
+        with profile_stage('scheme_xml'):
+            return template.scheme_xml.render(values)
+
+    def contrast_failures(self, values: Optional[List] = None) -> List[Tuple[float, float, List[str]]]:
+        """Contrast checked colors still short of the derivator's contrast targets
+
+        Returns the contrast, the target and the theme.json UI keys of each.
+        Nothing is checked unless the derivator enforces contrast targets.
+        """
+        targets = self.derivator.contrast_targets
+        if not targets:
+            return []
+
+        template = ThemeTemplate.for_theme(self.ghostty, self.rules)
+        if values is None:
+            values = template.evaluate(self, ('contrast',))
+
+        failures = []
+        for index, keys in template.contrast_keys.items():
+            _, _, args, slot_args = template.steps[index]
+            args = list(args)
+            for position, slot in slot_args:
+                args[position] = values[slot]
+            _, against, role = args
+            ratio = contrast_ratio(hex_to_rgb(values[index]), hex_to_rgb(against))
+            if ratio < targets[role]:
+                failures.append((ratio, targets[role], keys))
+        return failures
+
+    def generate_outputs(self, formats: Tuple[str, ...],
+                         values: Optional[List] = None) -> Dict[str, Union[str, Dict[str, str]]]:
+        """Generate the content of each of the given output formats from a single derivation
+
+        'jar' and 'dir' get the plugin files, 'icls' the bare color scheme and
+        'json' the theme JSON. Only the slots the formats need are evaluated.
+        """
+        template = ThemeTemplate.for_theme(self.ghostty, self.rules)
+        plugin = 'jar' in formats or 'dir' in formats
+        if values is None:
+            texts = None if plugin else tuple({'icls': 'scheme_xml', 'json': 'theme_json'}[f] for f in formats)
+            with profile_stage('derive'):
+                values = template.evaluate(self, texts)
+
+        plugin_files = self.generate_plugin_files(values) if plugin else {}
+        outputs = {}
+        for output_format in formats:
+            if output_format in ('jar', 'dir'):
+                outputs[output_format] = plugin_files
+            elif output_format == 'icls':
+                outputs[output_format] = self.generate_icls(values)
+            elif plugin:
+                outputs[output_format] = plugin_files[f"resources/{self.ghostty.name}.theme.json"]
+            else:
+                with profile_stage('theme_json'):
+                    outputs[output_format] = template.theme_json.render(values)
+        return outputs
+
+    def _render_resources(self, template: 'ThemeTemplate', values: List) -> Dict[str, str]:
+        with profile_stage('theme_json'):
+            theme_json = template.theme_json.render(values)
+        with profile_stage('scheme_xml'):
+            scheme_xml = XML_DECLARATION + template.scheme_xml.render(values)
+
+        return {
+            f"resources/{self.ghostty.name}.theme.json": theme_json,
+            f"resources/{self.ghostty.name}.xml": scheme_xml,
+        }
+
+
+XML_DECLARATION = '<?xml version="1.0" ?>\n'
+
+
+class _Slot(str):
+    """Placeholder for a per-theme value while a template is traced
+
+    String operations on a slot are recorded as new slots instead of being
+    applied, so the template knows to apply them to the real value later.
+    """
+
+    def __new__(cls, tracer: '_TemplateTracer', index: int):
+        slot = super().__new__(cls, f"{{{{slot:{index}}}}}")
+        slot.tracer = tracer
+        slot.index = index
+        return slot
+
+    def upper(self):
+        return self.tracer.slot('upper', self)
+
+    def lower(self):
+        return self.tracer.slot('lower', self)
+
+    def title(self):
+        return self.tracer.slot('title', self)
+
+    def lstrip(self, chars=None):
+        return self.tracer.slot('lstrip', self, chars)
+
+    def replace(self, old, new, count=-1):
+        return self.tracer.slot('replace', self, old, new, count)
+
+
+class _TemplateTracer:
+    """Records the operations that turn a theme's inputs into template slot values"""
+
+    def __init__(self):
+        self.operations: List[Tuple] = []
+        self.slots: Dict[Tuple, _Slot] = {}
+
+    def slot(self, operation: str, *args) -> _Slot:
+        # Identical operations share a slot, so each is evaluated once per theme
+        key = (operation,) + args
+        if key not in self.slots:
+            self.slots[key] = _Slot(self, len(self.operations))
+            self.operations.append(key)
+        return self.slots[key]
+
+
+class _TracingDerivator(ColorDerivator):
+    """ColorDerivator that records derivations as template slots"""
+
+    def __init__(self, tracer: _TemplateTracer):
+        self.tracer = tracer
+
+    def adjust_brightness(self, hex_color, factor):
+        return self.tracer.slot('adjust_brightness', hex_color, factor)
+
+    def adjust_saturation(self, hex_color, factor):
+        return self.tracer.slot('adjust_saturation', hex_color, factor)
+
+    def blend_colors(self, color1, color2, ratio=0.5):
+        return self.tracer.slot('blend_colors', color1, color2, ratio)
+
+    def ensure_contrast(self, hex_color, against, role):
+        return self.tracer.slot('ensure_contrast', hex_color, against, role)
+
+
+class _TracingPalette(dict):
+    """Palette whose lookups become template slots"""
+
+    def __init__(self, tracer: _TemplateTracer):
+        super().__init__()
+        self.tracer = tracer
+
+    def get(self, index, default=None):
+        return self.tracer.slot('palette', index, default)
 
-def create_jar_file(theme_dir: Path, output_dir: Path) -> Path:
-    """Package theme directory into a JAR file"""
-    jar_name = f"{theme_dir.name}.jar"
-    jar_path = output_dir / jar_name
 
-    with zipfile.ZipFile(jar_path, 'w', zipfile.ZIP_DEFLATED) as jar:
-        for file_path in theme_dir.rglob('*'):
-            if file_path.is_file():
-                # Calculate relative path from theme directory
-                relative_path = file_path.relative_to(theme_dir)
-                jar.write(file_path, relative_path)
+class _ProbeTheme:
+    """Stand-in theme whose colors and name are template slots"""
+
+    def __init__(self, tracer: _TemplateTracer, is_dark: bool):
+        for attribute in ('name',) + GhosttyTheme.COLOR_ATTRIBUTES:
+            setattr(self, attribute, tracer.slot('attribute', attribute))
+        self.palette = _TracingPalette(tracer)
+        self.is_dark = is_dark
+
+
+class _TemplateText:
+    """Pre-serialized text split into fixed fragments and slot references"""
+
+    SLOT_PATTERN = re.compile(r'\{\{slot:(\d+)\}\}')
+
+    def __init__(self, text: str, escape=None):
+        parts = self.SLOT_PATTERN.split(text)
+        self.fragments = parts[0::2]
+        self.slots = [int(index) for index in parts[1::2]]
+        self.unique_slots = sorted(set(self.slots))
+        self.escape = escape
+
+    def render(self, values: List) -> str:
+        if self.escape:
+            values = {index: self.escape(values[index]) for index in self.unique_slots}
+
+        parts = [self.fragments[0]]
+        for index, fragment in zip(self.slots, self.fragments[1:]):
+            parts.append(values[index])
+            parts.append(fragment)
+        return ''.join(parts)
+
+
+def _json_string_body(value: str) -> str:
+    """Escape a value the way json.dumps would inside a string literal"""
+    return encode_basestring_ascii(value)[1:-1]
+
+
+class ThemeTemplate:
+    """Theme layout compiled once per derivation rules and dark/light variant
+
+    The fixed structure of theme.json, the editor scheme and plugin.xml is the
+    same for every theme. It is traced once through the generator with slots
+    in place of the theme's colors, leaving per-theme rendering as evaluating
+    a flat list of slot values and joining them into the fragments.
+
+    Each text is traced on first use, so an editor scheme alone never pays
+    for the theme JSON and its derivation rules. Tracing appends slots
+    without renumbering earlier ones, so values and plans stay valid.
+    """
+
+    TEXTS = ('theme_json', 'scheme_xml', 'plugin_xml')
+
+    _variants: Dict[Tuple[DerivationRules, bool], 'ThemeTemplate'] = {}
+
+    def __init__(self, is_dark: bool, rules: Optional[DerivationRules] = None):
+        self.tracer = _TemplateTracer()
+        self.probe = PhpStormThemeGenerator(_ProbeTheme(self.tracer, is_dark), _TracingDerivator(self.tracer), rules)
+        self.probe.theme_id = self.tracer.slot('theme_id')
+        self.operations = self.tracer.operations
+        self.steps: List[Tuple] = []
+        self._plans: Dict[Tuple[str, ...], List[Tuple]] = {}
+
+    def complete(self) -> 'ThemeTemplate':
+        """Trace every text now, before the template is shared between threads"""
+        for text in self.TEXTS:
+            getattr(self, text)
+        return self
+
+    def _traced(self, result):
+        # Precompute which arguments of the new operations refer to earlier slots
+        for index in range(len(self.steps), len(self.operations)):
+            operation, *args = self.operations[index]
+            slot_args = tuple((position, arg.index) for position, arg in enumerate(args) if isinstance(arg, _Slot))
+            self.steps.append((index, operation, tuple(args), slot_args))
+        return result
+
+    @cached_property
+    def _theme_json_layout(self) -> Dict:
+        return self._traced(self.probe.generate_theme_json())
+
+    @cached_property
+    def theme_json(self) -> _TemplateText:
+        return _TemplateText(json.dumps(self._theme_json_layout, indent=2), _json_string_body)
+
+    @cached_property
+    def scheme_xml(self) -> _TemplateText:
+        return _TemplateText(self._traced(self.probe.generate_editor_scheme_xml(declaration=False)))
+
+    @cached_property
+    def plugin_xml(self) -> _TemplateText:
+        return _TemplateText(self._traced(self.probe.generate_plugin_xml()))
+
+    @cached_property
+    def contrast_keys(self) -> Dict[int, List[str]]:
+        """The theme.json UI keys set from each contrast checked color, by its slot"""
+        contrast_keys: Dict[int, List[str]] = {}
+        for key, value in self._flatten(self._theme_json_layout['ui']):
+            if isinstance(value, _Slot) and self.operations[value.index][0] == 'ensure_contrast':
+                contrast_keys.setdefault(value.index, []).append(key)
+        return contrast_keys
+
+    @classmethod
+    def _flatten(cls, ui: Dict, prefix: str = '') -> List[Tuple[str, object]]:
+        items = []
+        for key, value in ui.items():
+            if isinstance(value, dict):
+                items.extend(cls._flatten(value, f"{prefix}{key}."))
+            else:
+                items.append((f"{prefix}{key}", value))
+        return items
+
+    @classmethod
+    def for_theme(cls, theme: GhosttyTheme, rules: Optional[DerivationRules] = None) -> 'ThemeTemplate':
+        """Get the compiled template for a theme's variant, compiling it on first use"""
+        variant = (rules or DEFAULT_RULES, theme.is_dark)
+        if variant not in cls._variants:
+            cls._variants[variant] = cls(variant[1], variant[0])
+        return cls._variants[variant]
+
+    def plan(self, texts: Tuple[str, ...]) -> List[Tuple]:
+        """The steps needed to fill the named texts' slots, including the slots those depend on"""
+        if texts not in self._plans:
+            needed = set()
+            for text in texts:
+                needed.update(self.contrast_keys if text == 'contrast' else getattr(self, text).unique_slots)
+            for index, _, _, slot_args in reversed(self.steps):
+                if index in needed:
+                    needed.update(slot for _, slot in slot_args)
+            self._plans[texts] = [step for step in self.steps if step[0] in needed]
+        return self._plans[texts]
+
+    def evaluate(self, generator: 'PhpStormThemeGenerator', texts: Optional[Tuple[str, ...]] = None) -> List:
+        """Compute the slot values for the generator's theme
+
+        Given the names of some texts (e.g. ('scheme_xml',)), only their slots
+        are computed, and the rest are left as None. 'contrast' names the
+        contrast checked colors.
+        """
+        theme = generator.ghostty
+        derivator = generator.derivator
+        handlers = {
+            'attribute': lambda attribute: getattr(theme, attribute),
+            'palette': theme.palette.get,
+            'theme_id': lambda: generator.theme_id,
+            'adjust_brightness': derivator.adjust_brightness,
+            'adjust_saturation': derivator.adjust_saturation,
+            'blend_colors': derivator.blend_colors,
+            'ensure_contrast': derivator.ensure_contrast,
+            'upper': str.upper,
+            'lower': str.lower,
+            'title': str.title,
+            'lstrip': str.lstrip,
+            'replace': str.replace,
+        }
+
+        steps = self.plan(texts) if texts is not None else self.complete().steps
+        values = [None] * len(self.steps)
+        for index, operation, args, slot_args in steps:
+            if slot_args:
+                args = list(args)
+                for position, slot in slot_args:
+                    args[position] = values[slot]
+            values[index] = handlers[operation](*args)
+
+        return values
+
+
+class StageProfiler:
+    """Aggregates count, wall time, CPU time and peak memory per conversion stage
+
+    Peak memory is the most any single run of a stage allocated on top of
+    what was already in use, as traced by tracemalloc. tracemalloc has one
+    peak per process, so it is only meaningful while stages run one at a
+    time; stages run after stop_tracing_memory report no peak (None).
+    CPU time is measured for the whole process, so likewise stages run
+    after stop_measuring_cpu report none. Stages may finish on several
+    threads at once.
+    """
+
+    def __init__(self, trace_memory: bool = True):
+        import threading
+        self.stages: Dict[str, Dict] = {}
+        self.trace_memory = trace_memory
+        self.measure_cpu = True
+        self.notes: List[str] = []
+        self.lock = threading.Lock()
+        if trace_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as one run of the named stage"""
+        import tracemalloc
+        if self.trace_memory:
+            start_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu if self.measure_cpu else None
+            peak = tracemalloc.get_traced_memory()[1] - start_memory if self.trace_memory else None
+            self._add(name, 1, wall, cpu, peak)
+
+    def _add(self, name: str, count: int, wall: float, cpu: Optional[float], peak: Optional[int]):
+        with self.lock:
+            totals = self.stages.setdefault(name, {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'peak_memory': 0})
+            totals['count'] += count
+            totals['wall'] += wall
+            # CPU time and peak are unknown once any run of the stage went unmeasured
+            if cpu is None or totals['cpu'] is None:
+                totals['cpu'] = None
+            else:
+                totals['cpu'] += cpu
+            if peak is None or totals['peak_memory'] is None:
+                totals['peak_memory'] = None
+            else:
+                totals['peak_memory'] = max(totals['peak_memory'], peak)
+
+    def stop_tracing_memory(self, note: str):
+        """Stop measuring peak memory, such as when stages start to run concurrently, noting why in the report"""
+        import tracemalloc
+        if self.trace_memory:
+            self.trace_memory = False
+            tracemalloc.stop()
+            self.notes.append(note)
+
+    def stop_measuring_cpu(self, note: str):
+        """Stop measuring CPU time, such as when stages start to run concurrently, noting why in the report"""
+        if self.measure_cpu:
+            self.measure_cpu = False
+            self.notes.append(note)
+
+    def merge(self, stages: Dict[str, Dict]):
+        """Fold in stage totals collected elsewhere, such as in a worker process"""
+        for name, totals in stages.items():
+            self._add(name, totals['count'], totals['wall'], totals['cpu'], totals['peak_memory'])
+
+    def take(self) -> Dict[str, Dict]:
+        """Return the collected stage totals and start afresh"""
+        with self.lock:
+            stages, self.stages = self.stages, {}
+        return stages
+
+    def report(self) -> str:
+        """Format the stage totals as a table"""
+        lines = [f"{'stage':<14}{'count':>7}{'wall ms':>11}{'avg µs':>10}{'cpu ms':>10}{'peak KiB':>10}"]
+        for name, totals in self.stages.items():
+            cpu = '-' if totals['cpu'] is None else f"{totals['cpu'] * 1e3:.1f}"
+            peak = '-' if totals['peak_memory'] is None else f"{totals['peak_memory'] / 1024:.1f}"
+            lines.append(f"{name:<14}{totals['count']:>7}{totals['wall'] * 1e3:>11.1f}"
+                         f"{totals['wall'] / totals['count'] * 1e6:>10.1f}{cpu:>10}{peak:>10}")
+        lines.extend(self.notes)
+        return '\n'.join(lines)
+
+
+# Active profiler, or None when profiling is off
+PROFILER: Optional[StageProfiler] = None
+
+
+def profile_stage(name: str):
+    """Context manager timing a stage, or a shared no-op when profiling is off"""
+    return PROFILER.stage(name) if PROFILER else _NO_PROFILING
+
+
+_NO_PROFILING = nullcontext()
+
+
+def enable_profiling(trace_memory: bool = True) -> StageProfiler:
+    """Turn on stage profiling for this process"""
+    global PROFILER
+    PROFILER = StageProfiler(trace_memory)
+    return PROFILER
+
+
+class Compression(NamedTuple):
+    """How JAR entries are compressed, parsed from a --compression spec"""
+    spec: str
+    method: int
+    level: Optional[int]
+
+    # Method name -> zip method id (zipfile.ZIP_STORED etc., spelled out so
+    # parsing options needs no zipfile import), default level and accepted levels
+    METHODS = {
+        'stored': (0, None, ()),
+        'deflate': (8, 6, range(0, 10)),
+        'bzip2': (12, 9, range(1, 10)),
+        'lzma': (14, None, ()),
+    }
+
+    @classmethod
+    def parse(cls, spec: str) -> 'Compression':
+        """Parse 'stored', 'lzma', 'deflate[:0-9]' or 'bzip2[:1-9]'"""
+        name, _, level_text = spec.strip().lower().partition(':')
+        if name not in cls.METHODS:
+            raise ValueError(f"Unknown compression '{spec}', expected one of {', '.join(cls.METHODS)}")
+
+        method, level, levels = cls.METHODS[name]
+        if level_text:
+            if not level_text.isdigit() or int(level_text) not in levels:
+                raise ValueError(f"Invalid level for {name} compression: '{level_text}'")
+            level = int(level_text)
+
+        return cls(name if level is None else f"{name}:{level}", method, level)
+
+
+DEFAULT_COMPRESSION = Compression.parse('deflate')
+
+# Every JAR entry gets the same timestamp and permissions, so identical
+# inputs and compression always produce identical JAR bytes
+JAR_TIMESTAMP = (1980, 1, 1, 0, 0, 0)
+
+
+def write_jar_entry(jar: 'zipfile.ZipFile', relative_path: str, content: str,
+                    compression: Compression = DEFAULT_COMPRESSION):
+    """Write one file into a JAR with reproducible entry metadata"""
+    import zipfile
+    info = zipfile.ZipInfo(relative_path, date_time=JAR_TIMESTAMP)
+    info.compress_type = compression.method
+    info.create_system = 3
+    info.external_attr = 0o100644 << 16
+    jar.writestr(info, content, compresslevel=compression.level)
+
+
+def create_jar_file(plugin_files: Dict[str, str], jar_path: Union[Path, BinaryIO],
+                    compression: Compression = DEFAULT_COMPRESSION) -> Union[Path, BinaryIO]:
+    """Package in-memory plugin files straight into a JAR file, in path order
+
+    jar_path may also be a binary file object, such as io.BytesIO.
+    """
+    import zipfile
+    with zipfile.ZipFile(jar_path, 'w', compression.method) as jar:
+        for relative_path in sorted(plugin_files):
+            write_jar_entry(jar, relative_path, plugin_files[relative_path], compression)
 
     return jar_path
 
 
-def convert_theme(input_file: Path, output_dir: Path, create_dir: bool = False):
-    """Convert a single Ghostty theme to PhpStorm format"""
-    print(f"Converting {input_file.name}...")
+class ThemeBundle:
+    """A single plugin JAR that registers many themes
 
-    # Parse Ghostty theme
-    ghostty_theme = GhosttyParser.parse_theme_file(input_file)
+    Theme resources are streamed into the archive as they are added, and the
+    plugin descriptor listing every theme is written when the bundle closes.
+    Themes are added in batch order, so the same themes give the same bytes.
+    """
 
-    # Generate PhpStorm theme
-    generator = PhpStormThemeGenerator(ghostty_theme)
+    PLUGIN_ID = "com.ghostty.themes"
+
+    def __init__(self, jar_path: Path, compression: Compression = DEFAULT_COMPRESSION):
+        import zipfile
+        self.jar_path = jar_path
+        self.compression = compression
+        self.jar = zipfile.ZipFile(jar_path, 'w', compression.method)
+        self.themes: List[Tuple[str, str]] = []
+
+    def __enter__(self) -> 'ThemeBundle':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, name: str, theme_id: str, resource_files: Dict[str, str]):
+        """Add one theme's resources, registered under the given theme id"""
+        for relative_path in sorted(resource_files):
+            write_jar_entry(self.jar, relative_path, resource_files[relative_path], self.compression)
+        self.themes.append((name, theme_id))
+
+    def close(self):
+        """Write the plugin descriptor and finish the archive"""
+        if self.jar is None:
+            return
+        write_jar_entry(self.jar, "META-INF/plugin.xml", self.generate_plugin_xml(), self.compression)
+        self.jar.close()
+        self.jar = None
+
+    def generate_plugin_xml(self) -> str:
+        """Generate a plugin.xml registering every theme in the bundle"""
+        theme_list = '\n'.join(f"      <li>{XmlWriter.escape(name.replace('_', ' ').title())}</li>"
+                               for name, _ in self.themes)
+        extensions = '\n'.join(f'    <themeProvider id="{theme_id}" path="/{XmlWriter.escape(name)}.theme.json"/>\n'
+                               f'    <bundledColorScheme path="/{XmlWriter.escape(name)}.xml"/>'
+                               for name, theme_id in self.themes)
+
+        return f'''<idea-plugin>
+  <id>{self.PLUGIN_ID}</id>
+  <name>Ghostty Themes</name>
+  <version>1.0.0</version>
+  <vendor email="noreply@anthropic.com" url="https://github.com/anthropics/claude-code">Ghostty Converter</vendor>
+  <category>UI</category>
 
-    # Create output directory
-    theme_dir = output_dir / f"{ghostty_theme.name}-theme"
-    theme_dir.mkdir(parents=True, exist_ok=True)
+  <description><![CDATA[
+    <h2>Ghostty Themes</h2>
+    <p>{len(self.themes)} themes converted from the Ghostty terminal theme collection.</p>
 
-    # Create resources directory
-    resources_dir = theme_dir / "resources"
-    resources_dir.mkdir(exist_ok=True)
+    <ul>
+{theme_list}
+    </ul>
+  ]]></description>
 
-    # Create META-INF directory
-    meta_inf_dir = theme_dir / "META-INF"
-    meta_inf_dir.mkdir(exist_ok=True)
+  <idea-version since-build="193" until-build="999.*"/>
 
-    # Write theme JSON
-    theme_json = generator.generate_theme_json()
-    with open(resources_dir / f"{ghostty_theme.name}.theme.json", 'w') as f:
-        json.dump(theme_json, f, indent=2)
+  <depends>com.intellij.modules.platform</depends>
 
-    # Write editor scheme XML
-    scheme_xml = generator.generate_editor_scheme_xml()
-    with open(resources_dir / f"{ghostty_theme.name}.xml", 'w') as f:
-        f.write(scheme_xml)
+  <extensions defaultExtensionNs="com.intellij">
+{extensions}
+  </extensions>
 
-    # Write plugin.xml
-    plugin_xml = generator.generate_plugin_xml()
-    with open(meta_inf_dir / "plugin.xml", 'w') as f:
-        f.write(plugin_xml)
+  <applicationListeners>
+  </applicationListeners>
+</idea-plugin>'''
+
+
+def write_theme_dir(plugin_files: Dict[str, str], theme_dir: Path) -> Path:
+    """Write in-memory plugin files out as a theme directory"""
+    for relative_path, content in plugin_files.items():
+        file_path = theme_dir / relative_path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(file_path, 'w') as f:
+            f.write(content)
+
+    return theme_dir
+
+
+def convert_theme(input_file: Path, output_dir: Path, create_dir: bool = False,
+                  derivator: Optional[ColorDerivator] = None, ghostty_theme: Optional[GhosttyTheme] = None,
+                  compression: Compression = DEFAULT_COMPRESSION, rules: Optional[DerivationRules] = None):
+    """Convert a single Ghostty theme to PhpStorm format"""
+    print(f"Converting {input_file.name}...")
+
+    # Parse Ghostty theme, unless it was already parsed for us
+    if ghostty_theme is None:
+        with profile_stage('parse'):
+            ghostty_theme = GhosttyParser.parse_theme_file(input_file)
+    print_diagnostics(ghostty_theme)
+
+    # Generate PhpStorm theme
+    generator = PhpStormThemeGenerator(ghostty_theme, derivator, rules)
+    plugin_files = generator.generate_plugin_files()
+    print_contrast_failures(generator)
 
+    # Only touch the disk for the files we actually want to keep
     if create_dir:
+        with profile_stage('write_dir'):
+            theme_dir = write_theme_dir(plugin_files, output_dir / f"{ghostty_theme.name}-theme")
         print(f"  ✓ Generated theme in {theme_dir}")
         return theme_dir
     else:
-        jar_path = create_jar_file(theme_dir, output_dir)
+        with profile_stage('jar'):
+            jar_path = create_jar_file(plugin_files, output_dir / f"{ghostty_theme.name}-theme.jar", compression)
         print(f"  ✓ Generated JAR: {jar_path.name}")
         return jar_path
 
 
-def create_icls_file(ghostty_theme: GhosttyTheme, output_dir: Path) -> Path:
+def print_diagnostics(ghostty_theme: GhosttyTheme):
+    """Print the warnings found while parsing a theme"""
+    for diagnostic in ghostty_theme.diagnostics:
+        print(f"  ! {ghostty_theme.name}, {diagnostic}")
+
+
+def format_contrast_failures(generator: PhpStormThemeGenerator) -> List[str]:
+    """Report lines for a theme's colors still short of the contrast target"""
+    return [f"  ! {generator.ghostty.name}, contrast {ratio:.2f}:1 is below {target:g}:1 for {', '.join(keys)}"
+            for ratio, target, keys in generator.contrast_failures()]
+
+
+def print_contrast_failures(generator: PhpStormThemeGenerator):
+    """Print the colors of a theme still short of the contrast target"""
+    for line in format_contrast_failures(generator):
+        print(line)
+
+
+def create_icls_file(ghostty_theme: GhosttyTheme, output_dir: Path,
+                     derivator: Optional[ColorDerivator] = None) -> Path:
     """Create .icls color scheme file for direct PhpStorm import"""
-    generator = PhpStormThemeGenerator(ghostty_theme)
-    icls_content = generator.generate_editor_scheme_xml()
-
-    # Remove XML declaration and change root element
-    lines = icls_content.split('\n')
-    # Skip XML declaration and find scheme element
-    scheme_start = -1
-    for i, line in enumerate(lines):
-        if '<scheme' in line:
-            scheme_start = i
-            break
-
-    if scheme_start >= 0:
-        # Remove the <?xml> declaration and get clean scheme content
-        clean_content = '\n'.join(lines[scheme_start:])
-        icls_path = output_dir / f"{ghostty_theme.name}.icls"
+    icls_content = PhpStormThemeGenerator(ghostty_theme, derivator).generate_icls()
+
+    icls_path = output_dir / f"{ghostty_theme.name}.icls"
+    with profile_stage('write_icls'):
         with open(icls_path, 'w') as f:
-            f.write(clean_content)
-        return icls_path
+            f.write(icls_content)
+    return icls_path
+
+
+class BuildManifest:
+    """Records what a batch run produced, so unchanged themes can be skipped next time
+
+    The manifest lives in the output directory and maps each source theme file
+    name to its content hash and the outputs generated from it. It is only
+    trusted when the converter version and build options match the current run.
+    """
+
+    FILE_NAME = ".ghostty-to-phpstorm-manifest.json"
+
+    def __init__(self, output_dir: Path, options: Dict):
+        self.path = output_dir / self.FILE_NAME
+        self.output_dir = output_dir
+        self.options = options
+        self.themes: Dict[str, Dict] = {}
+
+    @classmethod
+    def load(cls, output_dir: Path, options: Dict) -> 'BuildManifest':
+        """Load the manifest, discarding it if it was built differently"""
+        manifest = cls(output_dir, options)
+        try:
+            with open(manifest.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return manifest
+
+        if data.get('version') == CONVERTER_VERSION and data.get('options') == options:
+            manifest.themes = data.get('themes', {})
+        return manifest
+
+    def save(self):
+        """Write the manifest atomically"""
+        data = {
+            'version': CONVERTER_VERSION,
+            'options': self.options,
+            'themes': dict(sorted(self.themes.items())),
+        }
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
 
-    return None
+    @staticmethod
+    def hash_file(file_path: Path) -> str:
+        """Hash a source theme file's content"""
+        import hashlib
+        with open(file_path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def is_up_to_date(self, theme_file: Path, file_hash: str) -> bool:
+        """Check whether a theme's recorded outputs were built from this exact content"""
+        entry = self.themes.get(theme_file.name)
+        if not entry or entry['hash'] != file_hash:
+            return False
+        return all((self.output_dir / output).exists() for output in entry['outputs'])
+
+    def outputs(self, theme_file: Path) -> List[Path]:
+        """The outputs recorded for a theme"""
+        return [self.output_dir / output for output in self.themes[theme_file.name]['outputs']]
+
+    def record(self, theme_file: Path, file_hash: str, outputs: List[Path]):
+        """Remember the outputs generated from a theme"""
+        self.themes[theme_file.name] = {
+            'hash': file_hash,
+            'outputs': [str(output.relative_to(self.output_dir)) for output in outputs],
+        }
+
+    def prune(self, theme_files: List[Path]) -> List[str]:
+        """Delete outputs of themes whose source file no longer exists"""
+        import shutil
+        current = {theme_file.name for theme_file in theme_files}
+        pruned = []
+        for name in sorted(set(self.themes) - current):
+            for output in self.themes.pop(name)['outputs']:
+                output_path = self.output_dir / output
+                if output_path.is_dir():
+                    shutil.rmtree(output_path)
+                elif output_path.exists():
+                    output_path.unlink()
+            pruned.append(name)
+        return pruned
+
+
+# Bytes read from each candidate file to tell Ghostty themes from other files
+SNIFF_BYTES = 4096
+
+
+def _glob_matcher(patterns: Sequence[str]):
+    """Match a file's name, or its path relative to the scanned directory for patterns with a '/', against globs"""
+    import fnmatch
+    name_patterns = [fnmatch.translate(pattern) for pattern in patterns if '/' not in pattern]
+    path_patterns = [fnmatch.translate(pattern) for pattern in patterns if '/' in pattern]
+    match_name = re.compile('|'.join(name_patterns)).match if name_patterns else None
+    match_path = re.compile('|'.join(path_patterns)).match if path_patterns else None
+    return lambda name, relative: bool((match_name and match_name(name)) or (match_path and match_path(relative)))
+
+
+def discover_themes(directory: Path, recursive: bool = False, include: Sequence[str] = (),
+                    exclude: Sequence[str] = (), sniff: bool = True,
+                    rejected: Optional[List[Path]] = None) -> Iterator[Path]:
+    """Yield the Ghostty theme files in a directory as they are found
+
+    Entries are streamed from os.scandir, whose cached file types save a
+    stat per entry, so memory does not grow with the directory's size.
+    Hidden files and directories are skipped, and with recursive set,
+    subdirectories are scanned too (symlinked ones are not followed).
+
+    include and exclude are glob patterns (see _glob_matcher). Excluded
+    directories are not scanned. Unless sniff is False, files whose first
+    SNIFF_BYTES have no theme key are dropped before parsing, and appended
+    to rejected if given.
+    """
+    included = _glob_matcher(include) if include else None
+    excluded = _glob_matcher(exclude) if exclude else None
+    pending = [(directory, '')]
+    while pending:
+        current, prefix = pending.pop()
+        try:
+            entries = os.scandir(current)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                relative = prefix + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and not (excluded and excluded(entry.name, relative)):
+                            pending.append((entry.path, relative + '/'))
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                if (included and not included(entry.name, relative)) or (excluded and excluded(entry.name, relative)):
+                    continue
+
+                path = Path(entry.path)
+                if sniff:
+                    try:
+                        with open(entry.path, 'rb') as f:
+                            is_theme = GhosttyParser.looks_like_theme(f.read(SNIFF_BYTES))
+                    except OSError:
+                        is_theme = True  # Left for the conversion to report
+                    if not is_theme:
+                        if rejected is not None:
+                            rejected.append(path)
+                        continue
+                yield path
+
+
+def recorded(items: Iterable, into: List) -> Iterator:
+    """Yield items, appending each to into as it passes"""
+    for item in items:
+        into.append(item)
+        yield item
+
+
+def unique_theme_files(theme_files: List[Path]) -> List[Path]:
+    """Drop files named like an earlier theme file, which would overwrite its outputs"""
+    seen = set()
+    unique = []
+    for theme_file in theme_files:
+        if theme_file.name in seen:
+            print(f"  ! Skipping {theme_file}, another theme is named {theme_file.name}")
+            continue
+        seen.add(theme_file.name)
+        unique.append(theme_file)
+    return unique
+
+
+def parse_batch_themes(theme_files: List[Path], theme_cache: Optional[Path] = None) -> Dict[str, GhosttyTheme]:
+    """Parse a batch of themes up front, through the binary theme cache if given"""
+    cache = ThemeCache.load(theme_cache) if theme_cache else None
+    themes = {}
+    for theme_file in theme_files:
+        try:
+            themes[theme_file.name] = cache.get(theme_file) if cache else GhosttyParser.parse_theme_file(theme_file)
+        except (OSError, ValueError):
+            # Left for the per-theme conversion to report
+            continue
+
+    if cache:
+        cache.retain(theme_files)
+        cache.save()
+    return themes
+
+
+# Largest RMS color difference (CIE76 delta E over the background, foreground
+# and 16 ANSI colors) at which two themes count as near duplicates. 2.3 is
+# about the smallest difference anyone notices.
+NEAR_DUPLICATE_DISTANCE = 2.3
+
+
+def theme_signature(theme: GhosttyTheme) -> bytes:
+    """Every color of a theme, so themes that differ only in name share a signature"""
+    return theme.colors.tobytes() + theme.palette.colors.tobytes() + theme.palette.present.to_bytes(32, 'little')
+
+
+def theme_features(theme: GhosttyTheme) -> Tuple[float, ...]:
+    """Background, foreground and the 16 ANSI colors in CIELAB, as one vector"""
+    colors = [theme.colors[0], theme.colors[1], *theme.palette.colors[:16]]
+    return tuple(component for rgb in colors for component in rgb_to_lab(rgb))
+
+
+class DuplicateCluster(NamedTuple):
+    """A theme and the themes that convert to the same, or nearly the same, colors
+
+    Each duplicate comes with its RMS delta E from theme, 0 for exact duplicates.
+    """
+    theme: GhosttyTheme
+    duplicates: List[Tuple[GhosttyTheme, float]]
+
+
+def find_duplicates(themes: List[GhosttyTheme], distance: float = NEAR_DUPLICATE_DISTANCE) -> List[DuplicateCluster]:
+    """Group themes into clusters of exact and near duplicates
+
+    Exact duplicates are found by hashing each theme's colors. The distinct
+    themes then go into a grid over their background color and foreground
+    lightness, with cells as wide as the largest distance two near
+    duplicates can be apart, so each theme is only compared with those in
+    the 81 cells around its own. Near duplicates of near duplicates share a
+    cluster. Returns one cluster per theme kept, in input order, each kept
+    theme being the first of its cluster.
+    """
+    parents = list(range(len(themes)))
+
+    def root(index: int) -> int:
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    distinct = []
+    signatures: Dict[bytes, int] = {}
+    for index, theme in enumerate(themes):
+        first = signatures.setdefault(theme_signature(theme), index)
+        if first == index:
+            distinct.append(index)
+        else:
+            parents[index] = first
+
+    features = {index: theme_features(themes[index]) for index in distinct}
+    if distance > 0:
+        # Vectors are within reach when their RMS delta E over all 18 colors is within distance
+        reach = distance * math.sqrt(18)
+        grid: Dict[Tuple[int, ...], List[int]] = {}
+        for index in distinct:
+            vector = features[index]
+            cell = tuple(math.floor(component / reach) for component in vector[:4])
+            for neighbor in product(*((c - 1, c, c + 1) for c in cell)):
+                for other in grid.get(neighbor, ()):
+                    if math.dist(vector, features[other]) <= reach:
+                        first, second = sorted((root(index), root(other)))
+                        parents[second] = first
+            grid.setdefault(cell, []).append(index)
+
+    clusters: Dict[int, DuplicateCluster] = {}
+    for index, theme in enumerate(themes):
+        kept = root(index)
+        if kept == index:
+            clusters[index] = DuplicateCluster(theme, [])
+        else:
+            difference = 0.0
+            if theme_signature(theme) != theme_signature(themes[kept]):
+                difference = math.dist(theme_features(theme), features[kept]) / math.sqrt(18)
+            clusters[kept].duplicates.append((theme, difference))
+    return list(clusters.values())
+
+
+def format_duplicates(clusters: List[DuplicateCluster]) -> List[str]:
+    """Report lines for every duplicate theme"""
+    lines = []
+    for cluster in clusters:
+        for duplicate, difference in cluster.duplicates:
+            if difference:
+                lines.append(f"  ~ {duplicate.name} is within delta E {difference:.2f} of {cluster.theme.name}")
+            else:
+                lines.append(f"  = {duplicate.name} has the same colors as {cluster.theme.name}")
+    return lines
+
+
+def dedupe_theme_files(theme_files: List[Path], distance: float = NEAR_DUPLICATE_DISTANCE,
+                       theme_cache: Optional[Path] = None) -> List[Path]:
+    """Drop theme files that duplicate an earlier one, printing what was dropped
+
+    Files that fail to parse are kept, for the conversion to report.
+    """
+    themes = parse_batch_themes(theme_files, theme_cache)
+    clusters = find_duplicates([themes[f.name] for f in theme_files if f.name in themes], distance)
+    dropped = {duplicate.name for cluster in clusters for duplicate, _ in cluster.duplicates}
+    if dropped:
+        print(f"Skipping {len(dropped)} duplicate themes:")
+        for line in format_duplicates(clusters):
+            print(line)
+    return [theme_file for theme_file in theme_files if theme_file.name not in dropped]
+
+
+# ANSI colors considered for a theme's accent hue (red to cyan, normal and
+# bright), and the least chroma that still counts as a hue rather than a grey
+ACCENT_INDICES = (1, 2, 3, 4, 5, 6, 9, 10, 11, 12, 13, 14)
+ACCENT_MIN_CHROMA = 0.1
+
+
+class ThemeMetrics(NamedTuple):
+    """The color measures of a theme that --where can select on"""
+    luminance: float
+    dark: bool
+    hue: Optional[float]
+    contrast: float
+
+
+def theme_metrics(theme: GhosttyTheme) -> ThemeMetrics:
+    """Measure a theme's background luminance, darkness, accent hue and text contrast
+
+    The accent hue (in degrees) is that of the most colorful ANSI color, or
+    None when every one of them is close to grey.
+    """
+    best_chroma, hue = ACCENT_MIN_CHROMA, None
+    for index in ACCENT_INDICES:
+        if index in theme.palette:
+            rgb = theme.palette.colors[index]
+            channels = ((rgb >> 16) & 0xff, (rgb >> 8) & 0xff, rgb & 0xff)
+            chroma = (max(channels) - min(channels)) / 255
+            if chroma > best_chroma:
+                best_chroma, hue = chroma, round(rgb_to_hsv(rgb)[0] * 360, 1) % 360
+    background, foreground = theme.colors[0], theme.colors[1]
+    return ThemeMetrics(rgb_luminance(background), theme.is_dark, hue, contrast_ratio(foreground, background))
+
+
+class ThemeFilter(NamedTuple):
+    """A --where condition on theme metrics, compiled to an SQL expression and its parameters
+
+    Conditions compare luminance (0 to 1), hue (0 to 360) or contrast (1 to
+    21) with a number, test dark or light, and combine with and, or, not and
+    parentheses, e.g. "dark and contrast >= 7 and hue >= 180 and hue < 260".
+    """
+    text: str
+    sql: str
+    params: Tuple[float, ...]
+
+    TOKEN_PATTERN = re.compile(r'\s*(?:(\d+\.?\d*|\.\d+)|([A-Za-z_]\w*)|(<=|>=|==|!=|<|>|=|\(|\))|(\S))')
+    FIELDS = ('luminance', 'hue', 'contrast')
+    OPERATORS = {'<': '<', '<=': '<=', '>': '>', '>=': '>=', '=': '=', '==': '=', '!=': '!='}
+
+    @classmethod
+    def parse(cls, text: str) -> 'ThemeFilter':
+        """Compile a condition, raising ValueError if it is malformed"""
+        tokens = [number or word.lower() or symbol or other
+                  for number, word, symbol, other in cls.TOKEN_PATTERN.findall(text)]
+        params = []
+        sql, position = cls._parse_or(tokens, 0, params)
+        if position < len(tokens):
+            raise ValueError(f"unexpected '{tokens[position]}' in '{text}'")
+        return cls(text, sql, tuple(params))
+
+    @classmethod
+    def _parse_or(cls, tokens: List[str], position: int, params: List) -> Tuple[str, int]:
+        sql, position = cls._parse_and(tokens, position, params)
+        while position < len(tokens) and tokens[position] == 'or':
+            right, position = cls._parse_and(tokens, position + 1, params)
+            sql = f"{sql} OR {right}"
+        return sql, position
+
+    @classmethod
+    def _parse_and(cls, tokens: List[str], position: int, params: List) -> Tuple[str, int]:
+        sql, position = cls._parse_term(tokens, position, params)
+        while position < len(tokens) and tokens[position] == 'and':
+            right, position = cls._parse_term(tokens, position + 1, params)
+            sql = f"{sql} AND {right}"
+        return sql, position
+
+    @classmethod
+    def _parse_term(cls, tokens: List[str], position: int, params: List) -> Tuple[str, int]:
+        token = tokens[position] if position < len(tokens) else None
+        if token == 'not':
+            sql, position = cls._parse_term(tokens, position + 1, params)
+            return f"NOT {sql}", position
+        if token == '(':
+            sql, position = cls._parse_or(tokens, position + 1, params)
+            if position >= len(tokens) or tokens[position] != ')':
+                raise ValueError("missing ')'")
+            return f"({sql})", position + 1
+        if token in ('dark', 'light'):
+            return f"dark = {int(token == 'dark')}", position + 1
+        if token not in cls.FIELDS:
+            expected = f"{', '.join(cls.FIELDS)}, dark or light"
+            raise ValueError(f"expected {expected}" + (f", not '{token}'" if token else " at the end"))
+
+        operator, value = tokens[position + 1:position + 3] + [None] * (position + 3 - len(tokens))
+        if operator not in cls.OPERATORS:
+            raise ValueError(f"expected a comparison after {token}")
+        try:
+            params.append(float(value))
+        except (TypeError, ValueError):
+            raise ValueError(f"expected a number after {token} {operator}") from None
+        return f"{token} {cls.OPERATORS[operator]} ?", position + 3
+
+
+def default_index_path() -> Path:
+    """Where the theme index is kept unless told otherwise"""
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(cache_dir) / 'ghostty-to-phpstorm' / 'themes.sqlite'
+
+
+class ThemeIndex:
+    """Persistent SQLite index of theme metrics, for choosing themes without converting them
+
+    Rows are keyed by the theme file's absolute path and keep its size,
+    mtime and content hash, so an update only reads files whose size or
+    mtime changed, and only parses those whose content did.
+    """
+
+    VERSION = 1
+    SORT_FIELDS = ('name', 'luminance', 'hue', 'contrast')
+
+    def __init__(self, path: Path):
+        import sqlite3
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+            with self.connection:
+                self.connection.execute("DROP TABLE IF EXISTS themes")
+                self.connection.execute("""
+                    CREATE TABLE themes (
+                        path TEXT PRIMARY KEY, name TEXT NOT NULL,
+                        size INTEGER NOT NULL, mtime INTEGER NOT NULL, hash TEXT NOT NULL,
+                        luminance REAL NOT NULL, dark INTEGER NOT NULL, hue REAL, contrast REAL NOT NULL
+                    )""")
+                self.connection.execute(f"PRAGMA user_version = {self.VERSION}")
+
+    def __enter__(self) -> 'ThemeIndex':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.connection.close()
+
+    def update(self, theme_files: List[Path]) -> Tuple[int, int, List[str]]:
+        """Index new and changed theme files
+
+        Returns the number of themes (re)indexed, the number unchanged and
+        a message for each file that could not be indexed.
+        """
+        import hashlib
+        known = {path: (size, mtime, file_hash) for path, size, mtime, file_hash
+                 in self.connection.execute("SELECT path, size, mtime, hash FROM themes")}
+        rows = []
+        touched = []
+        broken = []
+        unchanged = 0
+        failures = []
+        for theme_file in theme_files:
+            path = str(theme_file.absolute())
+            try:
+                stat = theme_file.stat()
+                entry = known.get(path)
+                if entry and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+                    unchanged += 1
+                    continue
+                data = theme_file.read_bytes()
+                file_hash = hashlib.sha256(data).hexdigest()
+                if entry and entry[2] == file_hash:
+                    # Touched but not changed, only the stat needs updating
+                    touched.append((stat.st_size, stat.st_mtime_ns, path))
+                    unchanged += 1
+                    continue
+                theme = GhosttyParser.parse_theme(theme_file.name, data.decode('utf-8', 'ignore'))
+                rows.append((path, theme.name, stat.st_size, stat.st_mtime_ns, file_hash, *theme_metrics(theme)))
+            except (OSError, ValueError) as e:
+                # Forget what the file held before, so it is never selected on stale metrics
+                broken.append((path,))
+                failures.append(f"  ! Not indexing {theme_file.name}: {e}")
+
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO themes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.connection.executemany("UPDATE themes SET size = ?, mtime = ? WHERE path = ?", touched)
+            self.connection.executemany("DELETE FROM themes WHERE path = ?", broken)
+        return len(rows), unchanged, failures
+
+    def prune(self) -> int:
+        """Forget themes whose files no longer exist, returning how many"""
+        missing = [(path,) for path, in self.connection.execute("SELECT path FROM themes")
+                   if not os.path.exists(path)]
+        with self.connection:
+            self.connection.executemany("DELETE FROM themes WHERE path = ?", missing)
+        return len(missing)
+
+    def select(self, theme_files: List[Path], where: Optional[ThemeFilter] = None,
+               order: str = 'name') -> List[Tuple[Path, ThemeMetrics]]:
+        """The indexed theme files matching where, with their metrics, sorted by order"""
+        if order not in self.SORT_FIELDS:
+            raise ValueError(f"Cannot sort by '{order}', expected one of {', '.join(self.SORT_FIELDS)}")
+        files = {str(theme_file.absolute()): theme_file for theme_file in theme_files}
+        query = "SELECT path, luminance, dark, hue, contrast FROM themes"
+        if where:
+            query += f" WHERE {where.sql}"
+        rows = self.connection.execute(query, where.params if where else ())
+        matches = [(files[path], ThemeMetrics(luminance, bool(dark), hue, contrast))
+                   for path, luminance, dark, hue, contrast in rows if path in files]
+        if order == 'name':
+            return sorted(matches, key=lambda match: match[0])
+        # Themes without an accent hue sort last
+        return sorted(matches, key=lambda match: (getattr(match[1], order) is None, getattr(match[1], order) or 0,
+                                                  match[0]))
+
+
+def select_theme_files(theme_files: List[Path], where: ThemeFilter,
+                       index_path: Optional[Path] = None) -> List[Path]:
+    """Bring the theme index up to date and keep the theme files matching where, printing the selection"""
+    with ThemeIndex(index_path or default_index_path()) as index:
+        with profile_stage('index'):
+            _, _, failures = index.update(theme_files)
+        with profile_stage('select'):
+            selected = [theme_file for theme_file, _ in index.select(theme_files, where)]
+    for line in failures:
+        print(line)
+    print(f"Selected {len(selected)} of {len(theme_files)} themes where {where.text}")
+    return selected
+
+
+# Batch output formats, in the order they are written, with each one's path in the output directory
+OUTPUT_FORMATS = {
+    'jar': "{name}-theme.jar",
+    'dir': "{name}-theme",
+    'icls': "{name}.icls",
+    'json': "{name}.theme.json",
+}
+
+
+def convert_batch_item(theme_file: Path, output_dir: Path, formats: Tuple[str, ...] = ('jar',),
+                       derivator: Optional[ColorDerivator] = None,
+                       ghostty_theme: Optional[GhosttyTheme] = None,
+                       compression: Compression = DEFAULT_COMPRESSION,
+                       rules: Optional[DerivationRules] = None,
+                       collect_profile: bool = False) -> Tuple[bool, str, List[Path], int, Dict[str, float],
+                                                               Optional[Dict]]:
+    """Convert one theme of a batch to each of the given formats
+
+    Returns success, the captured output, the generated paths, the number of
+    parse warnings, the seconds spent converting and writing each format
+    and, when collect_profile is set, the stage totals gathered since the
+    previous call.
+
+    Output is captured rather than printed so that parallel workers can hand
+    it back to the parent, which prints it in input order.
+    """
+    ok, output, writes, warnings, timings, _ = render_batch_item(theme_file, output_dir, formats, derivator,
+                                                                 ghostty_theme, compression, rules)
+    outputs = []
+    if ok:
+        try:
+            outputs, message, write_timings = write_batch_item(writes, compression)
+            output += message
+            timings.update(write_timings)
+        except Exception as e:
+            output += f"  ✗ Failed to convert {theme_file.name}: {e}\n"
+            ok = False
+
+    profile = PROFILER.take() if collect_profile and PROFILER else None
+    return ok, output, outputs, warnings, timings, profile
+
+
+def convert_batch(theme_files: Iterable[Path], output_dir: Path, formats: Tuple[str, ...] = ('jar',),
+                  jobs: int = 1, force: bool = False,
+                  prune: bool = False, vectorize: bool = False,
+                  theme_cache: Optional[Path] = None,
+                  compression: Compression = DEFAULT_COMPRESSION,
+                  pipeline: bool = False,
+                  min_contrast: Optional[float] = None,
+                  rules: Optional[DerivationRules] = None) -> Tuple[int, int, int, Dict[str, float],
+                                                                   Dict[Path, List[Path]]]:
+    """Convert a batch of themes to each of the given formats, skipping those unchanged since the last run
+
+    Every theme is parsed and derived once, whatever the number of formats.
+    Returns the number of themes converted, the number skipped as up to
+    date, the total number of parse warnings, the total seconds spent
+    converting themes and writing each format, and the outputs of every
+    theme converted or up to date, leaving out those that failed and files
+    left over from earlier runs. With pipeline set, reading,
+    conversion and writing of different themes overlap (see run_pipeline).
+    With min_contrast set, derived colors are held to that contrast ratio
+    (see ContrastDerivator). Colors are derived by rules, or the default
+    DERIVATION_RULES.
+
+    theme_files may be a generator, such as discover_themes: each theme is
+    hashed and converted as it arrives, so the first conversion does not
+    wait for the rest. Only prune, theme_cache and vectorize, which need
+    the whole batch, collect it first.
+    """
+    jar_compression = compression.spec if 'jar' in formats else None
+    manifest = BuildManifest.load(output_dir, {'formats': list(formats), 'compression': jar_compression,
+                                               'min_contrast': min_contrast,
+                                               'rules': rules.digest if rules else None})
+
+    if prune or theme_cache or vectorize:
+        theme_files = list(theme_files)
+    if prune:
+        for name in manifest.prune(theme_files):
+            print(f"  - Removed outputs of deleted theme {name}")
+
+    hashes = {}
+    outputs: Dict[Path, List[Path]] = {}
+    skipped = 0
+    converted = 0
+    warnings = 0
+
+    def stale_theme_files() -> Iterator[Path]:
+        """Hash each source as it arrives, passing on only the themes that need converting"""
+        nonlocal skipped
+        # The pipeline reads several files at once, and hashing reads them too
+        for theme_file, file_hash in hash_theme_files(theme_files, PIPELINE_IO_THREADS if pipeline else 1):
+            if isinstance(file_hash, OSError):
+                # Unreadable or gone since discovery: report it and carry on with the rest
+                print(f"  ✗ Failed to convert {theme_file.name}: {file_hash}")
+                continue
+            if force or not manifest.is_up_to_date(theme_file, file_hash):
+                hashes[theme_file] = file_hash
+                yield theme_file
+            else:
+                outputs[theme_file] = manifest.outputs(theme_file)
+                skipped += 1
+
+    pending = stale_theme_files()
+    themes = {}
+    if theme_cache or vectorize:
+        pending = list(pending)
+        with profile_stage('parse_batch'):
+            themes = parse_batch_themes(pending if not theme_cache else theme_files, theme_cache)
+
+    derivators = {}
+    if vectorize:
+        with profile_stage('vectorize'):
+            derivators = BatchDerivator([themes[f.name] for f in pending if f.name in themes], rules).derive()
+
+    def derivator_for(theme_file: Path) -> Optional[ColorDerivator]:
+        derivator = derivators.get(theme_file.name)
+        return ContrastDerivator(min_contrast, derivator) if min_contrast else derivator
+
+    timings: Dict[str, float] = {}
+
+    def finish(theme_file: Path, ok: bool, output: str, theme_outputs: List[Path], theme_warnings: int,
+               theme_timings: Dict[str, float]):
+        nonlocal converted, warnings
+        sys.stdout.write(output)
+        warnings += theme_warnings
+        for name, seconds in theme_timings.items():
+            timings[name] = timings.get(name, 0.0) + seconds
+        file_hash = hashes.pop(theme_file)
+        if ok:
+            manifest.record(theme_file, file_hash, theme_outputs)
+            outputs[theme_file] = theme_outputs
+            converted += 1
+
+    items = ((theme_file, output_dir, formats, derivator_for(theme_file), themes.get(theme_file.name),
+              compression, rules) for theme_file in pending)
+    if pipeline:
+        import asyncio
+        asyncio.run(run_pipeline(items, finish, jobs))
+    else:
+        for item, result in map_batch(convert_batch_item, items, jobs):
+            finish(item[0], *result)
+
+    manifest.save()
+    return converted, skipped, warnings, timings, outputs
+
+
+def hash_theme_files(theme_files: Iterable[Path], threads: int = 1) -> Iterator[Tuple[Path, Union[str, OSError]]]:
+    """Yield each theme file with its content hash, or the OSError reading it, in input order
+
+    With threads > 1, that many files are read at once, ahead of the
+    hashes taken.
+    """
+    def hash_theme_file(theme_file: Path) -> Tuple[Path, Union[str, OSError]]:
+        try:
+            with profile_stage('hash'):
+                return theme_file, BuildManifest.hash_file(theme_file)
+        except OSError as e:
+            return theme_file, e
+
+    if threads <= 1:
+        yield from map(hash_theme_file, theme_files)
+        return
+
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+    hashing = deque()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for theme_file in theme_files:
+            hashing.append(executor.submit(hash_theme_file, theme_file))
+            if len(hashing) >= threads:
+                yield hashing.popleft().result()
+        while hashing:
+            yield hashing.popleft().result()
+
+
+# Items map_batch hands each worker process ahead of the results it has collected
+MAP_BATCH_AHEAD = 4
+
+
+def map_batch(function, items: Iterable[Tuple], jobs: int = 1):
+    """Call function with each item's arguments, in worker processes if jobs > 1
+
+    Yields each item with its result, in submission order, so output stays
+    deterministic. items may be a generator: at most a few items per worker
+    are taken ahead of the results, so work starts on the first item at
+    once. The last element of each result is the stage profile a worker
+    collected, which is merged here and stripped from what is yielded.
+    """
+    if jobs > 1:
+        from collections import deque
+        from concurrent.futures import ProcessPoolExecutor
+        profiling = PROFILER is not None
+        initializer = partial(enable_profiling, PROFILER.trace_memory) if profiling else None
+        call = partial(function, collect_profile=profiling)
+        in_flight = deque()
+
+        def collect(item: Tuple, future):
+            *result, profile = future.result()
+            if profile:
+                PROFILER.merge(profile)
+            return item, result
+
+        with ProcessPoolExecutor(max_workers=jobs, initializer=initializer) as executor:
+            for item in items:
+                in_flight.append((item, executor.submit(call, *item)))
+                if len(in_flight) >= jobs * MAP_BATCH_AHEAD:
+                    yield collect(*in_flight.popleft())
+            while in_flight:
+                yield collect(*in_flight.popleft())
+    else:
+        for item in items:
+            *result, _ = function(*item)
+            yield item, result
+
+
+# Themes each pipeline stage may run ahead of the next one, and the number
+# of files being read or written at once
+PIPELINE_DEPTH = 16
+PIPELINE_IO_THREADS = 8
+
+
+async def run_pipeline(items: List[Tuple], finish, jobs: int = 1, depth: int = PIPELINE_DEPTH):
+    """Convert batch items with reading, conversion and writing overlapped
+
+    Theme files are read and written on I/O threads, up to
+    PIPELINE_IO_THREADS at a time, and converted in an executor (worker
+    processes if jobs > 1), so disk waits and CPU work overlap. items may be
+    a generator, which is advanced on an I/O thread too, as finding and
+    hashing themes also waits on the disk. Bounded queues between the stages
+    keep at most a few times depth themes in memory, however many there
+    are. finish is called with each theme's results in input order, like
+    convert_batch_item's.
+    """
+    import asyncio
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    loop = asyncio.get_running_loop()
+    read_queue = asyncio.Queue(depth)
+    finish_queue = asyncio.Queue(depth)
+    profiling = PROFILER is not None
+    trace_memory = profiling and PROFILER.trace_memory
+    if trace_memory:
+        # Stages overlap on this process's threads, which share one tracemalloc peak. Worker
+        # processes convert one theme at a time, so they keep measuring their own.
+        PROFILER.stop_tracing_memory("Peak memory is not measured for stages run on --pipeline threads (-)")
+    if profiling:
+        # Process CPU time would count every thread's work against each overlapping stage
+        PROFILER.stop_measuring_cpu("CPU time is not measured for stages run on --pipeline threads (-)")
+
+    if jobs > 1:
+        initializer = partial(enable_profiling, trace_memory) if profiling else None
+        convert_executor = ProcessPoolExecutor(max_workers=jobs, initializer=initializer)
+    else:
+        convert_executor = ThreadPoolExecutor(max_workers=1)
+
+    def read_item(item: Tuple) -> Tuple:
+        theme_file, ghostty_theme = item[0], item[4]
+        try:
+            return item, None if ghostty_theme else theme_file.read_bytes()
+        except OSError as e:
+            return item, e
+
+    async def read():
+        # Several reads in flight, queued for conversion in input order as each completes
+        reads = deque()
+        pending = iter(items)
+        while True:
+            item = await loop.run_in_executor(io_executor, next, pending, None)
+            if item is None:
+                break
+            reads.append(loop.run_in_executor(io_executor, read_item, item))
+            if len(reads) >= PIPELINE_IO_THREADS:
+                await read_queue.put(await reads.popleft())
+        while reads:
+            await read_queue.put(await reads.popleft())
+        await read_queue.put(None)
+
+    async def convert_and_write(item: Tuple, data) -> Tuple:
+        render = partial(render_batch_item, *item, data=data, collect_profile=profiling and jobs > 1)
+        ok, output, writes, theme_warnings, timings, profile = await loop.run_in_executor(convert_executor, render)
+        if profile:
+            PROFILER.merge(profile)
+
+        outputs = []
+        if ok:
+            try:
+                outputs, message, write_timings = await loop.run_in_executor(io_executor, write_batch_item,
+                                                                             writes, item[5])
+                output += message
+                timings.update(write_timings)
+            except Exception as e:
+                output += f"  ✗ Failed to convert {item[0].name}: {e}\n"
+                ok = False
+        return item[0], ok, output, outputs, theme_warnings, timings
+
+    async def convert():
+        while True:
+            entry = await read_queue.get()
+            if entry is None:
+                break
+            await finish_queue.put(asyncio.ensure_future(convert_and_write(*entry)))
+        await finish_queue.put(None)
+
+    async def finish_in_order():
+        while True:
+            task = await finish_queue.get()
+            if task is None:
+                break
+            finish(*await task)
+
+    with convert_executor, ThreadPoolExecutor(max_workers=PIPELINE_IO_THREADS) as io_executor:
+        await asyncio.gather(read(), convert(), finish_in_order())
+
+
+def render_batch_item(theme_file: Path, output_dir: Path, formats: Tuple[str, ...] = ('jar',),
+                      derivator: Optional[ColorDerivator] = None,
+                      ghostty_theme: Optional[GhosttyTheme] = None,
+                      compression: Compression = DEFAULT_COMPRESSION,
+                      rules: Optional[DerivationRules] = None,
+                      data=None, collect_profile: bool = False) -> Tuple[bool, str, List[Tuple], int,
+                                                                         Dict[str, float], Optional[Dict]]:
+    """Convert one theme of a batch in memory, leaving the writing to write_batch_item
+
+    Reads the theme file unless given its already read bytes (or the
+    OSError reading them) as data. Returns success, the output so far, what
+    to write, the number of parse warnings, the seconds spent converting
+    and, when collect_profile is set, the stage totals.
+
+    Output is built up rather than printed, as redirecting stdout is not
+    safe while other threads run.
+    """
+    start = time.perf_counter()
+    lines = []
+    writes = None
+    try:
+        if formats != ('icls',):
+            lines.append(f"Converting {theme_file.name}...")
+        if isinstance(data, OSError):
+            raise data
+        if ghostty_theme is None:
+            with profile_stage('parse'):
+                if data is None:
+                    ghostty_theme = GhosttyParser.parse_theme_file(theme_file)
+                else:
+                    ghostty_theme = GhosttyParser.parse_theme(theme_file.name, data.decode('utf-8', 'ignore'))
+        lines.extend(f"  ! {ghostty_theme.name}, {diagnostic}" for diagnostic in ghostty_theme.diagnostics)
+
+        generator = PhpStormThemeGenerator(ghostty_theme, derivator, rules)
+        contents = generator.generate_outputs(formats)
+        writes = [(output_format, output_dir / OUTPUT_FORMATS[output_format].format(name=ghostty_theme.name),
+                   contents[output_format]) for output_format in OUTPUT_FORMATS if output_format in formats]
+        lines.extend(format_contrast_failures(generator))
+    except Exception as e:
+        lines.append(f"  ✗ Failed to convert {theme_file.name}: {e}")
+
+    warnings = len(ghostty_theme.diagnostics) if ghostty_theme else 0
+    profile = PROFILER.take() if collect_profile and PROFILER else None
+    output = ''.join(line + '\n' for line in lines)
+    return writes is not None, output, writes, warnings, {'convert': time.perf_counter() - start}, profile
+
+
+def write_batch_item(writes: List[Tuple],
+                     compression: Compression = DEFAULT_COMPRESSION) -> Tuple[List[Path], str, Dict[str, float]]:
+    """Write out a theme converted by render_batch_item
+
+    Returns the generated paths, the message reporting them and the seconds
+    spent writing each format.
+    """
+    paths = []
+    lines = []
+    timings = {}
+    for output_format, path, content in writes:
+        start = time.perf_counter()
+        if output_format == 'icls':
+            with profile_stage('write_icls'):
+                with open(path, 'w') as f:
+                    f.write(content)
+            lines.append(f"  ✓ Generated ICLS: {path.name}")
+        elif output_format == 'json':
+            with profile_stage('write_json'):
+                with open(path, 'w') as f:
+                    f.write(content)
+            lines.append(f"  ✓ Generated theme JSON: {path.name}")
+        elif output_format == 'dir':
+            with profile_stage('write_dir'):
+                write_theme_dir(content, path)
+            lines.append(f"  ✓ Generated theme in {path}")
+        else:
+            with profile_stage('jar'):
+                create_jar_file(content, path, compression)
+            lines.append(f"  ✓ Generated JAR: {path.name}")
+        timings[output_format] = time.perf_counter() - start
+        paths.append(path)
+    return paths, ''.join(line + '\n' for line in lines), timings
+
+
+def render_bundle_item(theme_file: Path, derivator: Optional[ColorDerivator] = None,
+                       ghostty_theme: Optional[GhosttyTheme] = None,
+                       rules: Optional[DerivationRules] = None,
+                       collect_profile: bool = False) -> Tuple[bool, str, Optional[Tuple], int, Optional[Dict]]:
+    """Render one theme's resources for a bundle
+
+    Returns success, the output so far, the theme's name, id and resource
+    files, the number of parse warnings and, when collect_profile is set,
+    the stage totals gathered since the previous call.
+
+    Output is built up rather than printed, as in render_batch_item.
+    """
+    lines = [f"Converting {theme_file.name}..."]
+    rendered = None
+    try:
+        if ghostty_theme is None:
+            with profile_stage('parse'):
+                ghostty_theme = GhosttyParser.parse_theme_file(theme_file)
+        lines.extend(f"  ! {ghostty_theme.name}, {diagnostic}" for diagnostic in ghostty_theme.diagnostics)
+        generator = PhpStormThemeGenerator(ghostty_theme, derivator, rules)
+        rendered = (ghostty_theme.name, generator.theme_id, generator.generate_resource_files())
+        lines.extend(format_contrast_failures(generator))
+    except Exception as e:
+        lines.append(f"  ✗ Failed to convert {theme_file.name}: {e}")
+
+    warnings = len(ghostty_theme.diagnostics) if ghostty_theme else 0
+    profile = PROFILER.take() if collect_profile and PROFILER else None
+    return rendered is not None, ''.join(line + '\n' for line in lines), rendered, warnings, profile
+
+
+def convert_bundle(theme_files: List[Path], jar_path: Path, jobs: int = 1, vectorize: bool = False,
+                   theme_cache: Optional[Path] = None,
+                   compression: Compression = DEFAULT_COMPRESSION,
+                   min_contrast: Optional[float] = None,
+                   rules: Optional[DerivationRules] = None) -> Tuple[int, int]:
+    """Convert a batch of themes into a single plugin JAR registering all of them
+
+    Returns the number of themes converted and the number of parse warnings.
+    The bundle is always rebuilt in full, as it is a single output.
+    """
+    converted = 0
+    warnings = 0
+
+    themes = {}
+    if theme_cache or vectorize:
+        with profile_stage('parse_batch'):
+            themes = parse_batch_themes(theme_files, theme_cache)
+
+    derivators = {}
+    if vectorize:
+        with profile_stage('vectorize'):
+            derivators = BatchDerivator([themes[f.name] for f in theme_files if f.name in themes], rules).derive()
+    if min_contrast:
+        derivators = {theme_file.name: ContrastDerivator(min_contrast, derivators.get(theme_file.name))
+                      for theme_file in theme_files}
+
+    items = [(theme_file, derivators.get(theme_file.name), themes.get(theme_file.name), rules)
+             for theme_file in theme_files]
+    with ThemeBundle(jar_path, compression) as bundle:
+        for _, (ok, output, rendered, theme_warnings) in map_batch(render_bundle_item, items, jobs):
+            sys.stdout.write(output)
+            warnings += theme_warnings
+            if ok:
+                with profile_stage('jar'):
+                    bundle.add(*rendered)
+                converted += 1
+
+    return converted, warnings
+
+
+class PluginSync(NamedTuple):
+    """JAR file names install_plugins copied, left alone and removed (or would have, in a dry run)"""
+    installed: List[str]
+    updated: List[str]
+    unchanged: List[str]
+    removed: List[str]
+
+
+def is_converter_plugin(jar_path: Path) -> bool:
+    """Check whether a plugin JAR was generated by this converter, by its plugin id"""
+    import zipfile
+    try:
+        with zipfile.ZipFile(jar_path) as jar:
+            plugin_xml = jar.read('META-INF/plugin.xml').decode('utf-8')
+    except (OSError, KeyError, UnicodeDecodeError, zipfile.BadZipFile):
+        return False
+
+    match = re.search(r'<id>([^<]*)</id>', plugin_xml)
+    return match is not None and (match.group(1) == ThemeBundle.PLUGIN_ID
+                                  or match.group(1).startswith(PLUGIN_ID_PREFIX))
+
+
+def install_plugins(jar_paths: List[Path], plugins_dir: Path, prune: bool = False,
+                    dry_run: bool = False, keep: Sequence[str] = ()) -> PluginSync:
+    """Copy new and changed plugin JARs into an IDE plugins directory
+
+    A JAR is only copied when its content hash differs from the installed
+    copy's, so unchanged plugins keep their files and the IDE has nothing to
+    reindex. Copies are written beside their target and renamed over it, so
+    the IDE never sees a partly written JAR. With prune, JARs generated by
+    this converter (see is_converter_plugin) that are neither among
+    jar_paths nor named in keep are removed, so passing the JAR names of
+    themes that failed to convert keeps their installed plugins. With
+    dry_run, nothing is touched.
+    """
+    import shutil
+    sync = PluginSync([], [], [], [])
+    if not dry_run:
+        plugins_dir.mkdir(parents=True, exist_ok=True)
+
+    for jar_path in jar_paths:
+        target = plugins_dir / jar_path.name
+        if target.is_file():
+            # A different size means different content, without reading either file
+            if (target.stat().st_size == jar_path.stat().st_size
+                    and BuildManifest.hash_file(target) == BuildManifest.hash_file(jar_path)):
+                sync.unchanged.append(jar_path.name)
+                continue
+            sync.updated.append(jar_path.name)
+        else:
+            sync.installed.append(jar_path.name)
+
+        if not dry_run:
+            tmp_path = target.with_name(f".{target.name}.tmp")
+            try:
+                shutil.copyfile(jar_path, tmp_path)
+                os.replace(tmp_path, target)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+
+    if prune and plugins_dir.is_dir():
+        current = {jar_path.name for jar_path in jar_paths} | set(keep)
+        for installed in sorted(plugins_dir.glob('*.jar')):
+            if installed.name not in current and installed.is_file() and is_converter_plugin(installed):
+                sync.removed.append(installed.name)
+                if not dry_run:
+                    installed.unlink()
+
+    return sync
+
+
+def run_install(jar_paths: List[Path], plugins_dir: Path, prune: bool = False, dry_run: bool = False,
+                keep: Sequence[str] = ()) -> bool:
+    """Install generated JARs into plugins_dir, printing what changed
+
+    Returns False if the plugins directory could not be updated.
+    """
+    print(f"\n{'Dry run, checking' if dry_run else 'Installing into'} {plugins_dir}...")
+    try:
+        sync = install_plugins(jar_paths, plugins_dir, prune, dry_run, keep)
+    except OSError as e:
+        print(f"  ✗ Cannot install into {plugins_dir}: {e}")
+        return False
+
+    for mark, done, planned, names in (('+', 'Installed', 'install', sync.installed),
+                                       ('~', 'Updated', 'update', sync.updated),
+                                       ('-', 'Removed', 'remove', sync.removed)):
+        for name in names:
+            print(f"  {mark} {f'Would {planned}' if dry_run else done} {name}")
+    print(f"{'Dry run' if dry_run else 'Install'} complete: {len(sync.installed)} installed, "
+          f"{len(sync.updated)} updated, {len(sync.unchanged)} unchanged"
+          + (f", {len(sync.removed)} removed" if prune else "")
+          + (" (nothing was changed)" if dry_run else ""))
+    if (sync.installed or sync.updated or sync.removed) and not dry_run:
+        print("Restart the IDE to load the changed plugins")
+    return True
+
+
+def parse_jobs_arg(value: str) -> int:
+    """argparse type for --jobs"""
+    try:
+        jobs = int(value)
+    except ValueError:
+        jobs = -1
+    if jobs < 0:
+        raise argparse.ArgumentTypeError(f"invalid number of jobs '{value}', expected 0 (one per CPU) or more")
+    return jobs
+
+
+def parse_compression_arg(spec: str) -> Compression:
+    """argparse type for --compression"""
+    try:
+        return Compression.parse(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_formats_arg(value: str) -> Tuple[str, ...]:
+    """argparse type for --formats, returning the formats in writing order"""
+    formats = {output_format.strip() for output_format in value.split(',') if output_format.strip()}
+    unknown = formats - set(OUTPUT_FORMATS)
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"invalid formats '{value}', expected some of {', '.join(OUTPUT_FORMATS)}")
+    return tuple(output_format for output_format in OUTPUT_FORMATS if output_format in formats)
+
+
+def parse_contrast_arg(value: str) -> float:
+    """argparse type for --min-contrast"""
+    try:
+        ratio = float(value)
+    except ValueError:
+        ratio = 0.0
+    if not 1 <= ratio <= 21:
+        raise argparse.ArgumentTypeError(f"invalid contrast ratio '{value}', expected a number from 1 to 21")
+    return ratio
+
+
+def parse_where_arg(value: str) -> ThemeFilter:
+    """argparse type for --where"""
+    try:
+        return ThemeFilter.parse(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_rules_arg(value: str) -> DerivationRules:
+    """argparse type for --rules"""
+    try:
+        return DerivationRules.load(Path(value))
+    except OSError as e:
+        raise argparse.ArgumentTypeError(f"cannot read {value}: {e.strerror}")
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def format_size(size: int) -> str:
+    """Format a byte count for the build summary"""
+    for unit in ('bytes', 'KiB', 'MiB'):
+        if size < 1024 or unit == 'MiB':
+            return f"{size} {unit}" if unit == 'bytes' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def run_conversion(args: argparse.Namespace, input_path: Path, output_path: Path,
+                   instructions: bool = True) -> bool:
+    """Convert the input once, as selected by the command line options
+
+    Installation instructions are printed too, unless instructions is False.
+    With --install-to, the JAR files are installed rather than explained.
+    Returns False if the conversion failed, leaving the caller to decide
+    whether to exit, so --watch keeps running after a bad save.
+    """
+    jar_instructions = instructions and not args.install_to
+    if args.batch:
+        rejected = []
+        theme_files = discover_themes(input_path, args.recursive, args.include, args.exclude, rejected=rejected)
+        jobs = args.jobs or os.cpu_count() or 1
+        # Options that look at the whole collection, or --recursive keeping the first of same-named
+        # themes in path order, sort every theme first. Otherwise themes are converted as they are
+        # found, so the first conversion does not wait for the whole directory to be scanned.
+        streaming = not (args.recursive or args.where or args.dedupe or args.bundle or args.vectorize
+                         or args.theme_cache or args.prune)
+        if streaming:
+            # Every theme on disk, filled in as they are found
+            discovered = []
+            theme_files = recorded(theme_files, discovered)
+            print("Converting themes as they are found...")
+        else:
+            theme_files = sorted(theme_files)
+            if rejected:
+                print(f"Skipping {len(rejected)} files that are not Ghostty themes")
+            if args.recursive:
+                theme_files = unique_theme_files(theme_files)
+            # Every theme still on disk, including the duplicates --dedupe leaves out
+            discovered = theme_files
+            if args.where:
+                theme_files = select_theme_files(theme_files, args.where, args.index)
+            if args.dedupe:
+                theme_files = dedupe_theme_files(theme_files, args.duplicate_distance, args.theme_cache)
+            print(f"Converting {len(theme_files)} themes...")
+
+        if args.bundle:
+            jar_path = output_path / (args.bundle_name or 'ghostty-themes.jar')
+            converted, warnings = convert_bundle(theme_files, jar_path, jobs=jobs, vectorize=args.vectorize,
+                                                 theme_cache=args.theme_cache, compression=args.compression,
+                                                 min_contrast=args.min_contrast, rules=args.rules)
+            print(f"\nBundle complete: {converted}/{len(theme_files)} themes in {jar_path.name}"
+                  + (f", {warnings} warnings" if warnings else ""))
+            print(f"Output: {format_size(jar_path.stat().st_size)} ({args.compression.spec})")
+            if args.install_to and not run_install([jar_path], args.install_to, args.install_prune, args.dry_run):
+                return False
+            if jar_instructions:
+                print(f"\nInstall in PhpStorm:")
+                print(f"Settings → Plugins → Install from disk → {jar_path}")
+                print(f"Then: Settings → Appearance → Theme → Select any of the bundled themes")
+        else:
+            converted, skipped, warnings, timings, outputs = convert_batch(
+                theme_files, output_path, formats=args.formats, jobs=jobs, force=args.force, prune=args.prune,
+                vectorize=args.vectorize, theme_cache=args.theme_cache, compression=args.compression,
+                pipeline=args.pipeline, min_contrast=args.min_contrast, rules=args.rules)
+            if streaming:
+                theme_files = discovered
+                if rejected:
+                    print(f"Skipped {len(rejected)} files that are not Ghostty themes")
+
+            print(f"\nConversion complete: {converted}/{len(theme_files)} themes converted"
+                  + (f" ({skipped} unchanged, skipped)" if skipped else "")
+                  + (f", {warnings} warnings" if warnings else ""))
+            if timings:
+                print("Time: " + ", ".join(f"{name} {timings[name]:.2f}s"
+                                           for name in ('convert', *OUTPUT_FORMATS) if name in timings))
+            if 'jar' in args.formats:
+                jar_bytes = sum(output.stat().st_size for theme_outputs in outputs.values()
+                                for output in theme_outputs if output.suffix == '.jar')
+                print(f"Output: {format_size(jar_bytes)} of JAR files ({args.compression.spec})")
+                if jar_instructions:
+                    print(f"\nJAR files are ready for PhpStorm installation:")
+                    print(f"Settings → Plugins → Install from disk → Select JAR file")
+            if 'dir' in args.formats and instructions:
+                print(f"\nTheme directories are ready for packaging:")
+                print(f"Zip the directories and install via Settings → Plugins → Install from disk")
+            if 'icls' in args.formats and instructions:
+                print(f"\nICLS files are ready for PhpStorm import:")
+                print(f"Settings → Editor → Color Scheme → ⚙️ → Import Scheme → Select ICLS file")
+            if 'json' in args.formats and instructions:
+                print(f"\nTheme JSON files are ready to use in your own theme plugins")
+            if args.install_to:
+                # Only this run's JARs, not those of failed themes or left over from earlier runs
+                jar_paths = [output for theme_outputs in outputs.values()
+                             for output in theme_outputs if output.suffix == '.jar']
+                # Prune only plugins whose theme file is gone, keeping those of themes that just failed
+                # or were left out as duplicates
+                keep = [OUTPUT_FORMATS['jar'].format(name=theme_file.name) for theme_file in discovered]
+                return run_install(sorted(jar_paths), args.install_to, args.install_prune, args.dry_run, keep)
+    elif len(args.formats) > 1 or args.formats == ('json',):
+        # Several formats from one conversion, reported like a batch of one
+        derivator = ContrastDerivator(args.min_contrast) if args.min_contrast else None
+        ok, output, outputs, *_ = convert_batch_item(input_path, output_path, args.formats, derivator,
+                                                     compression=args.compression, rules=args.rules)
+        sys.stdout.write(output)
+        if not ok:
+            return False
+        if args.install_to:
+            return run_install([output for output in outputs if output.suffix == '.jar'], args.install_to,
+                               dry_run=args.dry_run)
+    else:
+        if args.formats == ('icls',):
+            try:
+                with profile_stage('parse'):
+                    ghostty_theme = GhosttyParser.parse_theme_file(input_path)
+            except ValueError as e:
+                print(f"✗ Failed to convert {input_path.name}: {e}")
+                return False
+            print_diagnostics(ghostty_theme)
+            icls_path = create_icls_file(ghostty_theme, output_path)
+            if icls_path:
+                print(f"✓ Generated ICLS: {icls_path}")
+                if instructions:
+                    print(f"\nInstall in PhpStorm:")
+                    print(f"Settings → Editor → Color Scheme → ⚙️ → Import Scheme → {icls_path}")
+        else:
+            derivator = ContrastDerivator(args.min_contrast) if args.min_contrast else None
+            try:
+                result = convert_theme(input_path, output_path, create_dir=args.formats == ('dir',),
+                                       derivator=derivator, compression=args.compression, rules=args.rules)
+            except ValueError as e:
+                # Invalid base colors raise ThemeParseError, listing the offending lines
+                print(f"  ✗ Failed to convert {input_path.name}: {e}")
+                return False
+            if args.install_to and not run_install([result], args.install_to, dry_run=args.dry_run):
+                return False
+            if args.formats == ('jar',) and jar_instructions:
+                print(f"\nInstall in PhpStorm:")
+                print(f"Settings → Plugins → Install from disk → {result}")
+                print(f"Then: Settings → Appearance → Theme → Select your theme")
+            elif args.formats == ('dir',) and instructions:
+                print(f"\nTheme directory created:")
+                print(f"Zip the directory and install via Settings → Plugins → Install from disk")
+    return True
+
+
+# Seconds between polls of the watched input, and how long it must stay
+# unchanged after a save before it is converted
+WATCH_INTERVAL = 0.25
+WATCH_DEBOUNCE = 0.1
+
+
+def snapshot_inputs(input_path: Path, recursive: bool = False) -> Dict[str, Tuple[int, int]]:
+    """Modification time and size of a theme file, or of every file in a directory"""
+    paths = [input_path]
+    if input_path.is_dir():
+        paths = list(discover_themes(input_path, recursive, sniff=False))
+
+    snapshot = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue  # Deleted mid-scan, or mid atomic save
+        snapshot[str(path)] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def watch_input(input_path: Path, convert, interval: float = WATCH_INTERVAL, debounce: float = WATCH_DEBOUNCE,
+                recursive: bool = False):
+    """Poll the input for changes and call convert each time they settle
+
+    The process stays warm between conversions, so compiled templates and
+    cached color math are reused. Batch conversions skip themes whose
+    content did not change, leaving only the edited ones to regenerate.
+    """
+    print(f"\nWatching {input_path} for changes (Ctrl+C to stop)...")
+    snapshot = snapshot_inputs(input_path, recursive)
+    try:
+        while True:
+            time.sleep(interval)
+            current = snapshot_inputs(input_path, recursive)
+            if current == snapshot:
+                continue
+
+            # Wait out a burst of rapid saves
+            while True:
+                time.sleep(debounce)
+                settled = snapshot_inputs(input_path, recursive)
+                if settled == current:
+                    break
+                current = settled
+
+            changed = sorted(Path(path).name for path in current.keys() | snapshot.keys()
+                             if current.get(path) != snapshot.get(path))
+            snapshot = current
+            print(f"\n[{time.strftime('%H:%M:%S')}] Changed: {', '.join(changed)}")
+
+            start = time.perf_counter()
+            try:
+                convert()
+            except Exception as e:
+                print(f"  ✗ Conversion failed: {e}")
+            print(f"Finished in {(time.perf_counter() - start) * 1e3:.0f} ms, watching for changes...")
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+
+
+SERVER_FORMATS = ('jar', 'dir', 'icls', 'json', 'xml')
+
+
+def default_socket_path() -> Path:
+    """Where the conversion daemon listens unless told otherwise
+
+    Without $XDG_RUNTIME_DIR (as on macOS), the socket goes in a directory
+    of the user's own under /tmp, which serve creates readable by them only.
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return Path(runtime_dir) / f"ghostty-to-phpstorm-{os.getuid()}.sock"
+    return Path('/tmp') / f"ghostty-to-phpstorm-{os.getuid()}" / "daemon.sock"
+
+
+class ConversionService:
+    """Converts themes for the daemon, caching parsed themes and their slot values
+
+    Themes are cached by name and content digest, so repeated requests for
+    an unchanged theme only render and package. Derived colors are shared
+    across all themes through the ColorDerivator caches.
+    """
+
+    def __init__(self, cache_size: int = 256, rules: Optional[DerivationRules] = None):
+        import threading
+        self.cache_size = cache_size
+        self.rules = rules
+        self.cache: Dict[Tuple[str, bytes], Tuple] = {}
+        self.lock = threading.Lock()
+
+    def prepare(self, name: str, text: str) -> Tuple[PhpStormThemeGenerator, List]:
+        """Parse and evaluate a theme, or fetch it from the cache"""
+        import hashlib
+        key = (name, hashlib.sha256(text.encode('utf-8', 'surrogatepass')).digest())
+        with self.lock:
+            if key in self.cache:
+                # Move to the end, making the least recently used theme first
+                self.cache[key] = self.cache.pop(key)
+                return self.cache[key]
+
+        generator = PhpStormThemeGenerator(GhosttyParser.parse_theme(name, text), rules=self.rules)
+        entry = (generator, ThemeTemplate.for_theme(generator.ghostty, self.rules).evaluate(generator))
+
+        with self.lock:
+            self.cache[key] = entry
+            while len(self.cache) > self.cache_size:
+                del self.cache[next(iter(self.cache))]
+        return entry
+
+    def convert(self, name: str, text: str, output_format: str = 'jar',
+                compression: Compression = DEFAULT_COMPRESSION) -> Tuple[Dict[str, bytes], List[str]]:
+        """Convert one theme
+
+        Returns its output files, keyed by path relative to the output
+        directory, and its parse warnings.
+        """
+        if output_format not in SERVER_FORMATS:
+            raise ValueError(f"Unknown format '{output_format}', expected one of {', '.join(SERVER_FORMATS)}")
+
+        generator, values = self.prepare(name, text)
+        template = ThemeTemplate.for_theme(generator.ghostty, self.rules)
+        if output_format == 'icls':
+            files = {f"{name}.icls": template.scheme_xml.render(values)}
+        elif output_format == 'json':
+            files = {f"{name}.theme.json": template.theme_json.render(values)}
+        elif output_format == 'xml':
+            files = {f"{name}.xml": XML_DECLARATION + template.scheme_xml.render(values)}
+        elif output_format == 'dir':
+            files = {f"{name}-theme/{path}": content
+                     for path, content in generator.generate_plugin_files(values).items()}
+        else:
+            jar = create_jar_file(generator.generate_plugin_files(values), io.BytesIO(), compression)
+            files = {f"{name}-theme.jar": jar.getvalue()}
+
+        files = {path: content if isinstance(content, bytes) else content.encode()
+                 for path, content in files.items()}
+        return files, [str(diagnostic) for diagnostic in generator.ghostty.diagnostics]
+
+
+def handle_connection(rfile: BinaryIO, wfile: BinaryIO, service: ConversionService):
+    """Serve conversion requests on one daemon client connection
+
+    Each request is a line of JSON with the theme's "name" and "text" (or a
+    "path" to read it from), an output "format" and optionally a
+    "compression" spec. Each response is a line of JSON listing the output
+    files and their sizes, followed by the files' bytes in that order.
+    """
+    for line in rfile:
+        files = {}
+        try:
+            request = json.loads(line)
+            if 'path' in request:
+                theme_path = Path(request['path'])
+                name = Path(request.get('name', theme_path.name)).name
+                text = theme_path.read_bytes().decode('utf-8', 'ignore')
+            else:
+                name = Path(request['name']).name
+                text = request['text']
+            compression = Compression.parse(request.get('compression', DEFAULT_COMPRESSION.spec))
+            files, warnings = service.convert(name, text, request.get('format', 'jar'), compression)
+            header = {'ok': True, 'files': [[path, len(data)] for path, data in files.items()],
+                      'warnings': warnings}
+        except KeyError as e:
+            header = {'ok': False, 'error': f"Missing request field {e}"}
+        except Exception as e:
+            header = {'ok': False, 'error': str(e)}
+
+        wfile.write(json.dumps(header).encode() + b'\n' + b''.join(files.values()))
+
+
+def serve(socket_path: Path, cache_size: int = 256, rules: Optional[DerivationRules] = None):
+    """Run the conversion daemon until interrupted"""
+    import signal
+    import socket
+    import socketserver
+
+    # Another user able to change the socket's directory could replace the socket with their own
+    socket_dir = socket_path.parent
+    socket_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+    info = socket_dir.stat()
+    if info.st_uid not in (0, os.getuid()) or (info.st_mode & 0o022 and not info.st_mode & 0o1000):
+        print(f"Error: Other users can change {socket_dir}, choose another --socket")
+        sys.exit(1)
+
+    if socket_path.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(socket_path))
+            print(f"Error: A daemon is already listening on {socket_path}")
+            sys.exit(1)
+        except ConnectionRefusedError:
+            socket_path.unlink()  # Left behind by a daemon that did not shut down cleanly
+        finally:
+            probe.close()
+
+    # Have everything warm before the first request arrives
+    for is_dark in (True, False):
+        ThemeTemplate._variants.setdefault((rules or DEFAULT_RULES, is_dark), ThemeTemplate(is_dark, rules).complete())
+
+    service = ConversionService(cache_size, rules)
+
+    class ConversionHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            handle_connection(self.rfile, self.wfile, service)
+
+    server = socketserver.ThreadingUnixStreamServer(str(socket_path), ConversionHandler)
+    server.daemon_threads = True
+    os.chmod(socket_path, 0o600)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    print(f"Serving conversions on {socket_path} (Ctrl+C to stop)...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped serving")
+    finally:
+        server.server_close()
+        socket_path.unlink(missing_ok=True)
+
+
+def serve_main(argv: List[str]):
+    parser = argparse.ArgumentParser(prog='ghostty-to-phpstorm.py serve',
+                                     description='Serve theme conversions on a Unix domain socket')
+    parser.add_argument('--socket', type=Path, default=default_socket_path(),
+                        help=f'Socket path (default: {default_socket_path()})')
+    parser.add_argument('--cache-size', type=int, default=256,
+                        help='Number of parsed themes to keep cached (default: 256)')
+    parser.add_argument('--rules', type=parse_rules_arg, metavar='FILE',
+                        help='JSON file of derivation rules to merge over the defaults')
+    args = parser.parse_args(argv)
+    serve(args.socket, args.cache_size, args.rules)
+
+
+def duplicates_main(argv: List[str]):
+    parser = argparse.ArgumentParser(prog='ghostty-to-phpstorm.py duplicates',
+                                     description='Find duplicate and near-duplicate Ghostty themes')
+    parser.add_argument('input', type=Path, help='Directory of Ghostty themes')
+    parser.add_argument('--distance', type=float, default=NEAR_DUPLICATE_DISTANCE,
+                        help=f'Largest RMS delta E between near duplicates, 0 for exact duplicates only '
+                             f'(default: {NEAR_DUPLICATE_DISTANCE})')
+    parser.add_argument('--theme-cache', type=Path, metavar='PATH', help='Binary cache of parsed themes')
+    args = parser.parse_args(argv)
+
+    if not args.input.is_dir():
+        print(f"Error: Input directory {args.input} does not exist")
+        sys.exit(1)
+
+    theme_files = sorted(discover_themes(args.input))
+    themes = parse_batch_themes(theme_files, args.theme_cache)
+    clusters = find_duplicates([themes[f.name] for f in theme_files if f.name in themes], args.distance)
+    for line in format_duplicates(clusters):
+        print(line)
+
+    exact = sum(1 for cluster in clusters for _, difference in cluster.duplicates if not difference)
+    near = sum(len(cluster.duplicates) for cluster in clusters) - exact
+    print(f"\n{len(themes)} themes: {exact} exact and {near} near duplicates, {len(clusters)} distinct"
+          + (f", {len(theme_files) - len(themes)} unreadable" if len(themes) < len(theme_files) else ""))
+    print(f"Convert one theme of each with: --batch --dedupe --duplicate-distance {args.distance:g}")
+
+
+def index_main(argv: List[str]):
+    parser = argparse.ArgumentParser(prog='ghostty-to-phpstorm.py index',
+                                     description='Index Ghostty themes by luminance, accent hue and contrast, '
+                                                 'and list those matching a condition')
+    parser.add_argument('input', type=Path, help='Directory of Ghostty themes')
+    parser.add_argument('--where', type=parse_where_arg, metavar='CONDITION',
+                        help='Only list themes matching CONDITION, e.g. "dark and contrast >= 7"')
+    parser.add_argument('--sort', choices=ThemeIndex.SORT_FIELDS, default='name', help='Order of the list')
+    parser.add_argument('--index', type=Path, default=default_index_path(), metavar='PATH',
+                        help=f'Index file (default: {default_index_path()})')
+    parser.add_argument('--recursive', '-r', action='store_true', help='Also index themes in subdirectories')
+    args = parser.parse_args(argv)
+
+    if not args.input.is_dir():
+        print(f"Error: Input directory {args.input} does not exist")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    theme_files = sorted(discover_themes(args.input, args.recursive))
+    with ThemeIndex(args.index) as index:
+        updated, unchanged, failures = index.update(theme_files)
+        pruned = index.prune()
+        matches = index.select(theme_files, args.where, args.sort)
+    elapsed = time.perf_counter() - start
+
+    for line in failures:
+        print(line)
+    if matches:
+        width = max(len(theme_file.name) for theme_file, _ in matches)
+        print(f"{'Theme':<{width}}  {'Dark':<5} {'Luminance':>9} {'Hue':>5} {'Contrast':>8}")
+        for theme_file, metrics in matches:
+            hue = '-' if metrics.hue is None else f"{metrics.hue:.0f}"
+            print(f"{theme_file.name:<{width}}  {'yes' if metrics.dark else 'no':<5} {metrics.luminance:>9.3f} "
+                  f"{hue:>5} {metrics.contrast:>7.2f}:1")
+
+    print(f"\n{updated + unchanged} themes indexed ({updated} updated, {unchanged} unchanged"
+          + (f", {pruned} removed" if pruned else "") + f") in {elapsed * 1000:.0f} ms")
+    if args.where:
+        print(f"{len(matches)} match {args.where.text}")
+        print(f"Convert them with: --batch --where \"{args.where.text}\"")
 
 
 def main():
+    if sys.argv[1:2] == ['serve']:
+        serve_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ['duplicates']:
+        duplicates_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ['index']:
+        index_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description='Convert Ghostty themes to PhpStorm themes')
     parser.add_argument('input', help='Input Ghostty theme file or directory')
     parser.add_argument('output', help='Output directory for PhpStorm themes')
     parser.add_argument('--batch', action='store_true', help='Convert all themes in directory')
     parser.add_argument('--dir', action='store_true', help='Create theme directories instead of JAR files')
     parser.add_argument('--icls', action='store_true', help='Create .icls color scheme files for direct import')
+    parser.add_argument('--formats', type=parse_formats_arg, metavar='FORMAT,...',
+                        help=f'Create any of {", ".join(OUTPUT_FORMATS)} from a single conversion '
+                             f'(json is the standalone theme JSON)')
+    parser.add_argument('--recursive', '-r', action='store_true',
+                        help='Also convert themes in subdirectories of the --batch directory')
+    parser.add_argument('--include', action='append', default=[], metavar='GLOB',
+                        help='Only convert --batch files matching GLOB (a name, or a relative path if it has a /); '
+                             'may be repeated')
+    parser.add_argument('--exclude', action='append', default=[], metavar='GLOB',
+                        help='Skip --batch files and directories matching GLOB; may be repeated')
+    parser.add_argument('--where', type=parse_where_arg, metavar='CONDITION',
+                        help='Only convert --batch themes matching CONDITION on the theme index, '
+                             'e.g. "dark and contrast >= 7" (see the index command)')
+    parser.add_argument('--index', type=Path, metavar='PATH',
+                        help=f'Theme index for --where, updated as needed (default: {default_index_path()})')
+    parser.add_argument('--jobs', '-j', type=parse_jobs_arg, default=1,
+                        help='Number of worker processes for --batch (0 = one per CPU)')
+    parser.add_argument('--vectorize', action='store_true',
+                        help='Derive all --batch palettes up front with NumPy (no effect if NumPy is missing)')
+    parser.add_argument('--theme-cache', type=Path, metavar='PATH',
+                        help='Binary cache of parsed --batch themes (e.g. themes.bin), reused across runs')
+    parser.add_argument('--force', action='store_true',
+                        help='Reconvert every theme in --batch, even if unchanged since the last run')
+    parser.add_argument('--prune', action='store_true',
+                        help='Remove outputs of themes deleted since the last --batch run')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Overlap reading, converting and writing --batch themes (helps on slow or network disks)')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='Convert only one --batch theme of each group of duplicate and near-duplicate themes')
+    parser.add_argument('--duplicate-distance', type=float, default=NEAR_DUPLICATE_DISTANCE, metavar='DISTANCE',
+                        help=f'Largest RMS delta E between near duplicates for --dedupe, 0 for exact duplicates '
+                             f'only (default: {NEAR_DUPLICATE_DISTANCE})')
+    parser.add_argument('--bundle', action='store_true',
+                        help='Package every --batch theme into one plugin JAR')
+    parser.add_argument('--bundle-name', metavar='NAME',
+                        help='File name of the --bundle JAR (default: ghostty-themes.jar)')
+    parser.add_argument('--compression', type=parse_compression_arg, default=DEFAULT_COMPRESSION,
+                        metavar='METHOD[:LEVEL]',
+                        help='JAR compression: stored, deflate[:0-9], bzip2[:1-9] or lzma (default: deflate:6)')
+    parser.add_argument('--min-contrast', type=parse_contrast_arg, metavar='RATIO',
+                        help='Adjust derived text colors to at least RATIO:1 contrast (e.g. 4.5) and borders to '
+                             'RATIO:1 or 3:1, reporting colors that cannot reach it')
+    parser.add_argument('--rules', type=parse_rules_arg, metavar='FILE',
+                        help='JSON file of derivation rules to merge over the defaults, changing or adding '
+                             'theme UI colors')
+    parser.add_argument('--install-to', type=Path, metavar='PLUGINS_DIR',
+                        help='Copy generated JAR plugins into an IDE plugins directory, skipping those already '
+                             'installed with the same content')
+    parser.add_argument('--install-prune', action='store_true',
+                        help='Remove plugins generated by this converter from --install-to when their --batch '
+                             'themes are gone')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Report what --install-to would install, update and remove, changing nothing there')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and reconvert whenever the input changes')
+    parser.add_argument('--profile', action='store_true',
+                        help='Time each conversion stage and print a table')
+    parser.add_argument('--profile-output', metavar='FILE',
+                        help='Time each conversion stage and write the totals to FILE as JSON instead')
 
     args = parser.parse_args()
 
@@ -689,62 +3930,82 @@ def main():
 
     output_path.mkdir(parents=True, exist_ok=True)
 
+    if args.profile or args.profile_output:
+        enable_profiling()
+
+    if args.formats and (args.dir or args.icls):
+        print("Error: --formats cannot be combined with --dir or --icls")
+        sys.exit(1)
+    args.formats = args.formats or (('icls',) if args.icls else ('dir',) if args.dir else ('jar',))
+
     if args.batch:
         if not input_path.is_dir():
             print("Error: --batch requires input to be a directory")
             sys.exit(1)
+        if args.bundle_name and not args.bundle:
+            print("Error: --bundle-name names the JAR created by --bundle")
+            sys.exit(1)
+        if args.bundle and args.formats != ('jar',):
+            print("Error: --bundle cannot be combined with --dir, --icls or --formats")
+            sys.exit(1)
+        if args.bundle and (args.prune or args.force or args.pipeline):
+            print("Error: --prune, --force and --pipeline apply to separate theme outputs, not the --bundle JAR, "
+                  "which is always rebuilt in full")
+            sys.exit(1)
+        if args.where and args.prune:
+            print("Error: --prune cannot be combined with --where, it would remove the outputs of unselected themes")
+            sys.exit(1)
+        if args.dedupe and args.prune:
+            print("Error: --prune cannot be combined with --dedupe, it would remove the outputs of duplicate themes")
+            sys.exit(1)
+        if (args.include or args.exclude) and args.prune:
+            print("Error: --prune cannot be combined with --include or --exclude, it would remove the outputs of "
+                  "filtered out themes")
+            sys.exit(1)
+    elif input_path.is_dir():
+        print("Error: Use --batch flag to convert directory of themes")
+        sys.exit(1)
+    elif args.where:
+        print("Error: --where selects themes for --batch")
+        sys.exit(1)
 
-        theme_files = list(input_path.iterdir())
-        theme_files = [f for f in theme_files if f.is_file()]
-
-        print(f"Converting {len(theme_files)} themes...")
-        converted = 0
+    if args.min_contrast and args.formats == ('icls',):
+        print("Error: --min-contrast only changes theme UI colors, which .icls files do not contain")
+        sys.exit(1)
+    if args.rules and args.formats == ('icls',):
+        print("Error: --rules only changes theme UI colors, which .icls files do not contain")
+        sys.exit(1)
 
-        for theme_file in theme_files:
-            try:
-                if args.icls:
-                    ghostty_theme = GhosttyParser.parse_theme_file(theme_file)
-                    icls_path = create_icls_file(ghostty_theme, output_path)
-                    if icls_path:
-                        print(f"  ✓ Generated ICLS: {icls_path.name}")
-                    converted += 1
-                else:
-                    convert_theme(theme_file, output_path, create_dir=args.dir)
-                    converted += 1
-            except Exception as e:
-                print(f"  ✗ Failed to convert {theme_file.name}: {e}")
-
-        print(f"\nConversion complete: {converted}/{len(theme_files)} themes converted")
-        if not args.dir and not args.icls:
-            print(f"\nJAR files are ready for PhpStorm installation:")
-            print(f"Settings → Plugins → Install from disk → Select JAR file")
-        elif args.dir:
-            print(f"\nTheme directories are ready for packaging:")
-            print(f"Zip the directories and install via Settings → Plugins → Install from disk")
-        elif args.icls:
-            print(f"\nICLS files are ready for PhpStorm import:")
-            print(f"Settings → Editor → Color Scheme → ⚙️ → Import Scheme → Select ICLS file")
-    else:
-        if input_path.is_dir():
-            print("Error: Use --batch flag to convert directory of themes")
-            sys.exit(1)
+    if (args.install_prune or args.dry_run) and not args.install_to:
+        print("Error: --install-prune and --dry-run apply to --install-to")
+        sys.exit(1)
+    if args.install_to and 'jar' not in args.formats:
+        print("Error: --install-to installs JAR plugins, which --dir, --icls and these --formats do not create")
+        sys.exit(1)
+    if args.install_prune and not args.batch:
+        print("Error: --install-prune needs --batch, to know which themes are gone")
+        sys.exit(1)
+    if args.install_prune and (args.include or args.exclude):
+        print("Error: --install-prune cannot be combined with --include or --exclude, it would remove the plugins "
+              "of filtered out themes")
+        sys.exit(1)
+    if args.install_prune and args.where:
+        print("Error: --install-prune cannot be combined with --where, it would remove the plugins of "
+              "unselected themes")
+        sys.exit(1)
 
-        if args.icls:
-            ghostty_theme = GhosttyParser.parse_theme_file(input_path)
-            icls_path = create_icls_file(ghostty_theme, output_path)
-            if icls_path:
-                print(f"✓ Generated ICLS: {icls_path}")
-                print(f"\nInstall in PhpStorm:")
-                print(f"Settings → Editor → Color Scheme → ⚙️ → Import Scheme → {icls_path}")
-        else:
-            result = convert_theme(input_path, output_path, create_dir=args.dir)
-            if not args.dir:
-                print(f"\nInstall in PhpStorm:")
-                print(f"Settings → Plugins → Install from disk → {result}")
-                print(f"Then: Settings → Appearance → Theme → Select your theme")
-            else:
-                print(f"\nTheme directory created:")
-                print(f"Zip the directory and install via Settings → Plugins → Install from disk")
+    if not run_conversion(args, input_path, output_path) and not args.watch:
+        sys.exit(1)
+    if args.watch:
+        watch_input(input_path, partial(run_conversion, args, input_path, output_path, instructions=False),
+                    recursive=args.recursive)
+
+    if args.profile_output:
+        with open(args.profile_output, 'w') as f:
+            json.dump(PROFILER.stages, f, indent=2)
+        print(f"\nProfile written to {args.profile_output}")
+    elif args.profile:
+        print(f"\nProfile:\n{PROFILER.report()}")
 
 
 if __name__ == '__main__':